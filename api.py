@@ -1,7 +1,12 @@
 # api.py
 from datetime import datetime, timedelta, timezone
 
-from db import init_db, get_user_by_rfid, db_get_product, db_save_product, get_shops
+from db import (
+    init_db, get_user_by_rfid, db_get_product, db_get_products, db_save_product,
+    db_save_product_if_version, adjust_qty, get_shops,
+)
+from config import LOOKUP_BATCH_MAX
+from scan_queue import get_scan_queue, flush_pending
 from websocket_server import broadcast_from_anywhere
 
 
@@ -119,7 +124,7 @@ class Api:
         if not ean:
             return {"ean": "", "name": "", "image_path": "", "qty": 0.0, "shop_id": None, "source": "none"}
 
-        row = db_get_product(ean)
+        row = self._with_pending(ean, db_get_product(ean), get_scan_queue())
         if row:
             row["source"] = "local"
             return row
@@ -130,11 +135,58 @@ class Api:
 
         return {"ean": ean, "name": "", "image_path": "", "qty": 0.0, "shop_id": None, "source": "none"}
 
+    @staticmethod
+    def _with_pending(ean, row, scan_queue):
+        # Noch nicht geschriebene Scans (Write-Behind) überlagern den DB-Stand
+        pending = scan_queue.pending_for(ean) if scan_queue else None
+        if pending:
+            row = row or {"ean": ean, "name": "", "image_path": "", "qty": 0.0, "shop_id": None}
+            if pending["name"]:
+                row["name"] = pending["name"]
+            row["qty"] = pending["qty"]
+            row["shop_id"] = pending["shop_id"]
+            row["last_user_id"] = pending["last_user_id"]
+        return row
+
+    def lookup_eans(self, eans: list):
+        """
+        Viele EANs auf einmal (Pickliste, Lieferschein). items in der
+        Reihenfolge der Eingabe (Duplikate bleiben), unknown = EANs ohne
+        Artikel, jede einmal.
+        """
+        eans = [str(ean or "").strip() for ean in (eans or [])]
+        if len(eans) > LOOKUP_BATCH_MAX:
+            return {"ok": False, "message": f"Zu viele EANs (max. {LOOKUP_BATCH_MAX})"}
+
+        try:
+            rows = db_get_products([ean for ean in eans if ean])
+        except Exception as exc:
+            print(f"[lookup_eans] Fehler: {exc}")
+            return {"ok": False, "message": f"Fehler beim Nachschlagen: {exc}"}
+
+        scan_queue = get_scan_queue()
+        found = {}
+        for ean, row in rows.items():
+            row = self._with_pending(ean, row, scan_queue)
+            if row:
+                row["source"] = "local"
+            found[ean] = row
+
+        items, unknown = [], {}
+        for ean in eans:
+            row = found.get(ean)
+            if row:
+                items.append(dict(row))
+                continue
+            items.append({"ean": ean, "name": "", "image_path": "", "qty": 0.0, "shop_id": None, "source": "none"})
+            unknown[ean] = True
+        return {"ok": True, "count": len(items), "items": items, "unknown": list(unknown)}
+
     def get_shops(self):
         return get_shops()
 
     def save_product(self, ean: str, name: str, shop_id: int | None = None,
-                     qty: float = 0.0, rfid_uid: str | None = None):
+                     qty: float = 0.0, rfid_uid: str | None = None, row_version: int | None = None):
         ean = (ean or "").strip()
         name = (name or "").strip()
         if not ean:
@@ -146,8 +198,35 @@ class Api:
             user_id = user_info["id"] if user_info else None
 
         try:
-            db_save_product(ean, name, shop_id, qty, last_user_id=user_id)
-            return {"ok": True, "message": "Gespeichert"}
+            # ein vorgemerkter Scan darf diese Änderung nicht später überschreiben
+            flush_pending(ean)
+            if row_version is None:
+                db_save_product(ean, name, shop_id, qty, last_user_id=user_id)
+                return {"ok": True, "message": "Gespeichert"}
+            # Nur speichern, wenn seit lookup_ean niemand geändert hat
+            result = db_save_product_if_version(ean, name, shop_id, qty, user_id, int(row_version))
+            if not result["ok"]:
+                message = "Zwischenzeitlich geändert" if result["conflict"] else "EAN unbekannt"
+                return {"message": message, **result}
+            return {"message": "Gespeichert", **result}
         except Exception as exc:
             print(f"[save_product] Fehler: {exc}")
             return {"ok": False, "message": f"Fehler beim Speichern: {exc}"}
+
+    def adjust_qty(self, ean: str, delta: float, rfid_uid: str | None = None):
+        # Zu-/Abgang relativ zum aktuellen Stand, z.B. delta=-1 beim Entnehmen
+        ean = (ean or "").strip()
+        if not ean:
+            return {"ok": False, "message": "EAN fehlt"}
+
+        user_id = self.current_user_id
+        if rfid_uid:
+            user_info = get_user_by_rfid(rfid_uid)
+            user_id = user_info["id"] if user_info else None
+
+        try:
+            flush_pending(ean)
+            return {"ok": True, **adjust_qty(ean, float(delta), user_id)}
+        except Exception as exc:
+            print(f"[adjust_qty] Fehler: {exc}")
+            return {"ok": False, "message": f"Fehler beim Speichern: {exc}"}
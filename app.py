@@ -15,10 +15,8 @@ import qrcode
 import websockets
 import requests
 
-from PIL import Image
 import nfc  # aktuell ungenutzt, aber ok
 
-import mysql.connector
 from mysql.connector import Error
 
 
@@ -47,12 +45,13 @@ DUMMY_IMAGE_PATH = os.path.join(IMAGE_DIR, "dummy.png")
 # MySQL/MariaDB Konfiguration
 # ------------------------------------------------------------
 
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "wawi_user",        # ANPASSEN
-    "password": "poke",         # ANPASSEN
-    "database": "wawi_b7",
-}
+# DB_CONFIG und Pool-Größe liegen in config.py; app.py nutzt denselben
+# Connection-Pool wie db.py / webapp.py / websocket_server.py. Artikel
+# werden wie dort über item_repo (ein Upsert pro Speichern) geschrieben.
+from db import (
+    get_db_connection, get_user_by_rfid, update_product_name, save_image_for_ean,
+    db_save_product, save_scan,
+)
 
 # ------------------------------------------------------------
 # Online-EAN-Quellen (optional)
@@ -76,24 +75,19 @@ last_article = None  # {"ean": "...", "name": "..."}
 WS_LOOP = None       # Event-Loop des WS-Servers
 
 
-def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
-
-
 def init_db():
     """
     Aktuell nur Platzhalter: Die Tabellenstruktur liegt bereits in MySQL an.
     Hier könntest du später prüfen, ob items.ean / items.image_path existieren.
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SHOW TABLES LIKE 'items'")
-        row = cur.fetchone()
-        if not row:
-            print("[init_db] WARNUNG: Tabelle 'items' existiert nicht in wawi_b7.")
-        cur.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SHOW TABLES LIKE 'items'")
+            row = cur.fetchone()
+            if not row:
+                print("[init_db] WARNUNG: Tabelle 'items' existiert nicht in wawi_b7.")
+            cur.close()
     except Error as e:
         print(f"[init_db] DB-Fehler: {e}")
 
@@ -140,12 +134,11 @@ def product_image(ean):
     Liefert das Bild zu einer EAN, falls in items.image_path hinterlegt.
     Sonst Dummy.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT image_path FROM items WHERE ean = %s", (ean,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT image_path FROM items WHERE ean = %s", (ean,))
+        row = cur.fetchone()
+        cur.close()
 
     candidate = row[0] if row and row[0] else None
 
@@ -221,12 +214,11 @@ def api_shops():
     Erwartet eine Tabelle 'shops(id, name, ...)'.
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id, name FROM shops ORDER BY name")
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id, name FROM shops ORDER BY name")
+            rows = cur.fetchall()
+            cur.close()
     except Error as e:
         print(f"[api_shops] DB-Fehler: {e}")
         return jsonify({"shops": []}), 500
@@ -267,42 +259,8 @@ def api_save_item():
         user_id = API_INSTANCE.current_user_id
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("SELECT id, name FROM items WHERE ean = %s", (ean,))
-        row = cur.fetchone()
-
-        if row:
-            item_id = row[0]
-            if not name:
-                name = row[1] or ""
-
-            cur.execute(
-                """
-                UPDATE items
-                SET name = %s,
-                    qty = %s,
-                    shop_id = %s,
-                    last_user_id = %s,
-                    last_change_at = NOW()
-                WHERE ean = %s
-                """,
-                (name, qty_val, shop_id_val, user_id, ean),
-            )
-        else:
-            cur.execute(
-                """
-                INSERT INTO items (ean, name, qty, shop_id, last_user_id, last_change_at)
-                VALUES (%s, %s, %s, %s, %s, NOW())
-                """,
-                (ean, name, qty_val, shop_id_val, user_id),
-            )
-            item_id = cur.lastrowid
-
-        conn.commit()
-        cur.close()
-        conn.close()
+        # leerer Name behält den bestehenden (item_repo "save_scan")
+        item_id = save_scan(ean, name, qty_val, shop_id_val, user_id)
     except Error as e:
         print(f"[api_save_item] DB-Fehler: {e}")
         return jsonify({"ok": False, "message": "DB-Fehler"}), 500
@@ -347,114 +305,6 @@ def api_logout():
     return jsonify(result)
 
 
-# ------------------------------------------------------------
-# DB-Helferfunktionen für items (EAN, Name, Bild)
-# ------------------------------------------------------------
-
-def get_user_by_rfid(rfid_uid: str):
-    rfid_uid = (rfid_uid or "").strip()
-    if not rfid_uid:
-        return None
-
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id, name FROM users WHERE LOWER(rfid_uid) = LOWER(%s)",
-            (rfid_uid,),
-        )
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if row:
-            print(f"[rfid] get_user_by_rfid: UID={rfid_uid} -> id={row[0]}, name={row[1]}")
-            return {"id": row[0], "name": row[1]}
-        else:
-            print(f"[rfid] get_user_by_rfid: UID={rfid_uid} -> kein Treffer in users")
-        return None
-    except Error as e:
-        print(f"[get_user_by_rfid] DB-Fehler: {e}")
-        return None
-
-
-def update_product_name(ean: str, name: str, user_id: int | None = None) -> None:
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM items WHERE ean = %s", (ean,))
-    row = cur.fetchone()
-
-    if row:
-        cur.execute("""
-            UPDATE items
-            SET name = %s,
-                last_user_id = %s,
-                last_change_at = NOW()
-            WHERE ean = %s
-        """, (name, user_id, ean))
-    else:
-        cur.execute("""
-            INSERT INTO items (ean, name, image_path, qty, last_user_id, last_change_at)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-        """, (ean, name, None, 0.000, user_id))
-
-    conn.commit()
-    cur.close()
-    conn.close()
-    print(f"[update_product_name] EAN={ean}, name={name}, user_id={user_id}")
-
-
-def save_image_for_ean(ean: str, image_b64: str) -> str:
-    """
-    Speichert ein JPEG-Bild für diese EAN unter images/<ean>.jpg,
-    skaliert auf max. 800px Kantenlänge und ca. 70% Qualität.
-    Aktualisiert items.image_path. Gibt den Dateipfad zurück.
-    """
-    img_bytes = base64.b64decode(image_b64)
-
-    try:
-        img = Image.open(BytesIO(img_bytes))
-    except Exception as exc:
-        print(f"[save_image_for_ean] Fehler beim Öffnen des Bildes für EAN={ean}: {exc}")
-        # Notfall: Rohbytes ablegen
-        filename_raw = f"{ean}_raw.bin"
-        filepath_raw = os.path.join(IMAGE_DIR, filename_raw)
-        with open(filepath_raw, "wb") as f:
-            f.write(img_bytes)
-        return filepath_raw
-
-    img = img.convert("RGB")
-
-    max_size = 800
-    w, h = img.size
-    if max(w, h) > max_size:
-        img.thumbnail((max_size, max_size), Image.LANCZOS)
-
-    filename = f"{ean}.jpg"
-    filepath = os.path.join(IMAGE_DIR, filename)
-
-    os.makedirs(IMAGE_DIR, exist_ok=True)
-    img.save(filepath, format="JPEG", quality=70)
-
-    print(f"[save_image_for_ean] EAN={ean}, gespeichert: {filepath}, size={os.path.getsize(filepath)} bytes, orig={w}x{h}")
-
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM items WHERE ean = %s", (ean,))
-    row = cur.fetchone()
-    if row:
-        cur.execute("UPDATE items SET image_path = %s WHERE ean = %s", (filepath, ean))
-    else:
-        cur.execute("""
-            INSERT INTO items (ean, name, image_path)
-            VALUES (%s, %s, %s)
-        """, (ean, "", filepath))
-    conn.commit()
-    cur.close()
-    conn.close()
-    return filepath
-
-
 def broadcast_from_anywhere(message_dict: dict):
     """
     Aus jedem Thread heraus eine WS-Broadcast-Nachricht schicken.
@@ -604,16 +454,15 @@ class Api:
         return {"ok": True, "timeout_minutes": self.session_timeout_minutes}
 
     def _db_get_product(self, ean: str):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT ean, name, image_path, qty, shop_id, last_user_id, last_change_at
-            FROM items
-            WHERE ean = %s
-        """, (ean,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT ean, name, image_path, qty, shop_id, last_user_id, last_change_at
+                FROM items
+                WHERE ean = %s
+            """, (ean,))
+            row = cur.fetchone()
+            cur.close()
 
         if row:
             return {
@@ -627,57 +476,6 @@ class Api:
             }
         return None
 
-    def _db_save_product(
-        self,
-        ean: str,
-        name: str,
-        shop_id: int | None,
-        qty: float,
-        last_user_id: int | None = None,
-    ):
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # vorhandene Werte holen, um image_path nicht zu verlieren
-        cur.execute("""
-            SELECT image_path, qty, shop_id, last_user_id
-            FROM items
-            WHERE ean = %s
-        """, (ean,))
-        row = cur.fetchone()
-
-        image_path = None
-        if row:
-            existing_image_path, existing_qty, existing_shop_id, existing_last_user_id = row
-            image_path = existing_image_path
-            if shop_id is None:
-                shop_id = existing_shop_id
-            if qty is None:
-                qty = existing_qty if existing_qty is not None else 0.0
-            if last_user_id is None:
-                last_user_id = existing_last_user_id
-        else:
-            if qty is None:
-                qty = 0.0
-
-        cur.execute("""
-            INSERT INTO items (ean, name, image_path, shop_id, qty, last_user_id, last_change_at)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
-            ON DUPLICATE KEY UPDATE
-                name = VALUES(name),
-                image_path = COALESCE(VALUES(image_path), image_path),
-                shop_id = VALUES(shop_id),
-                qty = VALUES(qty),
-                last_user_id = VALUES(last_user_id),
-                last_change_at = NOW()
-        """, (ean, name, image_path, shop_id, qty, last_user_id))
-
-        conn.commit()
-        cur.close()
-        conn.close()
-
-
-
     def lookup_ean(self, ean: str, use_online: bool = False):
         ean = (ean or "").strip()
         if not ean:
@@ -702,7 +500,7 @@ class Api:
             if online and online.get("name"):
                 # Ergebnis in lokale DB cachen, damit spätere Abfragen offline gehen
                 try:
-                    self._db_save_product(
+                    db_save_product(
                         ean=ean,
                         name=online["name"],
                         shop_id=None,
@@ -845,26 +643,24 @@ class Api:
         Wenn es noch keine Tabelle 'shops' gibt, wird einfach [] zurückgegeben.
         """
         try:
-            conn = get_db_connection()
-            cur = conn.cursor()
-
-            # Prüfen, ob Tabelle 'shops' existiert
-            cur.execute("SHOW TABLES LIKE 'shops'")
-            row = cur.fetchone()
-            if not row:
-                print("[get_shops] Tabelle 'shops' existiert noch nicht – leere Liste.")
+            with get_db_connection() as conn:
+                cur = conn.cursor()
+
+                # Prüfen, ob Tabelle 'shops' existiert
+                cur.execute("SHOW TABLES LIKE 'shops'")
+                row = cur.fetchone()
+                if not row:
+                    print("[get_shops] Tabelle 'shops' existiert noch nicht – leere Liste.")
+                    cur.close()
+                    return []
+
+                cur.execute("""
+                    SELECT id, code, name, NULL
+                    FROM shops
+                    ORDER BY name
+                """)
+                rows = cur.fetchall()
                 cur.close()
-                conn.close()
-                return []
-
-            cur.execute("""
-                SELECT id, code, name, NULL
-                FROM shops
-                ORDER BY name
-            """)
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
 
             return [
                 {
@@ -903,7 +699,7 @@ class Api:
             user_id = user_info["id"] if user_info else None
 
         try:
-            self._db_save_product(ean, name, shop_id, qty, last_user_id=user_id)
+            db_save_product(ean, name, shop_id, qty, last_user_id=user_id)
             return {"ok": True, "message": "Gespeichert"}
         except Exception as exc:
             print(f"[save_product] Fehler: {exc}")
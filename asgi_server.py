@@ -0,0 +1,250 @@
+# asgi_server.py
+#
+# Optionaler Betrieb mit HTTP_SERVER = "asgi": ein uvicorn-Server, ein
+# asyncio-Loop, ein Port für die Flask-Routen UND das WebSocket-Protokoll
+# aus websocket_server.ws_handler. WebSocket-Clients verbinden sich mit
+# ws://host:8000/ws (jeder Pfad geht); solange ASGI_LEGACY_WS_PORT gesetzt
+# ist, lauscht derselbe Loop zusätzlich auf 8765 für die bestehenden Seiten.
+#
+# Die Flask-Routen sind synchron und laufen weiter in einem Thread-Pool –
+# der Request-Body wird aber vorher im Loop gelesen (langsame Uploads
+# blockieren keinen Thread) und Broadcasts aus dem Loop brauchen keinen
+# Thread-Wechsel mehr.
+import asyncio
+import functools
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from config import (
+    HTTP_HOST, HTTP_PORT, HTTP_THREADS, HTTP_CONNECTION_LIMIT, HTTP_CHANNEL_TIMEOUT,
+    HTTP_MAX_BODY_BYTES, HTTP_SHUTDOWN_TIMEOUT, WS_PORT, ASGI_LEGACY_WS_PORT,
+)
+import websocket_server
+
+_END = object()
+
+_server = None
+_thread = None
+
+
+# ------------------------------------------------------------
+# WSGI (Flask) unter ASGI
+# ------------------------------------------------------------
+
+def _environ(scope, body: bytes) -> dict:
+    server = scope.get("server") or (HTTP_HOST, HTTP_PORT)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        # WSGI will Pfade als latin-1-String der Original-Bytes
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = "HTTP_" + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class WsgiBridge:
+    def __init__(self, wsgi_app, threads: int, max_body: int):
+        self.wsgi_app = wsgi_app
+        self.max_body = max_body
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi-wsgi")
+
+    async def _read_body(self, receive) -> bytes | None:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body:
+                raise OverflowError
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            body = await self._read_body(receive)
+        except OverflowError:
+            await send({"type": "http.response.start", "status": 413,
+                        "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Request zu gross"})
+            return
+        if body is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+            return written.append
+
+        run = functools.partial(loop.run_in_executor, self._executor)
+        result = await run(self.wsgi_app, _environ(scope, body), start_response)
+        iterator = iter(result)
+        try:
+            # Erster Block im Thread: erst danach steht bei Generatoren der Status fest
+            first = await run(next, iterator, _END)
+            await send({"type": "http.response.start", "status": response["status"],
+                        "headers": response["headers"]})
+            if written:
+                await send({"type": "http.response.body", "body": b"".join(written), "more_body": True})
+            chunk = first
+            while chunk is not _END:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await run(next, iterator, _END)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                await run(result.close)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# ------------------------------------------------------------
+# WebSocket: ws_handler erwartet die Schnittstelle von websockets
+# (async for message in ws, await ws.send(...))
+# ------------------------------------------------------------
+
+class AsgiWebSocket:
+    def __init__(self, scope, receive, send):
+        self.remote_address = scope.get("client")
+        self._receive = receive
+        self._send = send
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.closed:
+            message = await self._receive()
+            if message["type"] == "websocket.receive":
+                text = message.get("text")
+                return text if text is not None else message.get("bytes")
+            if message["type"] == "websocket.disconnect":
+                self.closed = True
+        raise StopAsyncIteration
+
+    async def send(self, data):
+        if self.closed:
+            raise ConnectionError("WebSocket geschlossen")
+        if isinstance(data, (bytes, bytearray)):
+            await self._send({"type": "websocket.send", "bytes": bytes(data)})
+        else:
+            await self._send({"type": "websocket.send", "text": data})
+
+    async def close(self, code: int = 1000):
+        if not self.closed:
+            self.closed = True
+            await self._send({"type": "websocket.close", "code": code})
+
+
+# ------------------------------------------------------------
+# ASGI-Anwendung
+# ------------------------------------------------------------
+
+class AsgiApp:
+    def __init__(self, wsgi_app):
+        self.http = WsgiBridge(wsgi_app, HTTP_THREADS, HTTP_MAX_BODY_BYTES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self.http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            message = await receive()
+            if message["type"] != "websocket.connect":
+                return
+            await send({"type": "websocket.accept"})
+            await websocket_server.ws_handler(AsgiWebSocket(scope, receive, send))
+        elif scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # broadcast_from_anywhere plant ab jetzt auf diesem Loop ein
+                websocket_server.attach_loop(asyncio.get_running_loop())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.http.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _listen_socket(port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HTTP_HOST, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def start_asgi_server(wsgi_app) -> None:
+    global _server, _thread
+    if _thread is not None:
+        return
+    import uvicorn
+
+    config = uvicorn.Config(
+        AsgiApp(wsgi_app),
+        lifespan="on",
+        ws="websockets-sansio",
+        ws_max_size=HTTP_MAX_BODY_BYTES,   # Bilder kommen auch als base64 per WS
+        timeout_keep_alive=HTTP_CHANNEL_TIMEOUT,
+        limit_concurrency=HTTP_CONNECTION_LIMIT,
+        timeout_graceful_shutdown=HTTP_SHUTDOWN_TIMEOUT,
+        log_level="warning",
+    )
+    _server = uvicorn.Server(config)
+    sockets = [_listen_socket(HTTP_PORT)]
+    if ASGI_LEGACY_WS_PORT:
+        sockets.append(_listen_socket(WS_PORT))
+
+    _thread = threading.Thread(target=lambda: asyncio.run(_server.serve(sockets=sockets)),
+                               name="asgi-server", daemon=True)
+    _thread.start()
+    ports = ", ".join(str(s.getsockname()[1]) for s in sockets)
+    print(f"[http] ASGI (uvicorn) auf {HTTP_HOST}, Ports {ports}: HTTP + WebSocket auf einem Loop")
+
+
+def stop_asgi_server() -> None:
+    global _server, _thread
+    if _server is None:
+        return
+    _server.should_exit = True
+    _thread.join(timeout=HTTP_SHUTDOWN_TIMEOUT + 1)
+    _server = None
+    _thread = None
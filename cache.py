@@ -0,0 +1,109 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """
+    Kleiner threadsicherer LRU-Cache mit Ablaufzeit pro Eintrag.
+    Auch None wird gecacht (z.B. "EAN unbekannt"), invalidate() entfernt
+    einen Schlüssel und verhindert, dass ein gerade laufender Loader den
+    alten Stand wieder einträgt.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._invalidated_at = {}    # key -> generation der letzten Invalidierung
+        self._floor = 0              # Loads bis zu dieser generation gelten als veraltet
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and (
+                generation <= self._floor or self._invalidated_at.get(key, -1) >= generation
+            ):
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def begin_load(self) -> int:
+        """
+        Vor einem Ladevorgang holen und an set(..., generation=) geben: so
+        trägt ein Loader keinen Stand ein, der inzwischen invalidiert wurde
+        (für Loader, die viele Schlüssel auf einmal holen).
+        """
+        with self._lock:
+            self._generation += 1
+            return self._generation
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = self.begin_load()
+        value = loader()
+        self.set(key, value, generation=generation)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at[key] = self._generation
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+            # Marker nur für laufende Loader nötig, nicht unbegrenzt sammeln
+            if len(self._invalidated_at) > self.maxsize:
+                self._invalidated_at.clear()
+                self._floor = self._generation
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self._invalidated_at.clear()
+            self._floor = self._generation
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
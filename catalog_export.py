@@ -0,0 +1,189 @@
+# catalog_export.py
+#
+# Export der Artikel (optional mit Lagerorten aus box_inventory) als NDJSON
+# oder CSV. Gelesen wird über einen ungepufferten Cursor in Blöcken, d.h.
+# der Speicherbedarf bleibt konstant, egal wie groß die Tabelle ist.
+#
+#   python catalog_export.py --format csv --locations > katalog.csv
+import argparse
+import csv
+import io
+import json
+import sys
+
+from config import EXPORT_FETCH_SIZE
+from db import get_db_connection
+
+ITEM_FIELDS = ["id", "ean", "name", "qty", "shop_id", "image_path", "last_user_id", "last_change_at"]
+LOCATION_FIELDS = ["box_code", "room_code", "shelf_code", "bin_code", "path", "box_qty"]
+
+_ITEMS_SQL = """
+    SELECT i.id, i.ean, i.name, i.qty, i.shop_id, i.image_path, i.last_user_id, i.last_change_at
+    FROM items i
+    ORDER BY i.id
+"""
+
+_ITEMS_WITH_LOCATIONS_SQL = """
+    SELECT i.id, i.ean, i.name, i.qty, i.shop_id, i.image_path, i.last_user_id, i.last_change_at,
+           b.box_code, r.code, s.code, bn.code, bi.qty
+    FROM items i
+    LEFT JOIN box_inventory bi ON bi.item_id = i.id
+    LEFT JOIN boxes b ON b.id = bi.box_id
+    LEFT JOIN bins bn ON bn.id = b.bin_id
+    LEFT JOIN shelves s ON s.id = bn.shelf_id
+    LEFT JOIN rooms r ON r.id = s.room_id
+    ORDER BY i.id, b.box_code
+"""
+
+
+def _item_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "ean": row[1],
+        "name": row[2],
+        "qty": float(row[3]) if row[3] is not None else 0.0,
+        "shop_id": row[4],
+        "image_path": row[5] or "",
+        "last_user_id": row[6],
+        "last_change_at": row[7].isoformat() if row[7] else None,
+    }
+
+
+def location_path(room_code, shelf_code, bin_code) -> str:
+    # Gleiche Schreibweise wie auf den Box-Etiketten: "R4 / S02 / F01"
+    return " / ".join(c for c in (room_code, shelf_code, bin_code) if c)
+
+
+def _location_dict(row) -> dict | None:
+    box_code, room_code, shelf_code, bin_code, box_qty = row[8:13]
+    if box_code is None:
+        return None
+    return {
+        "box_code": box_code,
+        "room_code": room_code,
+        "shelf_code": shelf_code,
+        "bin_code": bin_code,
+        "path": location_path(room_code, shelf_code, bin_code),
+        "box_qty": float(box_qty) if box_qty is not None else 0.0,
+    }
+
+
+def _fetch_rows(sql: str, fetch_size: int):
+    conn = get_db_connection()
+    finished = False
+    try:
+        # ungepuffert: der Server liefert die Zeilen erst beim fetchmany()
+        cur = conn.cursor(buffered=False)
+        cur.execute(sql)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+        finished = True
+        cur.close()
+    finally:
+        if finished:
+            conn.close()
+        else:
+            # Abbruch mitten im Resultset (Client weg, Fehler)
+            conn.discard()
+
+
+def iter_items(with_locations: bool = False, fetch_size: int = EXPORT_FETCH_SIZE):
+    """
+    Generator über alle Artikel. Mit with_locations bekommt jeder Artikel
+    eine Liste "locations" (Box, Raum/Regal/Fach, Menge in der Box).
+    """
+    if not with_locations:
+        for row in _fetch_rows(_ITEMS_SQL, fetch_size):
+            yield _item_dict(row)
+        return
+
+    # Zeilen kommen nach items.id sortiert -> aufeinanderfolgende Zeilen
+    # desselben Artikels zusammenfassen, ohne alles im Speicher zu halten.
+    current = None
+    for row in _fetch_rows(_ITEMS_WITH_LOCATIONS_SQL, fetch_size):
+        if current is None or current["id"] != row[0]:
+            if current is not None:
+                yield current
+            current = _item_dict(row)
+            current["locations"] = []
+        loc = _location_dict(row)
+        if loc:
+            current["locations"].append(loc)
+    if current is not None:
+        yield current
+
+
+# ------------------------------------------------------------
+# Ausgabeformate (liefern Text-Blöcke für Streaming-Responses)
+# ------------------------------------------------------------
+
+_CHUNK_CHARS = 64 * 1024
+
+
+def to_ndjson(items):
+    buf = []
+    size = 0
+    for item in items:
+        line = json.dumps(item, ensure_ascii=False) + "\n"
+        buf.append(line)
+        size += len(line)
+        if size >= _CHUNK_CHARS:
+            yield "".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+def to_csv(items, with_locations: bool = False):
+    # CSV ist flach: mit Lagerorten eine Zeile pro Artikel und Box
+    fields = ITEM_FIELDS + (LOCATION_FIELDS if with_locations else [])
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+
+    for item in items:
+        if with_locations and item.get("locations"):
+            for loc in item["locations"]:
+                writer.writerow({**item, **loc})
+        else:
+            writer.writerow(item)
+        if out.tell() >= _CHUNK_CHARS:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+
+def export_chunks(fmt: str = "ndjson", with_locations: bool = False):
+    items = iter_items(with_locations=with_locations)
+    if fmt == "csv":
+        return to_csv(items, with_locations=with_locations)
+    if fmt == "ndjson":
+        return to_ndjson(items)
+    raise ValueError(f"Unbekanntes Format: {fmt}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Artikel als NDJSON/CSV exportieren")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--locations", action="store_true", help="Lagerorte aus box_inventory mit ausgeben")
+    parser.add_argument("-o", "--output", help="Zieldatei (Standard: stdout)")
+    args = parser.parse_args(argv)
+
+    chunks = export_chunks(args.format, with_locations=args.locations)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    else:
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
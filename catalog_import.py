@@ -0,0 +1,225 @@
+# catalog_import.py
+#
+# Massen-Import von Artikeln (Lieferanten-Katalog) aus CSV oder JSONL.
+# Die Datei wird zeilenweise als Generator-Pipeline gelesen und in Batches
+# per executemany-Upsert geschrieben – der Speicherbedarf hängt nur von
+# der Batch-Größe ab, nicht von der Dateigröße.
+#
+#   python catalog_import.py katalog.csv --batch-size 1000 --commit-every 20000
+#
+# Spalten/Felder: ean (Pflicht), name, qty, shop_id, image (bzw. image_path)
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import chain, islice
+
+import item_repo
+from config import IMAGE_DIR, IMPORT_BATCH_SIZE, IMPORT_COMMIT_EVERY
+from db import get_db_connection, clear_item_cache, reload_search_index
+
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+        self.skipped = 0
+        self.batches = 0
+        self.commits = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.written / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "read": self.read,
+            "written": self.written,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "commits": self.commits,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "errors": self.errors,
+        }
+
+
+# ------------------------------------------------------------
+# Pipeline-Stufen
+# ------------------------------------------------------------
+
+def detect_format(filename: str | None, default: str = "csv") -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if ext in (".csv", ".txt"):
+        return "csv"
+    return default
+
+
+def read_records(textfile, fmt: str):
+    """Rohdatensätze als dicts, eine Zeile nach der anderen."""
+    if fmt == "csv":
+        # Trennzeichen (, ; Tab) an den ersten Zeilen erkennen
+        head = list(islice(textfile, 20))
+        try:
+            dialect = csv.Sniffer().sniff("".join(head), delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.DictReader(chain(head, textfile), dialect=dialect)
+    elif fmt == "jsonl":
+        for line in textfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"_error": f"ungültiges JSON: {e}"}
+    else:
+        raise ValueError(f"Unbekanntes Format: {fmt}")
+
+
+def _to_float(value):
+    if value is None or value == "":
+        return None
+    return float(str(value).replace(",", "."))
+
+
+def _to_int(value):
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def _image_path(value):
+    value = (value or "").strip()
+    if not value:
+        return None
+    if os.path.isabs(value):
+        return value
+    return os.path.join(IMAGE_DIR, value)
+
+
+def normalize_records(records, stats: ImportStats):
+    """Dict -> Spalten für items. Ungültige Zeilen werden gezählt und übersprungen."""
+    for lineno, rec in enumerate(records, start=1):
+        stats.read += 1
+        try:
+            if "_error" in rec:
+                raise ValueError(rec["_error"])
+            ean = str(rec.get("ean") or "").strip()
+            if not ean:
+                raise ValueError("ean fehlt")
+            yield {
+                "ean": ean,
+                "name": str(rec.get("name") or "").strip(),
+                "qty": _to_float(rec.get("qty")),
+                "shop_id": _to_int(rec.get("shop_id")),
+                "image_path": _image_path(rec.get("image") or rec.get("image_path")),
+            }
+        except (ValueError, TypeError, AttributeError) as e:
+            stats.skipped += 1
+            if len(stats.errors) < MAX_REPORTED_ERRORS:
+                stats.errors.append(f"Datensatz {lineno}: {e}")
+
+
+def batched(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_batch(cur, batch) -> int:
+    # Zeilen nach vorhandenen Feldern gruppieren: fehlende Werte sollen
+    # bestehende Daten nicht überschreiben, also nicht als NULL mitschicken.
+    groups = {}
+    for row in batch:
+        cols = tuple(c for c in ("name", "qty", "shop_id", "image_path")
+                     if c == "name" or row[c] is not None)
+        groups.setdefault(cols, []).append((row["ean"],) + tuple(row[c] for c in cols))
+
+    for cols, params in groups.items():
+        cur.executemany(item_repo.build_bulk_upsert(cols), params)
+    return len(batch)
+
+
+# ------------------------------------------------------------
+# Import
+# ------------------------------------------------------------
+
+def import_items(textfile, fmt: str = "csv", batch_size: int = IMPORT_BATCH_SIZE,
+                 commit_every: int = IMPORT_COMMIT_EVERY, progress=None) -> ImportStats:
+    """
+    Liest textfile (Text-Stream) und schreibt alle Artikel per Upsert.
+    commit_every: Zeilen pro Transaktion. progress(stats) wird nach jedem
+    Commit aufgerufen.
+    """
+    stats = ImportStats()
+    rows = normalize_records(read_records(textfile, fmt), stats)
+    uncommitted = 0
+
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            for batch in batched(rows, batch_size):
+                stats.written += write_batch(cur, batch)
+                stats.batches += 1
+                uncommitted += len(batch)
+                if uncommitted >= commit_every:
+                    conn.commit()
+                    stats.commits += 1
+                    uncommitted = 0
+                    if progress:
+                        progress(stats)
+            if uncommitted:
+                conn.commit()
+                stats.commits += 1
+            cur.close()
+    finally:
+        clear_item_cache()
+        reload_search_index()
+
+    print(f"[catalog_import] {stats.written} Zeilen in {stats.elapsed:.1f}s "
+          f"({stats.rows_per_second:.0f} Zeilen/s), übersprungen: {stats.skipped}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Artikel-Katalog (CSV/JSONL) importieren")
+    parser.add_argument("file", help="Pfad zur Datei oder '-' für stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Standard: nach Dateiendung")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--commit-every", type=int, default=IMPORT_COMMIT_EVERY)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.file)
+
+    def progress(stats):
+        print(f"  {stats.written} Zeilen, {stats.rows_per_second:.0f} Zeilen/s", flush=True)
+
+    if args.file == "-":
+        stats = import_items(sys.stdin, fmt, args.batch_size, args.commit_every, progress)
+    else:
+        with open(args.file, encoding="utf-8-sig", newline="") as f:
+            stats = import_items(f, fmt, args.batch_size, args.commit_every, progress)
+
+    print(json.dumps(stats.as_dict(), indent=2, ensure_ascii=False))
+    return 0 if not stats.skipped else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,3 +22,121 @@ DB_CONFIG = {
     "password": "poke",
     "database": "wawi_b7",
 }
+
+# Connection-Pool (db_pool.py) – gemeinsam für db.py, webapp.py, WS-Server und app.py
+DB_POOL_SIZE = 8
+DB_POOL_TIMEOUT = 5.0          # Sekunden, die ein Checkout max. auf eine freie Verbindung wartet
+DB_POOL_PING_INTERVAL = 30.0   # Verbindungen, die länger ungenutzt waren, werden vor Ausgabe gepingt
+DB_CONNECT_TIMEOUT = 3.0       # Sekunden für den Verbindungsaufbau (Host weg -> nicht OS-TCP-Timeout abwarten)
+
+# Schema-Migrationen (migrations.py) beim Start anwenden und die Pläne der
+# Abfragen aus db.py per EXPLAIN prüfen (Warnung bei Full Scans)
+DB_MIGRATE_ON_STARTUP = True
+DB_EXPLAIN_ON_STARTUP = True
+
+# WebSocket-Server: blockierende DB-/Bild-Arbeit läuft in einem eigenen Thread-Pool
+WS_PORT = 8765
+WS_EXECUTOR_WORKERS = 4
+WS_EXECUTOR_MAX_PENDING = 32   # max. gleichzeitig wartende Jobs, weitere Nachrichten warten (asynchron)
+
+# Artikel-Cache vor db_get_product (EAN -> Zeile)
+ITEM_CACHE_SIZE = 2000
+ITEM_CACHE_TTL = 300.0   # Sekunden
+
+# Sammel-Lookup (/api/lookup_ean/batch): max. EANs pro Aufruf, EANs pro IN-Abfrage
+LOOKUP_BATCH_MAX = 5000
+LOOKUP_BATCH_CHUNK = 500
+
+# RFID-Login: UID->User-Map im Speicher; ist sie älter, wird beim Login neu geladen
+# (auch für bekannte UIDs – entzogene/umgehängte Karten gelten sonst weiter)
+RFID_USERS_REFRESH_SECONDS = 10.0
+
+# Shop-Liste (/api/shops): so lange gilt der In-Prozess-Cache, danach wird neu gelesen
+SHOPS_CACHE_TTL = 60.0
+
+# Katalog-Import (catalog_import.py, /api/import/items)
+IMPORT_BATCH_SIZE = 1000       # Zeilen pro executemany
+IMPORT_COMMIT_EVERY = 20000    # Zeilen pro Transaktion
+
+# Katalog-Export (catalog_export.py, /api/export): Zeilen pro fetchmany()
+EXPORT_FETCH_SIZE = 1000
+
+# Write-Behind für /api/save_item (scan_queue.py): Scans pro EAN zusammenfassen
+# und gesammelt schreiben. Journal sichert noch nicht geschriebene Scans.
+DATA_DIR = os.path.join(BASE_DIR, "data")
+WRITE_BEHIND_ENABLED = False
+WRITE_BEHIND_WINDOW = 1.0      # Sekunden zwischen zwei Flushes
+WRITE_BEHIND_JOURNAL = os.path.join(DATA_DIR, "scan_journal.jsonl")
+WRITE_BEHIND_FSYNC = True      # jeden Scan vor der Antwort auf Platte bringen
+
+# Lokales SQLite-Replikat (replica.py) für den Betrieb bei MySQL-Ausfall
+REPLICA_ENABLED = False
+REPLICA_PATH = os.path.join(DATA_DIR, "replica.db")
+REPLICA_SYNC_INTERVAL = 10.0     # Sekunden zwischen zwei Abgleichen
+REPLICA_PULL_OVERLAP_SECONDS = 30.0   # so viel vor dem letzten Stand jedes Mal neu lesen
+REPLICA_RETRY_SECONDS = 15.0     # so lange nach einem Fehler lokal arbeiten
+REPLICA_SLOW_SECONDS = 1.0       # Abfrage gilt als langsam ab ...
+REPLICA_SLOW_THRESHOLD = 3       # ... und so viele davon hintereinander = offline
+REPLICA_CONFLICT_POLICY = "local_wins"   # oder "remote_wins"
+
+# SQL-Messung (query_stats.py): Laufzeit/Zeilen/Aufrufstelle pro Statement,
+# Perzentile über die letzten QUERY_STATS_WINDOW Ausführungen je Abfrage
+QUERY_STATS_ENABLED = True
+QUERY_STATS_WINDOW = 1000
+SLOW_QUERY_SECONDS = 0.2       # ab hier ins Slow-Query-Log
+SLOW_QUERY_LOG = os.path.join(DATA_DIR, "slow_queries.jsonl")
+SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024   # danach nach .1 rotieren
+
+# Bestandssummen (stock.py / item_stock): Prüflauf rechnet alles neu und meldet Drift
+STOCK_VERIFY_INTERVAL = 6 * 3600.0   # Sekunden, 0 = nur manuell
+STOCK_VERIFY_FIX = False             # Abweichungen automatisch korrigieren
+
+# Bestandsjournal (stock_ledger.py): Snapshots pro Artikel, damit der Bestand
+# zu einem Zeitpunkt nur den Rest seit dem letzten Snapshot nachrechnen muss
+STOCK_SNAPSHOT_INTERVAL = 24 * 3600.0   # Sekunden, 0 = nur manuell
+STOCK_SNAPSHOT_LAG_SECONDS = 60         # jüngere Bewegungen erst beim nächsten Mal
+
+# Artikelsuche (/api/search, search_index.py): Index im Speicher, wird beim
+# Start aufgebaut und danach über items.last_change_at nachgeführt
+SEARCH_ENABLED = True
+SEARCH_REFRESH_SECONDS = 30.0        # geänderte Artikel nachladen
+SEARCH_FULL_RELOAD_SECONDS = 3600.0  # komplett neu (Box-Umzüge, gelöschte Artikel)
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# Artikelliste (/api/items, item_list.py): Seitengröße
+ITEMS_PAGE_DEFAULT = 50
+ITEMS_PAGE_MAX = 500
+
+# HTTP-Server (http_server.py) für Desktop-Fenster und Handys
+HTTP_HOST = "0.0.0.0"
+HTTP_PORT = 8000
+HTTP_SERVER = "waitress"          # "werkzeug" = Flask-Entwicklungsserver,
+                                  # "asgi" = uvicorn, HTTP + WebSocket auf einem Port (asgi_server.py)
+HTTP_THREADS = 8                  # gleichzeitig bearbeitete Requests
+HTTP_CONNECTION_LIMIT = 200       # offene Verbindungen inkl. Keep-Alive
+HTTP_CHANNEL_TIMEOUT = 60         # Sekunden ohne Daten -> Verbindung schließen
+HTTP_MAX_BODY_BYTES = 64 * 1024 * 1024   # Foto-Uploads
+HTTP_SHUTDOWN_TIMEOUT = 10        # beim Beenden auf laufende Requests warten
+ASGI_LEGACY_WS_PORT = True        # "asgi": zusätzlich auf WS_PORT für bestehende Clients
+
+# Artikelbilder (/image/<ean>, product_images.py): ETags aus dem Dateiinhalt
+IMAGE_ETAG_CACHE_SIZE = 5000
+IMAGE_MAX_AGE = 365 * 24 * 3600   # versionierte URLs (?v=<etag>) ändern sich nie
+IMAGE_SIZES = {"thumb": 160, "medium": 400, "full": 800}   # ?w=, Pixel Breite
+IMAGE_PREGENERATE = [("thumb", "jpeg"), ("thumb", "webp"), ("medium", "jpeg"), ("medium", "webp")]
+IMAGE_CACHE_DIR = os.path.join(DATA_DIR, "image_cache")
+IMAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Statische Dateien unter /public (static_assets.py): Fingerprint + gzip/brotli
+STATIC_BUILD_DIR = os.path.join(DATA_DIR, "static_build")
+STATIC_MAX_AGE = 365 * 24 * 3600  # Fingerprint-URLs ändern sich nie
+STATIC_COMPRESS_MIN_BYTES = 1024  # kleinere Dateien unkomprimiert
+STATIC_BUILD_ON_START = True      # inkrementeller Build beim Start von main.py
+
+# QR-Codes (/qr, /qr/ean/<ean>, /qr/box/<code>, qr_codes.py)
+QR_CACHE_SIZE = 2000              # gerenderte PNG/SVG im Speicher
+QR_DEFAULT_SCALE = 10             # Pixel pro Modul (wie qrcode.make)
+QR_MAX_SCALE = 40
+QR_MAX_PAYLOAD = 512              # Zeichen
+QR_MAX_AGE = 24 * 3600
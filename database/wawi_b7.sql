@@ -46,6 +46,8 @@ CREATE TABLE boxes (
 ) ENGINE=InnoDB;
 
 -- Items / Ware / Artikel
+-- (ean, image_path, qty, shop_id, last_user_id, last_change_at und der
+--  UNIQUE-Index auf ean kommen per migrations.py beim Start dazu)
 CREATE TABLE items (
   id   BIGINT PRIMARY KEY AUTO_INCREMENT,
   sku  VARCHAR(64) UNIQUE NULL,          -- optional interne Artikelnummer
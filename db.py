@@ -1,82 +1,355 @@
 # db.py
 import os
 import base64
+import hashlib
+import json
+import threading
+import time
 from io import BytesIO
 
-import mysql.connector
 from mysql.connector import Error
 from PIL import Image
 
-from config import DB_CONFIG, IMAGE_DIR
+from config import (
+    DB_CONFIG, IMAGE_DIR, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_PING_INTERVAL, DB_CONNECT_TIMEOUT,
+    ITEM_CACHE_SIZE, ITEM_CACHE_TTL, RFID_USERS_REFRESH_SECONDS,
+    SHOPS_CACHE_TTL, REPLICA_ENABLED, REPLICA_PATH, REPLICA_SYNC_INTERVAL, REPLICA_PULL_OVERLAP_SECONDS,
+    REPLICA_RETRY_SECONDS, REPLICA_SLOW_SECONDS, REPLICA_SLOW_THRESHOLD, REPLICA_CONFLICT_POLICY,
+    DB_MIGRATE_ON_STARTUP, DB_EXPLAIN_ON_STARTUP, QUERY_STATS_ENABLED,
+    SEARCH_ENABLED, SEARCH_REFRESH_SECONDS, SEARCH_FULL_RELOAD_SECONDS, LOOKUP_BATCH_CHUNK,
+)
+from cache import LRUTTLCache
+from db_pool import ConnectionPool
+import item_repo
+import migrations
+import query_stats
+from replica import LocalReplica, ReplicaSync
+from search_index import SearchIndex, SearchIndexRefresher
+
+# Abfragen der heißen Pfade – hier gesammelt, damit migrations.explain_report
+# genau das prüft, was auch ausgeführt wird
+_ITEM_BY_EAN_SQL = """
+    SELECT ean, id, name, image_path, qty, shop_id, last_user_id, last_change_at, row_version
+    FROM items
+    WHERE ean = %s
+"""
+# Sammel-Lookup: {placeholders} = "%s, %s, ..." (ein Block je LOOKUP_BATCH_CHUNK)
+_ITEMS_BY_EANS_SQL = """
+    SELECT ean, id, name, image_path, qty, shop_id, last_user_id, last_change_at, row_version
+    FROM items
+    WHERE ean IN ({placeholders})
+"""
+_ITEM_QTY_SQL = "SELECT qty, row_version FROM items WHERE id = %s"
+_RFID_USERS_SQL = "SELECT id, name, rfid_uid FROM users WHERE rfid_uid IS NOT NULL"
+_SET_USER_RFID_SQL = "UPDATE users SET rfid_uid = %s WHERE id = %s"
+_SHOPS_SQL = """
+    SELECT id, code, name, NULL
+    FROM shops
+    ORDER BY name
+"""
+
+
+def _upsert_sample(op: str, *args):
+    values, rules, touch = item_repo.item_spec(op, *args)
+    return item_repo.build_upsert({"ean": "0000000000000", **values}, rules, touch=touch)
+
+
+def _update_sample(op: str, *args):
+    values, rules, touch = item_repo.item_spec(op, *args)
+    return item_repo.build_update({"ean": "0000000000000", **values}, rules, 0, touch=touch)
+
+
+# (Name, SQL, Beispiel-Parameter, Full Scan erlaubt?) für migrations.explain_report
+EXPLAIN_QUERIES = [
+    ("db_get_product", _ITEM_BY_EAN_SQL, ("0000000000000",), False),
+    ("db_get_products", _ITEMS_BY_EANS_SQL.format(placeholders="%s, %s"),
+     ("0000000000000", "0000000000001"), False),
+    ("load_rfid_users", _RFID_USERS_SQL, (), True),   # lädt bewusst alle Karten
+    ("set_user_rfid", _SET_USER_RFID_SQL, (None, 0), False),
+    ("get_shops", _SHOPS_SQL, (), True),              # kleine Tabelle, komplett gebraucht
+    ("item_repo.save_scan", *_upsert_sample("save_scan", "", 0.0, None, None), False),
+    ("item_repo.save_product", *_upsert_sample("save_product", "", None, None, None), False),
+    ("item_repo.adjust_qty", *_upsert_sample("adjust_qty", 0.0, None), False),
+    ("item_repo.update_if_version", *_update_sample("save_scan", "", 0.0, None, None), False),
+]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# EAN -> Zeile aus db_get_product (oder None = unbekannt)
+_item_cache = LRUTTLCache(maxsize=ITEM_CACHE_SIZE, ttl=ITEM_CACHE_TTL)
+_NOT_CACHED = object()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DB_CONFIG,
+                    size=DB_POOL_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    ping_interval=DB_POOL_PING_INTERVAL,
+                    connect_timeout=DB_CONNECT_TIMEOUT,
+                    cursor_wrapper=query_stats.instrument if QUERY_STATS_ENABLED else None,
+                )
+    return _pool
+
 
 def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    return get_pool().get_connection()
+
+
+def get_pool_stats() -> dict:
+    return get_pool().stats()
+
+
+def invalidate_item(ean: str) -> None:
+    _item_cache.invalidate(ean)
+
+
+def clear_item_cache() -> None:
+    # nach Massenänderungen (Import), statt jede EAN einzeln zu invalidieren
+    _item_cache.clear()
+
+
+def get_item_cache_stats() -> dict:
+    return _item_cache.stats()
+
+
+# ------------------------------------------------------------
+# Lokales Replikat (optional, REPLICA_ENABLED)
+# ------------------------------------------------------------
+
+_replica = None
+_replica_sync = None
+_replica_lock = threading.Lock()
+
+
+def get_replica() -> LocalReplica | None:
+    global _replica
+    if not REPLICA_ENABLED:
+        return None
+    if _replica is None:
+        with _replica_lock:
+            if _replica is None:
+                _replica = LocalReplica(
+                    REPLICA_PATH,
+                    retry_seconds=REPLICA_RETRY_SECONDS,
+                    slow_seconds=REPLICA_SLOW_SECONDS,
+                    slow_threshold=REPLICA_SLOW_THRESHOLD,
+                )
+    return _replica
+
+
+def start_replica_sync() -> None:
+    global _replica_sync
+    replica = get_replica()
+    if replica is None or _replica_sync is not None:
+        return
+    _replica_sync = ReplicaSync(
+        replica,
+        get_db_connection,
+        interval=REPLICA_SYNC_INTERVAL,
+        conflict_policy=REPLICA_CONFLICT_POLICY,
+        pull_overlap=REPLICA_PULL_OVERLAP_SECONDS,
+        on_item_synced=invalidate_item,
+    )
+    _replica_sync.start()
+    print(f"[replica] Abgleich gestartet ({REPLICA_PATH}, alle {REPLICA_SYNC_INTERVAL:.0f}s)")
+
+
+# ------------------------------------------------------------
+# Suchindex (/api/search)
+# ------------------------------------------------------------
+
+_search_index = SearchIndex()
+_search_refresher = None
+
+
+def start_search_index() -> None:
+    global _search_refresher
+    if not SEARCH_ENABLED or _search_refresher is not None:
+        return
+    _search_refresher = SearchIndexRefresher(
+        _search_index,
+        get_db_connection,
+        interval=SEARCH_REFRESH_SECONDS,
+        full_interval=SEARCH_FULL_RELOAD_SECONDS,
+    )
+    _search_refresher.start()
+
+
+def search_items(query: str, limit: int = 20) -> list:
+    return _search_index.search(query, limit=limit)
+
+
+def get_search_stats() -> dict:
+    return {"enabled": SEARCH_ENABLED, **_search_index.get_stats()}
+
+
+def update_search_index(ean: str, name: str | None) -> None:
+    # Leerer/fehlender Name behält den bisherigen (wie im Upsert)
+    if SEARCH_ENABLED:
+        _search_index.upsert(ean, name=name or None)
+
+
+def reload_search_index() -> None:
+    # nach Massenänderungen (Import): im Hintergrund komplett neu aufbauen
+    if _search_refresher is not None:
+        _search_refresher.request_full_reload()
+
+
+def _index_saved_item(op: str, ean: str, args) -> None:
+    values, rules, _ = item_repo.item_spec(op, *args)
+    name = values.get("name")
+    rule = rules.get("name", item_repo.SET)
+    if rule == item_repo.INSERT_ONLY or (rule == item_repo.KEEP_IF_NULL and name is None):
+        name = None
+    update_search_index(ean, name)
+
+
+def _save_item(op: str, ean: str, *args) -> int | None:
+    """
+    Schreibt eine item_repo-Operation nach MySQL. Mit Replikat: ist MySQL
+    nicht erreichbar, wird sie lokal vorgemerkt (Rückgabe None statt id).
+    """
+    replica = get_replica()
+    if replica is not None and not replica.mysql_available():
+        replica.queue_write(op, ean, args)
+        invalidate_item(ean)
+        _index_saved_item(op, ean, args)
+        return None
+
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            item_id = item_repo.save(cur, op, ean, *args)
+            conn.commit()
+            cur.close()
+    except Error as e:
+        if replica is None:
+            raise
+        replica.mark_offline(e)
+        replica.queue_write(op, ean, args)
+        item_id = None
+    invalidate_item(ean)
+    _index_saved_item(op, ean, args)
+    return item_id
 
 
 def init_db():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SHOW TABLES LIKE 'items'")
-        row = cur.fetchone()
-        if not row:
-            print("[init_db] WARNUNG: Tabelle 'items' existiert nicht in wawi_b7.")
-        cur.close()
-        conn.close()
+        with get_db_connection() as conn:
+            if DB_MIGRATE_ON_STARTUP:
+                migrations.migrate(conn)
+            if DB_EXPLAIN_ON_STARTUP:
+                migrations.explain_report(conn, EXPLAIN_QUERIES)
+    except migrations.MigrationError as e:
+        print(f"[init_db] Migration abgebrochen: {e}")
     except Error as e:
         print(f"[init_db] DB-Fehler: {e}")
 
+    load_rfid_users()
+
+
+def get_schema_report() -> dict:
+    with get_db_connection() as conn:
+        return {
+            "migrations": migrations.status(conn),
+            "explain": migrations.explain_report(conn, EXPLAIN_QUERIES),
+        }
 
-def get_user_by_rfid(rfid_uid: str):
-    rfid_uid = (rfid_uid or "").strip()
-    if not rfid_uid:
-        return None
 
+# ------------------------------------------------------------
+# RFID -> User
+# ------------------------------------------------------------
+
+# normalisierte UID -> {"id": ..., "name": ...}
+_rfid_users = {}
+_rfid_users_lock = threading.Lock()
+_rfid_users_loaded_at = 0.0
+
+
+def normalize_rfid_uid(rfid_uid: str | None) -> str:
+    # Einheitliche Form wie vom Arduino gesendet: Hex klein, ohne Trenner
+    uid = (rfid_uid or "").strip().lower()
+    for sep in (":", "-", " "):
+        uid = uid.replace(sep, "")
+    return uid
+
+
+def _fetch_rfid_users():
+    replica = get_replica()
+    if replica is not None and not replica.mysql_available():
+        return replica.get_users()
     try:
-        conn = get_db_connection()
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(_RFID_USERS_SQL)
+            rows = cur.fetchall()
+            cur.close()
+        return rows
+    except Error as e:
+        print(f"[load_rfid_users] DB-Fehler: {e}")
+        if replica is None:
+            return None
+        replica.mark_offline(e)
+        return replica.get_users()
+
+
+def load_rfid_users() -> int:
+    global _rfid_users, _rfid_users_loaded_at
+    rows = _fetch_rfid_users()
+    if rows is None:
+        _rfid_users_loaded_at = time.monotonic()
+        return len(_rfid_users)
+
+    users = {}
+    for user_id, name, uid in rows:
+        uid = normalize_rfid_uid(uid)
+        if uid:
+            users[uid] = {"id": user_id, "name": name}
+
+    with _rfid_users_lock:
+        _rfid_users = users
+        _rfid_users_loaded_at = time.monotonic()
+    print(f"[load_rfid_users] {len(users)} RFID-User geladen")
+    return len(users)
+
+
+def set_user_rfid(user_id: int, rfid_uid: str | None) -> None:
+    uid = normalize_rfid_uid(rfid_uid) or None
+    with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT id, name FROM users WHERE LOWER(rfid_uid) = LOWER(%s)",
-            (rfid_uid,),
-        )
-        row = cur.fetchone()
+        cur.execute(_SET_USER_RFID_SQL, (uid, user_id))
+        conn.commit()
         cur.close()
-        conn.close()
+    load_rfid_users()
 
-        if row:
-            print(f"[rfid] get_user_by_rfid: UID={rfid_uid} -> id={row[0]}, name={row[1]}")
-            return {"id": row[0], "name": row[1]}
-        else:
-            print(f"[rfid] get_user_by_rfid: UID={rfid_uid} -> kein Treffer in users")
-        return None
-    except Error as e:
-        print(f"[get_user_by_rfid] DB-Fehler: {e}")
+
+def get_user_by_rfid(rfid_uid: str):
+    rfid_uid = normalize_rfid_uid(rfid_uid)
+    if not rfid_uid:
         return None
 
+    # Karten können direkt in der DB angelegt, entzogen oder umgehängt
+    # werden – die Map gilt deshalb nur RFID_USERS_REFRESH_SECONDS lang,
+    # egal ob die UID darin steht.
+    if time.monotonic() - _rfid_users_loaded_at >= RFID_USERS_REFRESH_SECONDS:
+        load_rfid_users()
+    user = _rfid_users.get(rfid_uid)
+
+    if user:
+        print(f"[rfid] get_user_by_rfid: UID={rfid_uid} -> id={user['id']}, name={user['name']}")
+        return dict(user)
+    print(f"[rfid] get_user_by_rfid: UID={rfid_uid} -> kein Treffer in users")
+    return None
+
 
 def update_product_name(ean: str, name: str, user_id: int | None = None) -> None:
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM items WHERE ean = %s", (ean,))
-    row = cur.fetchone()
-
-    if row:
-        cur.execute("""
-            UPDATE items
-            SET name = %s,
-                last_user_id = %s,
-                last_change_at = NOW()
-            WHERE ean = %s
-        """, (name, user_id, ean))
-    else:
-        cur.execute("""
-            INSERT INTO items (ean, name, image_path, qty, last_user_id, last_change_at)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-        """, (ean, name, None, 0.000, user_id))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    _save_item("save_name", ean, name, user_id)
     print(f"[update_product_name] EAN={ean}, name={name}, user_id={user_id}")
 
 
@@ -106,92 +379,198 @@ def save_image_for_ean(ean: str, image_b64: str) -> str:
 
     print(f"[save_image_for_ean] EAN={ean}, gespeichert: {filepath}, size={os.path.getsize(filepath)} bytes, orig={w}x{h}")
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM items WHERE ean = %s", (ean,))
-    row = cur.fetchone()
-    if row:
-        cur.execute("UPDATE items SET image_path = %s WHERE ean = %s", (filepath, ean))
-    else:
-        cur.execute("""
-            INSERT INTO items (ean, name, image_path)
-            VALUES (%s, %s, %s)
-        """, (ean, "", filepath))
-    conn.commit()
-    cur.close()
-    conn.close()
+    _save_item("save_image_path", ean, filepath)
     return filepath
 
 
 def db_get_product(ean: str):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT ean, name, image_path, qty, shop_id, last_user_id, last_change_at
-        FROM items
-        WHERE ean = %s
-    """, (ean,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-
-    if row:
-        return {
-            "ean": row[0],
-            "name": row[1],
-            "image_path": row[2] or "",
-            "qty": float(row[3]) if row[3] is not None else 0.0,
-            "shop_id": row[4],
-            "last_user_id": row[5],
-            "last_change_at": row[6].isoformat() if row[6] else None,
-        }
-    return None
+    row = _item_cache.get_or_load(ean, lambda: _load_product(ean))
+    return dict(row) if row else None
 
 
-def db_save_product(ean: str, name: str, shop_id: int | None, qty: float, last_user_id: int | None):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT image_path, qty, shop_id, last_user_id
-        FROM items
-        WHERE ean = %s
-    """, (ean,))
-    row = cur.fetchone()
-
-    image_path = None
-    if row:
-        existing_image_path, existing_qty, existing_shop_id, existing_last_user_id = row
-        image_path = existing_image_path
-        if shop_id is None:
-            shop_id = existing_shop_id
-        if qty is None:
-            qty = existing_qty if existing_qty is not None else 0.0
-        if last_user_id is None:
-            last_user_id = existing_last_user_id
-    else:
-        if qty is None:
-            qty = 0.0
-
-    cur.execute("""
-        INSERT INTO items (ean, name, image_path, shop_id, qty, last_user_id, last_change_at)
-        VALUES (%s, %s, %s, %s, %s, %s, NOW())
-        ON DUPLICATE KEY UPDATE
-            name = VALUES(name),
-            image_path = COALESCE(VALUES(image_path), image_path),
-            shop_id = VALUES(shop_id),
-            qty = VALUES(qty),
-            last_user_id = VALUES(last_user_id),
-            last_change_at = NOW()
-    """, (ean, name, image_path, shop_id, qty, last_user_id))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+def _load_product(ean: str):
+    replica = get_replica()
+    if replica is not None and not replica.mysql_available():
+        return replica.get_item(ean)
 
+    started = time.perf_counter()
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(_ITEM_BY_EAN_SQL, (ean,))
+            row = cur.fetchone()
+            cur.close()
+    except Error as e:
+        if replica is None:
+            raise
+        replica.mark_offline(e)
+        return replica.get_item(ean)
 
-def get_shops():
+    if replica is not None:
+        replica.note_latency(time.perf_counter() - started)
+        if row:
+            replica.store_items([row])
+
+    return _item_row(row) if row else None
+
+
+def _item_row(row) -> dict:
+    return {
+        "ean": row[0],
+        "name": row[2],
+        "image_path": row[3] or "",
+        "qty": float(row[4]) if row[4] is not None else 0.0,
+        "shop_id": row[5],
+        "last_user_id": row[6],
+        "last_change_at": row[7].isoformat() if row[7] else None,
+        "row_version": row[8],
+    }
+
+
+def db_get_products(eans) -> dict:
+    """
+    Viele EANs auf einmal: {ean: Zeile oder None}. Was im Artikel-Cache
+    liegt, kommt von dort; der Rest mit einer IN-Abfrage je
+    LOOKUP_BATCH_CHUNK EANs statt einer pro EAN.
+    """
+    result, missing = {}, []
+    for ean in dict.fromkeys(eans):
+        row = _item_cache.get(ean, _NOT_CACHED)
+        if row is _NOT_CACHED:
+            missing.append(ean)
+        else:
+            result[ean] = dict(row) if row else None
+    if not missing:
+        return result
+
+    generation = _item_cache.begin_load()
+    loaded = _load_products(missing)
+    # ein großer Lieferschein soll die heißen Einträge nicht verdrängen
+    cache_rows = len(missing) <= ITEM_CACHE_SIZE // 4
+    for ean in missing:
+        row = loaded.get(ean)
+        if cache_rows:
+            # auch "unbekannt" cachen, wie db_get_product
+            _item_cache.set(ean, row, generation=generation)
+        result[ean] = dict(row) if row else None
+    return result
+
+
+def _load_products(eans: list) -> dict:
+    replica = get_replica()
+    if replica is not None and not replica.mysql_available():
+        return replica.get_items(eans)
+
+    started = time.perf_counter()
+    rows = []
     try:
-        conn = get_db_connection()
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            for i in range(0, len(eans), LOOKUP_BATCH_CHUNK):
+                chunk = eans[i:i + LOOKUP_BATCH_CHUNK]
+                cur.execute(_ITEMS_BY_EANS_SQL.format(placeholders=", ".join(["%s"] * len(chunk))), chunk)
+                rows += cur.fetchall()
+            cur.close()
+    except Error as e:
+        if replica is None:
+            raise
+        replica.mark_offline(e)
+        return replica.get_items(eans)
+
+    if replica is not None:
+        replica.note_latency(time.perf_counter() - started)
+        if rows:
+            replica.store_items(rows)
+    return {row[0]: _item_row(row) for row in rows}
+
+
+def db_save_product(ean: str, name: str, shop_id: int | None, qty: float, last_user_id: int | None):
+    _save_item("save_product", ean, name, shop_id, qty, last_user_id)
+
+
+def save_scan(ean: str, name: str, qty: float, shop_id: int | None, user_id: int | None) -> int | None:
+    return _save_item("save_scan", ean, name, qty, shop_id, user_id)
+
+
+def adjust_qty(ean: str, delta: float, user_id: int | None) -> dict:
+    """
+    qty += delta in einem Statement – parallele Scanner überschreiben sich
+    nicht. Ohne MySQL (Replikat) wird das Delta vorgemerkt.
+    """
+    replica = get_replica()
+    if replica is None or replica.mysql_available():
+        try:
+            with get_db_connection() as conn:
+                cur = conn.cursor()
+                item_id = item_repo.adjust_qty(cur, ean, delta, user_id)
+                cur.execute(_ITEM_QTY_SQL, (item_id,))
+                qty, row_version = cur.fetchone()
+                conn.commit()
+                cur.close()
+            invalidate_item(ean)
+            _index_saved_item("adjust_qty", ean, (delta, user_id))
+            return {"item_id": item_id, "qty": float(qty), "row_version": row_version, "queued": False}
+        except Error as e:
+            if replica is None:
+                raise
+            replica.mark_offline(e)
+
+    replica.queue_write("adjust_qty", ean, (delta, user_id))
+    invalidate_item(ean)
+    _index_saved_item("adjust_qty", ean, (delta, user_id))
+    row = replica.get_item(ean)
+    return {"item_id": None, "qty": row["qty"] if row else delta, "row_version": None, "queued": True}
+
+
+def _save_item_if_version(op: str, ean: str, expected_version: int, *args) -> dict:
+    """
+    Absolute Änderung nur, wenn seit dem Lesen niemand die Zeile geändert
+    hat. Bei Konflikt kommt der aktuelle Stand zurück, damit der Client neu
+    entscheiden kann. Braucht MySQL – das Replikat kennt keine Versionen.
+    """
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        if item_repo.update_if_version(cur, op, ean, expected_version, *args):
+            cur.execute("SELECT id, row_version FROM items WHERE ean = %s", (ean,))
+            item_id, row_version = cur.fetchone()
+            conn.commit()
+            cur.close()
+            invalidate_item(ean)
+            _index_saved_item(op, ean, args)
+            return {"ok": True, "item_id": item_id, "row_version": row_version}
+        conn.rollback()
+        cur.close()
+
+    invalidate_item(ean)
+    current = db_get_product(ean)
+    return {"ok": False, "conflict": current is not None, "current": current}
+
+
+def db_save_product_if_version(ean: str, name: str, shop_id: int | None, qty: float | None,
+                               last_user_id: int | None, expected_version: int) -> dict:
+    return _save_item_if_version("save_product", ean, expected_version, name, shop_id, qty, last_user_id)
+
+
+def save_scan_if_version(ean: str, name: str, qty: float, shop_id: int | None,
+                         user_id: int | None, expected_version: int) -> dict:
+    return _save_item_if_version("save_scan", ean, expected_version, name, qty, shop_id, user_id)
+
+
+# ------------------------------------------------------------
+# Shops (ändern sich selten -> im Prozess gecacht)
+# ------------------------------------------------------------
+
+_shops_lock = threading.Lock()
+_shops_state = {
+    "version": 0,       # wird bei jeder inhaltlichen Änderung hochgezählt
+    "etag": None,
+    "shops": None,
+    "loaded_at": 0.0,
+}
+
+
+def _load_shops():
+    with get_db_connection() as conn:
         cur = conn.cursor()
 
         cur.execute("SHOW TABLES LIKE 'shops'")
@@ -199,22 +578,57 @@ def get_shops():
         if not row:
             print("[get_shops] Tabelle 'shops' existiert noch nicht – leere Liste.")
             cur.close()
-            conn.close()
             return []
 
-        cur.execute("""
-            SELECT id, code, name, NULL
-            FROM shops
-            ORDER BY name
-        """)
+        cur.execute(_SHOPS_SQL)
         rows = cur.fetchall()
         cur.close()
-        conn.close()
 
-        return [
-            {"id": r[0], "code": r[1], "name": r[2], "web_url": r[3]}
-            for r in rows
-        ]
+    return [
+        {"id": r[0], "code": r[1], "name": r[2], "web_url": r[3]}
+        for r in rows
+    ]
+
+
+def get_shops_versioned():
+    """
+    Liefert (version, etag, shops). Die Liste wird höchstens alle
+    SHOPS_CACHE_TTL Sekunden neu gelesen; nur wenn sich der Inhalt
+    geändert hat, gibt es eine neue Version / ein neues ETag.
+    """
+    with _shops_lock:
+        state = _shops_state
+        fresh = time.monotonic() - state["loaded_at"] < SHOPS_CACHE_TTL
+        if state["shops"] is not None and fresh:
+            return state["version"], state["etag"], state["shops"]
+
+        try:
+            shops = _load_shops()
+        except Error as e:
+            replica = get_replica()
+            if replica is None:
+                raise
+            replica.mark_offline(e)
+            shops = replica.get_shops()
+        if shops != state["shops"]:
+            digest = hashlib.sha1(json.dumps(shops, sort_keys=True).encode("utf-8")).hexdigest()
+            state["version"] += 1
+            state["etag"] = f"shops-{digest[:16]}"
+            state["shops"] = shops
+        state["loaded_at"] = time.monotonic()
+        return state["version"], state["etag"], state["shops"]
+
+
+def invalidate_shops() -> None:
+    # Nach Änderungen an der Tabelle shops aufrufen
+    with _shops_lock:
+        _shops_state["loaded_at"] = 0.0
+
+
+def get_shops():
+    try:
+        _, _, shops = get_shops_versioned()
+        return [dict(shop) for shop in shops]
     except Error as e:
         print(f"[get_shops] DB-Fehler: {e}")
         return []
@@ -0,0 +1,264 @@
+# db_pool.py
+import queue
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error
+
+
+# liegt statt einer Verbindung in _idle: "ein Slot ist frei geworden" –
+# weckt einen Wartenden, damit er selbst eine neue Verbindung aufbaut
+_FREE_SLOT = object()
+
+
+class PoolTimeout(Error):
+    """Keine freie Verbindung innerhalb von DB_POOL_TIMEOUT Sekunden."""
+
+
+class PooledConnection:
+    """
+    Dünner Wrapper um eine mysql.connector-Verbindung.
+    close() schließt nicht, sondern gibt die Verbindung an den Pool zurück,
+    damit der bestehende Code (conn.close()) unverändert bleiben kann.
+    """
+
+    def __init__(self, pool, cnx):
+        self._pool = pool
+        self._cnx = cnx
+        self._cursors = []
+
+    def __getattr__(self, name):
+        cnx = self.__dict__.get("_cnx")
+        if cnx is None:
+            raise Error("Verbindung wurde bereits an den Pool zurückgegeben")
+        return getattr(cnx, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, *args, **kwargs):
+        cnx = self.__dict__.get("_cnx")
+        if cnx is None:
+            raise Error("Verbindung wurde bereits an den Pool zurückgegeben")
+        cur = cnx.cursor(*args, **kwargs)
+        if self._pool.cursor_wrapper is None:
+            return cur
+        cur = self._pool.cursor_wrapper(cur)
+        self._cursors.append(cur)
+        return cur
+
+    def _finish_cursors(self):
+        # nicht geschlossene Cursor: letztes Statement trotzdem verbuchen
+        cursors, self._cursors = self._cursors, []
+        for cur in cursors:
+            cur.finish()
+
+    def close(self):
+        self._finish_cursors()
+        cnx, self._cnx = self._cnx, None
+        if cnx is not None:
+            self._pool._release(cnx)
+
+    def discard(self):
+        # Verbindung nicht zurückgeben, sondern schließen – z.B. wenn ein
+        # ungepuffertes Resultset abgebrochen wurde und der Rest sonst erst
+        # komplett gelesen werden müsste.
+        self._finish_cursors()
+        cnx, self._cnx = self._cnx, None
+        if cnx is not None:
+            self._pool._discard(cnx)
+
+
+class ConnectionPool:
+    def __init__(self, db_config: dict, size: int = 5, timeout: float = 5.0,
+                 ping_interval: float = 30.0, cursor_wrapper=None, connect_timeout: float | None = None):
+        self.db_config = dict(db_config)
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.connect_timeout = connect_timeout
+        # z.B. query_stats.instrument – umhüllt jeden Cursor aus conn.cursor()
+        self.cursor_wrapper = cursor_wrapper
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._waiting = 0
+        self._free_slots = 0   # _FREE_SLOT-Marker in _idle
+        self._last_used = {}
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "connects": 0,
+            "health_check_failures": 0,
+            "reset_failures": 0,
+        }
+
+    # ------------------------------------------------------------
+    # Checkout / Rückgabe
+    # ------------------------------------------------------------
+
+    def get_connection(self) -> PooledConnection:
+        started = time.perf_counter()
+        waited = False
+
+        while True:
+            cnx = self._take_idle()
+            if cnx is None:
+                cnx = self._try_create()
+            if cnx is None:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"Kein freier DB-Slot nach {self.timeout:.1f}s (pool_size={self.size})"
+                    )
+                with self._lock:
+                    self._waiting += 1
+                try:
+                    cnx = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                finally:
+                    with self._lock:
+                        self._waiting -= 1
+                if cnx is _FREE_SLOT:
+                    with self._lock:
+                        self._free_slots -= 1
+                    continue
+
+            if not self._is_healthy(cnx):
+                self._discard(cnx)
+                with self._lock:
+                    self._stats["health_check_failures"] += 1
+                continue
+
+            wait = time.perf_counter() - started
+            with self._lock:
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["waits"] += 1
+                self._stats["wait_time_total"] += wait
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait)
+            return PooledConnection(self, cnx)
+
+    def _take_idle(self):
+        while True:
+            try:
+                cnx = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if cnx is not _FREE_SLOT:
+                return cnx
+            # Marker: der Slot wird gleich über _try_create genutzt
+            with self._lock:
+                self._free_slots -= 1
+
+    def _try_create(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            cnx = self._connect()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._stats["connects"] += 1
+        self._last_used[id(cnx)] = time.monotonic()
+        return cnx
+
+    def _connect(self):
+        config = dict(self.db_config)
+        if self.connect_timeout:
+            config.setdefault("connection_timeout", self.connect_timeout)
+        cnx = mysql.connector.connect(**config)
+        if self.connect_timeout:
+            # connection_timeout bleibt bei mysql.connector als Socket-Timeout
+            # für alle Lesevorgänge stehen – lange Abfragen (Import, Snapshot)
+            # würden abbrechen. Nur der Verbindungsaufbau soll begrenzt sein.
+            sock = getattr(getattr(cnx, "_socket", None), "sock", None)
+            if sock is not None:
+                sock.settimeout(None)
+        return cnx
+
+    def _is_healthy(self, cnx) -> bool:
+        # Nur pingen, wenn die Verbindung länger ungenutzt war –
+        # sonst kostet jeder Checkout wieder einen Round-Trip.
+        idle_for = time.monotonic() - self._last_used.get(id(cnx), 0.0)
+        if idle_for < self.ping_interval:
+            return True
+        try:
+            cnx.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _release(self, cnx):
+        # Offene Transaktionen, ungelesene Resultsets und Session-Zustand
+        # (@-Variablen wie @wawi_user_id, SET SESSION, temporäre Tabellen)
+        # verwerfen, damit der nächste Nutzer eine saubere Session bekommt.
+        try:
+            if cnx.unread_result:
+                cnx.get_rows()
+            cnx.rollback()
+            cnx.reset_session()
+        except Exception as e:
+            print(f"[db_pool] Reset beim Zurückgeben fehlgeschlagen, Verbindung verworfen: {e}")
+            with self._lock:
+                self._stats["reset_failures"] += 1
+            self._discard(cnx)
+            return
+        self._last_used[id(cnx)] = time.monotonic()
+        self._idle.put(cnx)
+
+    def _discard(self, cnx):
+        self._last_used.pop(id(cnx), None)
+        try:
+            cnx.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+            wake = self._waiting > self._free_slots
+            if wake:
+                self._free_slots += 1
+        if wake:
+            # sonst warten Threads in _idle.get() bis zum Pool-Timeout,
+            # obwohl _try_create jetzt wieder einen Slot bekäme
+            self._idle.put(_FREE_SLOT)
+
+    # ------------------------------------------------------------
+    # Statistik
+    # ------------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            created = self._created
+            idle = self._idle.qsize() - self._free_slots
+        s["pool_size"] = self.size
+        s["open"] = created
+        s["idle"] = idle
+        s["in_use"] = created - idle
+        s["wait_time_avg"] = s["wait_time_total"] / s["checkouts"] if s["checkouts"] else 0.0
+        return s
+
+    def close_all(self):
+        while True:
+            cnx = self._take_idle()
+            if cnx is None:
+                break
+            self._discard(cnx)
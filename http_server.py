@@ -0,0 +1,101 @@
+# http_server.py
+#
+# HTTP-Server für webapp.flask_app. Läuft wie bisher als Thread neben dem
+# pywebview-Fenster, aber statt des Werkzeug-Entwicklungsservers mit
+# waitress: fester Thread-Pool, Keep-Alive, Verbindungslimit und Timeout
+# für hängende Clients (z.B. abgebrochene Foto-Uploads vom Handy).
+#
+# Bewusst ein Prozess: Desktop-Session (Api.current_user_id), WebSocket-Loop
+# für broadcast_from_anywhere, Artikel-Cache und Suchindex liegen im
+# Speicher dieses Prozesses – vorgeforkte Worker sähen davon nichts.
+#
+#   HTTP_SERVER = "waitress"   # Produktion (Default)
+#   HTTP_SERVER = "werkzeug"   # Flask-Entwicklungsserver wie früher
+#   HTTP_SERVER = "asgi"       # uvicorn inkl. WebSocket, siehe asgi_server.py
+import threading
+
+from config import (
+    HTTP_HOST, HTTP_PORT, HTTP_SERVER, HTTP_THREADS, HTTP_CONNECTION_LIMIT,
+    HTTP_CHANNEL_TIMEOUT, HTTP_MAX_BODY_BYTES, HTTP_SHUTDOWN_TIMEOUT,
+)
+
+_server = None
+_thread = None
+
+
+def _create_waitress(app):
+    from waitress.server import create_server
+
+    return create_server(
+        app,
+        host=HTTP_HOST,
+        port=HTTP_PORT,
+        threads=HTTP_THREADS,
+        connection_limit=HTTP_CONNECTION_LIMIT,
+        # gilt für jede Verbindung ohne Daten, also auch Keep-Alive im Leerlauf
+        channel_timeout=HTTP_CHANNEL_TIMEOUT,
+        cleanup_interval=min(30, HTTP_CHANNEL_TIMEOUT),
+        max_request_body_size=HTTP_MAX_BODY_BYTES,
+        ident="wawi",
+    )
+
+
+def _create_werkzeug(app):
+    from werkzeug.serving import make_server
+
+    return make_server(HTTP_HOST, HTTP_PORT, app, threaded=True)
+
+
+def start_http_server(app) -> None:
+    """Startet den Server im Hintergrund-Thread (kehrt sofort zurück)."""
+    global _server, _thread
+    if _thread is not None:
+        return
+
+    if HTTP_SERVER == "asgi":
+        from asgi_server import start_asgi_server
+        start_asgi_server(app)
+        return
+
+    kind = HTTP_SERVER
+    if kind == "waitress":
+        try:
+            _server = _create_waitress(app)
+        except ImportError:
+            print("[http] waitress nicht installiert, nehme Werkzeug-Entwicklungsserver")
+            kind = "werkzeug"
+    if kind != "waitress":
+        _server = _create_werkzeug(app)
+
+    run = _server.run if kind == "waitress" else _server.serve_forever
+    _thread = threading.Thread(target=run, name="http-server", daemon=True)
+    _thread.start()
+    if kind == "waitress":
+        print(f"[http] waitress auf http://{HTTP_HOST}:{HTTP_PORT} "
+              f"({HTTP_THREADS} Threads, max. {HTTP_CONNECTION_LIMIT} Verbindungen)")
+    else:
+        print(f"[http] Werkzeug-Entwicklungsserver auf http://{HTTP_HOST}:{HTTP_PORT}")
+
+
+def stop_http_server() -> None:
+    """
+    Nimmt keine neuen Verbindungen mehr an und wartet bis
+    HTTP_SHUTDOWN_TIMEOUT auf laufende Requests.
+    """
+    global _server, _thread
+    if HTTP_SERVER == "asgi":
+        from asgi_server import stop_asgi_server
+        stop_asgi_server()
+        return
+    if _server is None:
+        return
+    if hasattr(_server, "task_dispatcher"):
+        # waitress: laufende Requests im Thread-Pool zu Ende bringen (noch
+        # nicht begonnene werden verworfen), dann Listen-Socket schließen
+        _server.task_dispatcher.shutdown(cancel_pending=True, timeout=HTTP_SHUTDOWN_TIMEOUT)
+        _server.close()
+    else:
+        _server.shutdown()
+        _thread.join(timeout=HTTP_SHUTDOWN_TIMEOUT)
+    _server = None
+    _thread = None
@@ -0,0 +1,139 @@
+# item_list.py
+#
+# Artikelliste für /api/items mit Keyset-Paginierung: statt OFFSET merkt
+# sich der Cursor den Sortierschlüssel der letzten Zeile (last_change_at
+# bzw. name, plus id) und die nächste Seite setzt per Index direkt dort an.
+# Seite 5000 kostet damit so viel wie Seite 1.
+#
+#   sort=changed  neueste zuerst (last_change_at DESC, id DESC), Artikel
+#                 ohne last_change_at kommen am Ende (id DESC)
+#   sort=name     alphabetisch (name, id)
+#
+# Filter shop_id / last_user_id laufen über die Indizes aus migrations.py
+# (Version 9). Der Cursor enthält Sortierung und Filter – mit anderen
+# Parametern wird er abgelehnt statt still falsche Seiten zu liefern.
+import base64
+import json
+from datetime import datetime
+
+from db import get_db_connection
+
+SORTS = ("changed", "name")
+
+_COLUMNS = "ean, id, name, image_path, qty, shop_id, last_user_id, last_change_at, row_version"
+
+
+class CursorError(ValueError):
+    """Cursor kaputt oder passt nicht zu Sortierung/Filtern."""
+
+
+def encode_cursor(sort: str, filters: dict, key, item_id: int) -> str:
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    raw = json.dumps({"s": sort, "f": filters, "k": key, "i": item_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, filters: dict):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        key, item_id = data["k"], int(data["i"])
+        if data.get("s") == "changed" and key is not None:
+            key = datetime.fromisoformat(key)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise CursorError(f"Cursor ungültig: {e}")
+    if data.get("s") != sort or data.get("f") != filters:
+        raise CursorError("Cursor gehört zu anderer Sortierung oder anderen Filtern")
+    return key, item_id
+
+
+def _filter_sql(filters: dict):
+    where, params = [], []
+    for col in ("shop_id", "last_user_id"):
+        if filters.get(col) is not None:
+            where.append(f"{col} = %s")
+            params.append(filters[col])
+    return where, params
+
+
+def _page_sql(sort: str, filters: dict, after, limit: int, nulls: bool = False):
+    """
+    Ein Seiten-Statement. after = (key, id) der letzten Zeile oder None.
+    Die Seek-Bedingung ist als "key <= ? AND (key < ? OR id < ?)"
+    geschrieben – so erkennt MySQL den Range-Zugriff auf den Index.
+    """
+    where, params = _filter_sql(filters)
+    if sort == "name":
+        if after is not None:
+            where.append("name >= %s AND (name > %s OR id > %s)")
+            params += [after[0], after[0], after[1]]
+        order = "name, id"
+    elif nulls:
+        where.append("last_change_at IS NULL")
+        if after is not None:
+            where.append("id < %s")
+            params.append(after[1])
+        order = "id DESC"
+    else:
+        where.append("last_change_at IS NOT NULL")
+        if after is not None:
+            where.append("last_change_at <= %s AND (last_change_at < %s OR id < %s)")
+            params += [after[0], after[0], after[1]]
+        order = "last_change_at DESC, id DESC"
+
+    sql = f"SELECT {_COLUMNS} FROM items "
+    if where:
+        sql += f"WHERE {' AND '.join(where)} "
+    sql += f"ORDER BY {order} LIMIT %s"
+    return sql, tuple(params) + (limit,)
+
+
+def _row(r) -> dict:
+    return {
+        "ean": r[0],
+        "id": r[1],
+        "name": r[2],
+        "image_path": r[3] or "",
+        "qty": float(r[4]) if r[4] is not None else 0.0,
+        "shop_id": r[5],
+        "last_user_id": r[6],
+        "last_change_at": r[7].isoformat() if r[7] else None,
+        "row_version": r[8],
+    }
+
+
+def list_items(sort: str = "changed", limit: int = 50, cursor: str | None = None,
+               shop_id: int | None = None, last_user_id: int | None = None) -> dict:
+    """Eine Seite Artikel; next_cursor ist None auf der letzten Seite."""
+    if sort not in SORTS:
+        raise CursorError(f"Unbekannte Sortierung: {sort}")
+    filters = {"shop_id": shop_id, "last_user_id": last_user_id}
+    after = decode_cursor(cursor, sort, filters) if cursor else None
+
+    # sort=changed läuft in zwei Abschnitten: erst alle mit Zeitstempel,
+    # danach die ohne (Cursor-Schlüssel None)
+    in_nulls = sort == "changed" and after is not None and after[0] is None
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        # eine Zeile mehr holen: zeigt an, ob es eine nächste Seite gibt
+        cur.execute(*_page_sql(sort, filters, after, limit + 1, nulls=in_nulls))
+        rows = cur.fetchall()
+        if sort == "changed" and not in_nulls and len(rows) <= limit:
+            cur.execute(*_page_sql(sort, filters, None, limit + 1 - len(rows), nulls=True))
+            rows += cur.fetchall()
+        cur.close()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        key = last[2] if sort == "name" else last[7]
+        next_cursor = encode_cursor(sort, filters, key, last[1])
+    return {
+        "sort": sort,
+        "limit": limit,
+        "items": [_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
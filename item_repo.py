@@ -0,0 +1,307 @@
+# item_repo.py
+#
+# Alle Schreibzugriffe auf items laufen hier durch: genau ein
+# INSERT ... ON DUPLICATE KEY UPDATE pro Speichervorgang (setzt den
+# UNIQUE-Index auf items.ean voraus). Kein vorheriges SELECT mehr, damit
+# Desktop und Handy sich beim gleichen EAN nicht gegenseitig überholen.
+
+# Merge-Regeln pro Feld, wenn die Zeile schon existiert:
+SET = "set"            # immer überschreiben (auch mit NULL)
+KEEP_IF_NULL = "keep_if_null"    # None -> bestehenden Wert behalten
+KEEP_IF_EMPTY = "keep_if_empty"  # None/"" -> bestehenden Wert behalten
+INSERT_ONLY = "insert_only"      # nur beim Anlegen setzen
+ADD = "add"                      # Wert aufaddieren (Delta), beim Anlegen Startwert
+
+# Werte, die beim Anlegen statt None eingetragen werden
+INSERT_DEFAULTS = {
+    "name": "",
+    "qty": 0.0,
+}
+
+ITEM_COLUMNS = ("name", "image_path", "qty", "shop_id", "last_user_id")
+
+
+def build_upsert(values: dict, rules: dict, touch: bool = True):
+    """
+    Baut das Upsert-Statement für items.
+
+    values: Spalte -> Wert (inkl. ean), rules: Spalte -> Merge-Regel (Default SET).
+    touch: last_change_at = NOW() bei Insert und Update setzen.
+    Gibt (sql, params) zurück.
+    """
+    cols = ["ean"]
+    placeholders = ["%s"]
+    insert_params = [values["ean"]]
+    updates = []
+    update_params = []
+
+    for col, val in values.items():
+        if col == "ean":
+            continue
+        if col not in ITEM_COLUMNS:
+            raise ValueError(f"Unbekannte Spalte für items: {col}")
+
+        rule = rules.get(col, SET)
+        cols.append(col)
+        if col in INSERT_DEFAULTS:
+            placeholders.append("COALESCE(%s, %s)")
+            insert_params += [val, INSERT_DEFAULTS[col]]
+        else:
+            placeholders.append("%s")
+            insert_params.append(val)
+
+        if rule == SET:
+            updates.append(f"{col} = VALUES({col})")
+        elif rule == KEEP_IF_NULL:
+            updates.append(f"{col} = IF(%s IS NULL, {col}, VALUES({col}))")
+            update_params.append(val)
+        elif rule == KEEP_IF_EMPTY:
+            updates.append(f"{col} = IF(%s IS NULL OR %s = '', {col}, VALUES({col}))")
+            update_params += [val, val]
+        elif rule == INSERT_ONLY:
+            pass
+        elif rule == ADD:
+            updates.append(f"{col} = {col} + COALESCE(VALUES({col}), 0)")
+        else:
+            raise ValueError(f"Unbekannte Merge-Regel: {rule}")
+
+    if touch:
+        cols.append("last_change_at")
+        placeholders.append("NOW()")
+        updates.append("last_change_at = NOW()")
+
+    # LAST_INSERT_ID(id) sorgt dafür, dass cursor.lastrowid auch beim
+    # Update die id der bestehenden Zeile liefert.
+    updates.append("id = LAST_INSERT_ID(id)")
+
+    sql = (
+        f"INSERT INTO items ({', '.join(cols)}) "
+        f"VALUES ({', '.join(placeholders)}) "
+        f"ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+    )
+    return sql, tuple(insert_params + update_params)
+
+
+def upsert_item(cur, ean: str, values: dict, rules: dict | None = None, touch: bool = True) -> int:
+    """Ein Round-Trip pro Speichern. Commit macht der Aufrufer. Gibt items.id zurück."""
+    sql, params = build_upsert({"ean": ean, **values}, rules or {}, touch=touch)
+    cur.execute(sql, params)
+    return cur.lastrowid
+
+
+def build_update(values: dict, rules: dict, expected_version: int, touch: bool = True):
+    """
+    UPDATE mit denselben Merge-Regeln wie build_upsert, aber nur wenn
+    items.row_version noch dem erwarteten Stand entspricht (Compare-and-Swap).
+    Legt keine Zeile an. Gibt (sql, params) zurück.
+    """
+    updates = []
+    params = []
+    for col, val in values.items():
+        if col == "ean":
+            continue
+        if col not in ITEM_COLUMNS:
+            raise ValueError(f"Unbekannte Spalte für items: {col}")
+
+        rule = rules.get(col, SET)
+        if rule == SET:
+            updates.append(f"{col} = %s")
+            params.append(val)
+        elif rule == KEEP_IF_NULL:
+            updates.append(f"{col} = COALESCE(%s, {col})")
+            params.append(val)
+        elif rule == KEEP_IF_EMPTY:
+            updates.append(f"{col} = IF(%s IS NULL OR %s = '', {col}, %s)")
+            params += [val, val, val]
+        elif rule == INSERT_ONLY:
+            pass
+        elif rule == ADD:
+            updates.append(f"{col} = {col} + COALESCE(%s, 0)")
+            params.append(val)
+        else:
+            raise ValueError(f"Unbekannte Merge-Regel: {rule}")
+
+    if touch:
+        updates.append("last_change_at = NOW()")
+    # row_version zählt der Trigger hoch (migrations.py, Version 8)
+    sql = f"UPDATE items SET {', '.join(updates)} WHERE ean = %s AND row_version = %s"
+    return sql, tuple(params) + (values["ean"], expected_version)
+
+
+def update_if_version(cur, op: str, ean: str, expected_version: int, *args) -> bool:
+    """
+    Schreibt die Operation nur, wenn row_version == expected_version. False
+    heißt: inzwischen von jemand anderem geändert (oder EAN unbekannt).
+    """
+    values, rules, touch = item_spec(op, *args)
+    sql, params = build_update({"ean": ean, **values}, rules, expected_version, touch=touch)
+    cur.execute(sql, params)
+    return cur.rowcount == 1
+
+
+def merge_row(existing: dict | None, values: dict, rules: dict) -> dict:
+    """
+    Dieselben Merge-Regeln wie build_upsert, nur in Python – für Kopien der
+    items-Zeile außerhalb von MySQL (lokales Replikat).
+    """
+    if existing is None:
+        row = {col: None for col in ITEM_COLUMNS}
+        for col, val in values.items():
+            row[col] = INSERT_DEFAULTS.get(col) if val is None and col in INSERT_DEFAULTS else val
+        return row
+
+    row = dict(existing)
+    for col, val in values.items():
+        if col == "ean":
+            continue
+        rule = rules.get(col, SET)
+        if rule == SET:
+            row[col] = val
+        elif rule == KEEP_IF_NULL and val is not None:
+            row[col] = val
+        elif rule == KEEP_IF_EMPTY and val:
+            row[col] = val
+        elif rule == ADD:
+            row[col] = (row[col] or 0) + (val or 0)
+    return row
+
+
+# ------------------------------------------------------------
+# Speichervorgänge der einzelnen Aufrufer
+# ------------------------------------------------------------
+#
+# Jede Operation liefert (values, rules, touch); save_*() schreibt sie per
+# Upsert, das lokale Replikat wendet sie mit merge_row() an.
+
+def _name_spec(name: str, user_id: int | None = None):
+    # WS save_name: Name + Bearbeiter setzen, Menge/Bild nicht anfassen
+    return {
+        "name": name,
+        "qty": None,
+        "last_user_id": user_id,
+    }, {"qty": INSERT_ONLY}, True
+
+
+def _image_path_spec(image_path: str):
+    # Bild-Upload: nur image_path, Name beim Anlegen leer. last_change_at
+    # wird gesetzt, sonst sieht der Replikat-Abgleich das neue Bild nie
+    return {
+        "name": "",
+        "image_path": image_path,
+    }, {"name": INSERT_ONLY}, True
+
+
+def _product_spec(name: str, shop_id: int | None, qty: float | None, last_user_id: int | None):
+    # Desktop Api.save_product: None heißt "bestehenden Wert behalten"
+    return {
+        "name": name,
+        "shop_id": shop_id,
+        "qty": qty,
+        "last_user_id": last_user_id,
+    }, {
+        "shop_id": KEEP_IF_NULL,
+        "qty": KEEP_IF_NULL,
+        "last_user_id": KEEP_IF_NULL,
+    }, True
+
+
+def _scan_spec(name: str, qty: float, shop_id: int | None, user_id: int | None):
+    # Mobile /api/save_item: leerer Name behält den bestehenden Namen
+    return {
+        "name": name,
+        "qty": qty,
+        "shop_id": shop_id,
+        "last_user_id": user_id,
+    }, {"name": KEEP_IF_EMPTY}, True
+
+
+def _adjust_spec(delta: float, user_id: int | None):
+    # Zu-/Abgang: qty += delta in einem Statement, unbekannte EAN wird mit
+    # leerem Namen und qty = delta angelegt
+    return {
+        "name": "",
+        "qty": delta,
+        "last_user_id": user_id,
+    }, {
+        "name": INSERT_ONLY,
+        "qty": ADD,
+        "last_user_id": KEEP_IF_NULL,
+    }, True
+
+
+OPS = {
+    "save_name": _name_spec,
+    "save_image_path": _image_path_spec,
+    "save_product": _product_spec,
+    "save_scan": _scan_spec,
+    "adjust_qty": _adjust_spec,
+}
+
+# Operationen, deren Reihenfolge egal ist: beim Nachspielen aus dem
+# Replikat gibt es keinen Konflikt, sie werden immer angewendet
+COMMUTATIVE_OPS = {"adjust_qty"}
+
+
+def item_spec(op: str, *args):
+    return OPS[op](*args)
+
+
+def save(cur, op: str, ean: str, *args) -> int:
+    values, rules, touch = item_spec(op, *args)
+    return upsert_item(cur, ean, values, rules, touch=touch)
+
+
+def save_name(cur, ean: str, name: str, user_id: int | None = None) -> int:
+    return save(cur, "save_name", ean, name, user_id)
+
+
+def save_image_path(cur, ean: str, image_path: str) -> int:
+    return save(cur, "save_image_path", ean, image_path)
+
+
+def save_product(cur, ean: str, name: str, shop_id: int | None, qty: float | None,
+                 last_user_id: int | None) -> int:
+    return save(cur, "save_product", ean, name, shop_id, qty, last_user_id)
+
+
+def save_scan(cur, ean: str, name: str, qty: float, shop_id: int | None,
+              user_id: int | None) -> int:
+    return save(cur, "save_scan", ean, name, qty, shop_id, user_id)
+
+
+def adjust_qty(cur, ean: str, delta: float, user_id: int | None) -> int:
+    return save(cur, "adjust_qty", ean, delta, user_id)
+
+
+# ------------------------------------------------------------
+# Massen-Upsert (Katalog-Import)
+# ------------------------------------------------------------
+
+def build_bulk_upsert(columns: tuple) -> str:
+    """
+    Upsert für cursor.executemany(). Im UPDATE-Teil stehen nur VALUES(),
+    keine Platzhalter – nur dann fasst mysql.connector die Zeilen zu
+    einem mehrzeiligen INSERT zusammen.
+
+    columns: Spalten (ohne ean) in der Reihenfolge der Parameter.
+    Leerer Name behält den bestehenden Namen, fehlende Spalten bleiben
+    beim Update unverändert.
+    """
+    for col in columns:
+        if col not in ITEM_COLUMNS:
+            raise ValueError(f"Unbekannte Spalte für items: {col}")
+
+    updates = []
+    for col in columns:
+        if col == "name":
+            updates.append("name = IF(VALUES(name) = '', name, VALUES(name))")
+        else:
+            updates.append(f"{col} = VALUES({col})")
+    updates.append("last_change_at = NOW()")
+
+    cols = ("ean",) + tuple(columns)
+    return (
+        f"INSERT INTO items ({', '.join(cols)}, last_change_at) "
+        f"VALUES ({', '.join(['%s'] * len(cols))}, NOW()) "
+        f"ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+    )
@@ -0,0 +1,87 @@
+# locations.py
+#
+# "Wo liegt dieser Artikel?" – aus item_locations, einer flachen Kopie von
+# Raum/Regal/Fach/Box pro Inventar-Zeile. Gepflegt wird sie per Trigger
+# (migrations.py, Version 6) bei Inventar-Änderungen, Box-Umzügen und
+# Umbenennungen; die Abfrage ist ein einzelner Indexzugriff über die EAN.
+#
+#   python locations.py 4003082045927
+#   python locations.py --rebuild
+import argparse
+import json
+import sys
+
+from db import get_db_connection
+from migrations import ITEM_LOCATIONS_FILL_SQL
+
+_LOCATIONS_SQL = """
+    SELECT i.id, i.name, l.box_code, l.room_code, l.shelf_code, l.bin_code, l.path, l.qty
+    FROM items i
+    LEFT JOIN item_locations l ON l.item_id = i.id
+    WHERE i.ean = %s
+    ORDER BY l.path, l.box_code
+"""
+
+
+def get_item_locations(ean: str) -> dict | None:
+    """Alle Lagerorte eines Artikels; None, wenn die EAN unbekannt ist."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_LOCATIONS_SQL, (ean,))
+        rows = cur.fetchall()
+        cur.close()
+    if not rows:
+        return None
+
+    locations = [
+        {
+            "box_code": r[2],      # None = lose im Fach
+            "room_code": r[3],
+            "shelf_code": r[4],
+            "bin_code": r[5],
+            "path": r[6],
+            "qty": float(r[7]) if r[7] is not None else 0.0,
+        }
+        for r in rows if r[6] is not None
+    ]
+    return {
+        "item_id": rows[0][0],
+        "ean": ean,
+        "name": rows[0][1],
+        "total_qty": sum(loc["qty"] for loc in locations),
+        "locations": locations,
+    }
+
+
+def rebuild_locations() -> int:
+    # Komplett neu aufbauen, z.B. nach Änderungen mit deaktivierten Triggern.
+    # In einer Transaktion: Leser sehen bis zum Commit den alten Stand.
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM item_locations")
+        cur.execute(ITEM_LOCATIONS_FILL_SQL)
+        count = cur.rowcount
+        conn.commit()
+        cur.close()
+    print(f"[locations] item_locations neu aufgebaut: {count} Lagerorte")
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lagerorte eines Artikels anzeigen")
+    parser.add_argument("ean", nargs="?")
+    parser.add_argument("--rebuild", action="store_true", help="item_locations komplett neu aufbauen")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        rebuild_locations()
+        return 0
+    if not args.ean:
+        parser.error("EAN oder --rebuild angeben")
+    result = get_item_locations(args.ean)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0 if result else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
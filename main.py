@@ -4,22 +4,35 @@ import threading
 import webview
 
 from api import Api
+from config import HTTP_SERVER
+from db import start_replica_sync, start_search_index
 from webapp import flask_app, set_api_instance
+from http_server import start_http_server, stop_http_server
 from websocket_server import start_ws_server
 from rfid_monitor import start_rfid_serial_monitor
-
-
-def start_http_server():
-    print("HTTP-Server auf http://0.0.0.0:8000")
-    flask_app.run(host="0.0.0.0", port=8000)
+from scan_queue import get_scan_queue
+from stock import start_stock_verifier
+from stock_ledger import start_stock_snapshots
+from static_assets import start_static_build
 
 
 def main():
     api = Api()
     set_api_instance(api)
 
-    threading.Thread(target=start_ws_server, daemon=True).start()
-    threading.Thread(target=start_http_server, daemon=True).start()
+    # Write-Behind (falls aktiviert) gleich starten, damit ein Journal vom
+    # letzten Lauf sofort nachgeschrieben wird
+    get_scan_queue()
+    start_replica_sync()
+    start_stock_verifier()
+    start_stock_snapshots()
+    start_search_index()
+    start_static_build()
+
+    # Im ASGI-Betrieb bedient der HTTP-Server auch die WebSockets
+    if HTTP_SERVER != "asgi":
+        threading.Thread(target=start_ws_server, daemon=True).start()
+    start_http_server(flask_app)
 
     threading.Thread(
         target=start_rfid_serial_monitor,
@@ -37,6 +50,9 @@ def main():
     )
     webview.start(debug=True)
 
+    # Fenster zu: laufende Requests (z.B. Uploads) noch zu Ende bringen
+    stop_http_server()
+
 
 if __name__ == "__main__":
     main()
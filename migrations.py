@@ -0,0 +1,811 @@
+# migrations.py
+#
+# Versionierte Schema-Migrationen für wawi_b7. Läuft beim Start (db.init_db)
+# und bringt die Datenbank auf den Stand, den der Code erwartet:
+# items.ean mit UNIQUE-Index (Voraussetzung für die Upserts in item_repo),
+# users.rfid_uid normalisiert und eindeutig, Indizes für die häufigen Abfragen.
+#
+# Angewendete Versionen stehen in schema_migrations. DDL committet in MySQL
+# sofort, deshalb prüft jede Migration selbst, was schon da ist – nach einem
+# Abbruch kann sie einfach noch einmal laufen.
+#
+#   python migrations.py             # ausstehende Migrationen anwenden
+#   python migrations.py --status
+#   python migrations.py --explain   # EXPLAIN-Bericht für die Abfragen aus db.py
+import argparse
+import sys
+
+from mysql.connector import Error
+
+LOCK_NAME = "wawi_schema_migrations"
+LOCK_TIMEOUT = 30
+
+MIGRATIONS = []   # (version, name, func), aufsteigend nach version
+
+
+class MigrationError(Error):
+    """Migration konnte nicht angewendet werden (z.B. doppelte EANs)."""
+
+
+def migration(version: int, name: str):
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+# ------------------------------------------------------------
+# Hilfsfunktionen (information_schema)
+# ------------------------------------------------------------
+
+def _table_exists(cur, table: str) -> bool:
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return cur.fetchone()[0] > 0
+
+
+def _column_exists(cur, table: str, column: str) -> bool:
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cur.fetchone()[0] > 0
+
+
+def _has_index(cur, table: str, columns: tuple, unique: bool = False) -> bool:
+    # Irgendein Index, der mit genau diesen Spalten beginnt – egal wie er heißt
+    # (z.B. ein per Hand angelegtes UNIQUE auf ean).
+    cur.execute("""
+        SELECT index_name, MIN(non_unique),
+               GROUP_CONCAT(column_name ORDER BY seq_in_index SEPARATOR ',')
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        GROUP BY index_name
+    """, (table,))
+    wanted = list(columns)
+    for _, non_unique, cols in cur.fetchall():
+        cols = _text(cols).split(",")
+        if unique:
+            if cols == wanted and not non_unique:
+                return True
+        elif cols[:len(wanted)] == wanted:
+            return True
+    return False
+
+
+def _add_column(cur, table: str, column: str, definition: str) -> None:
+    if not _column_exists(cur, table, column):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        print(f"[migrations]   {table}.{column} angelegt")
+
+
+def _create_index(cur, table: str, name: str, columns: tuple, unique: bool = False) -> None:
+    if _has_index(cur, table, columns, unique=unique):
+        return
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cur.execute(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})")
+    print(f"[migrations]   {kind} {name} auf {table}({', '.join(columns)}) angelegt")
+
+
+def _check_duplicates(cur, table: str, column: str) -> None:
+    cur.execute(f"""
+        SELECT {column}, COUNT(*) FROM {table}
+        WHERE {column} IS NOT NULL
+        GROUP BY {column} HAVING COUNT(*) > 1
+        LIMIT 10
+    """)
+    dups = cur.fetchall()
+    if dups:
+        listed = ", ".join(f"{value!r} ({count}x)" for value, count in dups)
+        raise MigrationError(
+            f"{table}.{column} ist nicht eindeutig, bitte erst bereinigen: {listed}"
+        )
+
+
+# ------------------------------------------------------------
+# Migrationen
+# ------------------------------------------------------------
+
+@migration(1, "items_scanner_columns")
+def _items_scanner_columns(cur):
+    # wawi_b7.sql kennt nur id/sku/name/note – der Scanner braucht mehr
+    if not _table_exists(cur, "items"):
+        cur.execute("""
+            CREATE TABLE items (
+              id   BIGINT PRIMARY KEY AUTO_INCREMENT,
+              sku  VARCHAR(64) UNIQUE NULL,
+              name VARCHAR(255) NOT NULL,
+              note TEXT NULL
+            ) ENGINE=InnoDB
+        """)
+        cur.execute("CREATE INDEX idx_items_name ON items(name)")
+        print("[migrations]   Tabelle items angelegt")
+    _add_column(cur, "items", "ean", "VARCHAR(32) NULL")
+    _add_column(cur, "items", "image_path", "VARCHAR(512) NULL")
+    _add_column(cur, "items", "qty", "DECIMAL(12,3) NOT NULL DEFAULT 0")
+    _add_column(cur, "items", "shop_id", "BIGINT NULL")
+    _add_column(cur, "items", "last_user_id", "BIGINT NULL")
+    _add_column(cur, "items", "last_change_at", "DATETIME NULL")
+
+
+@migration(2, "items_ean_unique")
+def _items_ean_unique(cur):
+    # Leere EANs würden sonst alle miteinander kollidieren
+    cur.execute("UPDATE items SET ean = NULL WHERE TRIM(ean) = ''")
+    _check_duplicates(cur, "items", "ean")
+    _create_index(cur, "items", "uq_items_ean", ("ean",), unique=True)
+
+
+@migration(3, "users_rfid_uid_unique")
+def _users_rfid_uid_unique(cur):
+    if not _table_exists(cur, "users"):
+        cur.execute("""
+            CREATE TABLE users (
+              id       BIGINT PRIMARY KEY AUTO_INCREMENT,
+              name     VARCHAR(255) NOT NULL,
+              rfid_uid VARCHAR(64) NULL
+            ) ENGINE=InnoDB
+        """)
+        print("[migrations]   Tabelle users angelegt")
+    _add_column(cur, "users", "rfid_uid", "VARCHAR(64) NULL")
+
+    # Normalform wie db.normalize_rfid_uid, damit Lookups ohne LOWER() über
+    # den Index laufen
+    cur.execute("""
+        UPDATE users
+        SET rfid_uid = NULLIF(LOWER(REPLACE(REPLACE(REPLACE(TRIM(rfid_uid), ':', ''), '-', ''), ' ', '')), '')
+        WHERE rfid_uid IS NOT NULL
+    """)
+    _check_duplicates(cur, "users", "rfid_uid")
+    _create_index(cur, "users", "uq_users_rfid_uid", ("rfid_uid",), unique=True)
+
+
+@migration(4, "items_last_change_index")
+def _items_last_change_index(cur):
+    # Inkrementeller Abgleich des Replikats: Keyset über (last_change_at, id),
+    # die id hängt InnoDB an jeden Sekundärindex an
+    _create_index(cur, "items", "idx_items_last_change", ("last_change_at",))
+
+
+# Bestandssummen pro Artikel (stock.py). Die Trigger rechnen nur die
+# Differenz der geänderten Zeile ein, nie die ganze Summe neu.
+_STOCK_TRIGGERS = {
+    "trg_box_inv_ai": """
+        CREATE TRIGGER trg_box_inv_ai AFTER INSERT ON box_inventory FOR EACH ROW
+        INSERT INTO item_stock (item_id, box_qty, box_count) VALUES (NEW.item_id, NEW.qty, 1)
+        ON DUPLICATE KEY UPDATE box_qty = box_qty + NEW.qty, box_count = box_count + 1
+    """,
+    "trg_box_inv_au": """
+        CREATE TRIGGER trg_box_inv_au AFTER UPDATE ON box_inventory FOR EACH ROW
+        BEGIN
+          IF NEW.item_id = OLD.item_id THEN
+            UPDATE item_stock SET box_qty = box_qty + (NEW.qty - OLD.qty)
+            WHERE item_id = NEW.item_id;
+          ELSE
+            UPDATE item_stock SET box_qty = box_qty - OLD.qty, box_count = box_count - 1
+            WHERE item_id = OLD.item_id;
+            INSERT INTO item_stock (item_id, box_qty, box_count) VALUES (NEW.item_id, NEW.qty, 1)
+            ON DUPLICATE KEY UPDATE box_qty = box_qty + NEW.qty, box_count = box_count + 1;
+          END IF;
+        END
+    """,
+    "trg_box_inv_ad": """
+        CREATE TRIGGER trg_box_inv_ad AFTER DELETE ON box_inventory FOR EACH ROW
+        UPDATE item_stock SET box_qty = box_qty - OLD.qty, box_count = box_count - 1
+        WHERE item_id = OLD.item_id
+    """,
+    "trg_bin_inv_ai": """
+        CREATE TRIGGER trg_bin_inv_ai AFTER INSERT ON bin_inventory FOR EACH ROW
+        INSERT INTO item_stock (item_id, bin_qty, bin_count) VALUES (NEW.item_id, NEW.qty, 1)
+        ON DUPLICATE KEY UPDATE bin_qty = bin_qty + NEW.qty, bin_count = bin_count + 1
+    """,
+    "trg_bin_inv_au": """
+        CREATE TRIGGER trg_bin_inv_au AFTER UPDATE ON bin_inventory FOR EACH ROW
+        BEGIN
+          IF NEW.item_id = OLD.item_id THEN
+            UPDATE item_stock SET bin_qty = bin_qty + (NEW.qty - OLD.qty)
+            WHERE item_id = NEW.item_id;
+          ELSE
+            UPDATE item_stock SET bin_qty = bin_qty - OLD.qty, bin_count = bin_count - 1
+            WHERE item_id = OLD.item_id;
+            INSERT INTO item_stock (item_id, bin_qty, bin_count) VALUES (NEW.item_id, NEW.qty, 1)
+            ON DUPLICATE KEY UPDATE bin_qty = bin_qty + NEW.qty, bin_count = bin_count + 1;
+          END IF;
+        END
+    """,
+    "trg_bin_inv_ad": """
+        CREATE TRIGGER trg_bin_inv_ad AFTER DELETE ON bin_inventory FOR EACH ROW
+        UPDATE item_stock SET bin_qty = bin_qty - OLD.qty, bin_count = bin_count - 1
+        WHERE item_id = OLD.item_id
+    """,
+    # FK-Kaskaden (Box/Fach gelöscht) lösen in MySQL keine Trigger auf den
+    # Inventar-Tabellen aus – deshalb vorher hier abziehen.
+    "trg_boxes_bd": """
+        CREATE TRIGGER trg_boxes_bd BEFORE DELETE ON boxes FOR EACH ROW
+        UPDATE item_stock s JOIN box_inventory bi ON bi.item_id = s.item_id
+        SET s.box_qty = s.box_qty - bi.qty, s.box_count = s.box_count - 1
+        WHERE bi.box_id = OLD.id
+    """,
+    "trg_bins_bd": """
+        CREATE TRIGGER trg_bins_bd BEFORE DELETE ON bins FOR EACH ROW
+        UPDATE item_stock s JOIN bin_inventory bi ON bi.item_id = s.item_id
+        SET s.bin_qty = s.bin_qty - bi.qty, s.bin_count = s.bin_count - 1
+        WHERE bi.bin_id = OLD.id
+    """,
+}
+
+
+@migration(5, "item_stock_totals")
+def _item_stock_totals(cur):
+    for table in ("bins", "boxes", "box_inventory"):
+        if not _table_exists(cur, table):
+            raise MigrationError(f"Tabelle {table} fehlt – erst database/wawi_b7.sql einspielen")
+    if not _table_exists(cur, "bin_inventory"):
+        # wie database/bin-inventory-table.sql
+        cur.execute("""
+            CREATE TABLE bin_inventory (
+              bin_id  BIGINT NOT NULL,
+              item_id BIGINT NOT NULL,
+              qty     DECIMAL(12,3) NOT NULL DEFAULT 0,
+              PRIMARY KEY (bin_id, item_id),
+              CONSTRAINT fk_bin_inv_bin
+                FOREIGN KEY (bin_id) REFERENCES bins(id)
+                ON UPDATE CASCADE
+                ON DELETE CASCADE,
+              CONSTRAINT fk_bin_inv_item
+                FOREIGN KEY (item_id) REFERENCES items(id)
+                ON UPDATE CASCADE
+                ON DELETE CASCADE
+            ) ENGINE=InnoDB
+        """)
+        cur.execute("CREATE INDEX idx_bin_inv_item ON bin_inventory(item_id)")
+        print("[migrations]   Tabelle bin_inventory angelegt")
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS item_stock (
+          item_id    BIGINT PRIMARY KEY,
+          box_qty    DECIMAL(14,3) NOT NULL DEFAULT 0,
+          bin_qty    DECIMAL(14,3) NOT NULL DEFAULT 0,
+          total_qty  DECIMAL(14,3) AS (box_qty + bin_qty) STORED,
+          box_count  INT NOT NULL DEFAULT 0,
+          bin_count  INT NOT NULL DEFAULT 0,
+          updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+          CONSTRAINT fk_item_stock_item
+            FOREIGN KEY (item_id) REFERENCES items(id)
+            ON UPDATE CASCADE
+            ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """)
+
+    # Erst Trigger, dann Startwerte: was dazwischen geändert wird, zählt
+    # der Trigger schon mit, und die Startwerte überschreiben absolut.
+    for name, sql in _STOCK_TRIGGERS.items():
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(sql)
+    print(f"[migrations]   {len(_STOCK_TRIGGERS)} Trigger für item_stock angelegt")
+
+    cur.execute("""
+        INSERT INTO item_stock (item_id, box_qty, bin_qty, box_count, bin_count)
+        SELECT item_id, SUM(box_qty), SUM(bin_qty), SUM(box_count), SUM(bin_count)
+        FROM (
+          SELECT item_id, qty AS box_qty, 0 AS bin_qty, 1 AS box_count, 0 AS bin_count FROM box_inventory
+          UNION ALL
+          SELECT item_id, 0, qty, 0, 1 FROM bin_inventory
+        ) inv
+        GROUP BY item_id
+        ON DUPLICATE KEY UPDATE
+          box_qty = VALUES(box_qty), bin_qty = VALUES(bin_qty),
+          box_count = VALUES(box_count), bin_count = VALUES(bin_count)
+    """)
+    print("[migrations]   item_stock aus box_inventory/bin_inventory befüllt")
+
+
+# Lagerorte pro Artikel (locations.py): Codes und Pfad wie auf den Etiketten
+# ("R4 / S02 / F01", vgl. catalog_export.location_path), damit "wo liegt
+# das?" ohne Join über rooms/shelves/bins/boxes beantwortet wird.
+_LOCATION_PATH = "CONCAT_WS(' / ', r.code, s.code, bn.code)"
+
+ITEM_LOCATIONS_FILL_SQL = f"""
+    INSERT INTO item_locations (item_id, box_id, bin_id, box_code, bin_code, shelf_code, room_code, path, qty)
+    SELECT bi.item_id, b.id, bn.id, b.box_code, bn.code, s.code, r.code, {_LOCATION_PATH}, bi.qty
+    FROM box_inventory bi
+    JOIN boxes b ON b.id = bi.box_id
+    JOIN bins bn ON bn.id = b.bin_id
+    JOIN shelves s ON s.id = bn.shelf_id
+    JOIN rooms r ON r.id = s.room_id
+    UNION ALL
+    SELECT bi.item_id, NULL, bn.id, NULL, bn.code, s.code, r.code, {_LOCATION_PATH}, bi.qty
+    FROM bin_inventory bi
+    JOIN bins bn ON bn.id = bi.bin_id
+    JOIN shelves s ON s.id = bn.shelf_id
+    JOIN rooms r ON r.id = s.room_id
+"""
+
+_BOX_LOCATION_INSERT = f"""
+    INSERT INTO item_locations (item_id, box_id, bin_id, box_code, bin_code, shelf_code, room_code, path, qty)
+    SELECT NEW.item_id, b.id, bn.id, b.box_code, bn.code, s.code, r.code, {_LOCATION_PATH}, NEW.qty
+    FROM boxes b
+    JOIN bins bn ON bn.id = b.bin_id
+    JOIN shelves s ON s.id = bn.shelf_id
+    JOIN rooms r ON r.id = s.room_id
+    WHERE b.id = NEW.box_id
+"""
+
+_BIN_LOCATION_INSERT = f"""
+    INSERT INTO item_locations (item_id, box_id, bin_id, box_code, bin_code, shelf_code, room_code, path, qty)
+    SELECT NEW.item_id, NULL, bn.id, NULL, bn.code, s.code, r.code, {_LOCATION_PATH}, NEW.qty
+    FROM bins bn
+    JOIN shelves s ON s.id = bn.shelf_id
+    JOIN rooms r ON r.id = s.room_id
+    WHERE bn.id = NEW.bin_id
+"""
+
+# Zweite Trigger auf box_inventory/bin_inventory neben denen für
+# item_stock – braucht MySQL >= 5.7.2 bzw. MariaDB >= 10.2.3.
+_LOCATION_TRIGGERS = {
+    "trg_box_inv_loc_ai": f"""
+        CREATE TRIGGER trg_box_inv_loc_ai AFTER INSERT ON box_inventory FOR EACH ROW
+        {_BOX_LOCATION_INSERT}
+    """,
+    "trg_box_inv_loc_au": f"""
+        CREATE TRIGGER trg_box_inv_loc_au AFTER UPDATE ON box_inventory FOR EACH ROW
+        BEGIN
+          IF NEW.item_id = OLD.item_id AND NEW.box_id = OLD.box_id THEN
+            UPDATE item_locations SET qty = NEW.qty
+            WHERE item_id = NEW.item_id AND box_id = NEW.box_id;
+          ELSE
+            DELETE FROM item_locations WHERE item_id = OLD.item_id AND box_id = OLD.box_id;
+            {_BOX_LOCATION_INSERT};
+          END IF;
+        END
+    """,
+    "trg_box_inv_loc_ad": """
+        CREATE TRIGGER trg_box_inv_loc_ad AFTER DELETE ON box_inventory FOR EACH ROW
+        DELETE FROM item_locations WHERE item_id = OLD.item_id AND box_id = OLD.box_id
+    """,
+    "trg_bin_inv_loc_ai": f"""
+        CREATE TRIGGER trg_bin_inv_loc_ai AFTER INSERT ON bin_inventory FOR EACH ROW
+        {_BIN_LOCATION_INSERT}
+    """,
+    "trg_bin_inv_loc_au": f"""
+        CREATE TRIGGER trg_bin_inv_loc_au AFTER UPDATE ON bin_inventory FOR EACH ROW
+        BEGIN
+          IF NEW.item_id = OLD.item_id AND NEW.bin_id = OLD.bin_id THEN
+            UPDATE item_locations SET qty = NEW.qty
+            WHERE item_id = NEW.item_id AND box_id IS NULL AND bin_id = NEW.bin_id;
+          ELSE
+            DELETE FROM item_locations WHERE item_id = OLD.item_id AND box_id IS NULL AND bin_id = OLD.bin_id;
+            {_BIN_LOCATION_INSERT};
+          END IF;
+        END
+    """,
+    "trg_bin_inv_loc_ad": """
+        CREATE TRIGGER trg_bin_inv_loc_ad AFTER DELETE ON bin_inventory FOR EACH ROW
+        DELETE FROM item_locations WHERE item_id = OLD.item_id AND box_id IS NULL AND bin_id = OLD.bin_id
+    """,
+    # Box umgezogen / umbenannt
+    "trg_boxes_loc_au": f"""
+        CREATE TRIGGER trg_boxes_loc_au AFTER UPDATE ON boxes FOR EACH ROW
+        IF NEW.bin_id <> OLD.bin_id OR NEW.box_code <> OLD.box_code THEN
+          UPDATE item_locations l
+          JOIN bins bn ON bn.id = NEW.bin_id
+          JOIN shelves s ON s.id = bn.shelf_id
+          JOIN rooms r ON r.id = s.room_id
+          SET l.bin_id = bn.id, l.box_code = NEW.box_code, l.bin_code = bn.code,
+              l.shelf_code = s.code, l.room_code = r.code, l.path = {_LOCATION_PATH}
+          WHERE l.box_id = NEW.id;
+        END IF
+    """,
+    # Fach/Regal/Raum umbenannt oder verschoben
+    "trg_bins_loc_au": f"""
+        CREATE TRIGGER trg_bins_loc_au AFTER UPDATE ON bins FOR EACH ROW
+        IF NEW.code <> OLD.code OR NEW.shelf_id <> OLD.shelf_id THEN
+          UPDATE item_locations l
+          JOIN bins bn ON bn.id = NEW.id
+          JOIN shelves s ON s.id = NEW.shelf_id
+          JOIN rooms r ON r.id = s.room_id
+          SET l.bin_code = NEW.code, l.shelf_code = s.code, l.room_code = r.code,
+              l.path = {_LOCATION_PATH}
+          WHERE l.bin_id = NEW.id;
+        END IF
+    """,
+    "trg_shelves_loc_au": f"""
+        CREATE TRIGGER trg_shelves_loc_au AFTER UPDATE ON shelves FOR EACH ROW
+        IF NEW.code <> OLD.code OR NEW.room_id <> OLD.room_id THEN
+          UPDATE item_locations l
+          JOIN bins bn ON bn.id = l.bin_id
+          JOIN shelves s ON s.id = NEW.id
+          JOIN rooms r ON r.id = NEW.room_id
+          SET l.shelf_code = NEW.code, l.room_code = r.code, l.path = {_LOCATION_PATH}
+          WHERE bn.shelf_id = NEW.id;
+        END IF
+    """,
+    "trg_rooms_loc_au": f"""
+        CREATE TRIGGER trg_rooms_loc_au AFTER UPDATE ON rooms FOR EACH ROW
+        IF NEW.code <> OLD.code THEN
+          UPDATE item_locations l
+          JOIN bins bn ON bn.id = l.bin_id
+          JOIN shelves s ON s.id = bn.shelf_id
+          JOIN rooms r ON r.id = NEW.id
+          SET l.room_code = NEW.code, l.path = {_LOCATION_PATH}
+          WHERE s.room_id = NEW.id;
+        END IF
+    """,
+}
+
+
+@migration(6, "item_locations")
+def _item_locations(cur):
+    for table in ("rooms", "shelves", "bins", "boxes", "box_inventory", "bin_inventory"):
+        if not _table_exists(cur, table):
+            raise MigrationError(f"Tabelle {table} fehlt – erst database/wawi_b7.sql einspielen")
+
+    # Box/Fach gelöscht -> FK-Kaskade räumt die Einträge mit ab
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS item_locations (
+          id         BIGINT PRIMARY KEY AUTO_INCREMENT,
+          item_id    BIGINT NOT NULL,
+          box_id     BIGINT NULL,              -- NULL = lose im Fach (bin_inventory)
+          bin_id     BIGINT NOT NULL,
+          box_code   VARCHAR(32) NULL,
+          bin_code   VARCHAR(32) NOT NULL,
+          shelf_code VARCHAR(32) NOT NULL,
+          room_code  VARCHAR(32) NOT NULL,
+          path       VARCHAR(128) NOT NULL,
+          qty        DECIMAL(12,3) NOT NULL DEFAULT 0,
+          KEY idx_item_locations_item (item_id, path),
+          KEY idx_item_locations_box (box_id),
+          KEY idx_item_locations_bin (bin_id),
+          CONSTRAINT fk_item_loc_item FOREIGN KEY (item_id) REFERENCES items(id)
+            ON UPDATE CASCADE ON DELETE CASCADE,
+          CONSTRAINT fk_item_loc_box FOREIGN KEY (box_id) REFERENCES boxes(id)
+            ON UPDATE CASCADE ON DELETE CASCADE,
+          CONSTRAINT fk_item_loc_bin FOREIGN KEY (bin_id) REFERENCES bins(id)
+            ON UPDATE CASCADE ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """)
+
+    for name, sql in _LOCATION_TRIGGERS.items():
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(sql)
+    print(f"[migrations]   {len(_LOCATION_TRIGGERS)} Trigger für item_locations angelegt")
+
+    cur.execute("DELETE FROM item_locations")
+    cur.execute(ITEM_LOCATIONS_FILL_SQL)
+    print(f"[migrations]   item_locations mit {cur.rowcount} Lagerorten befüllt")
+
+
+# Bewegungsjournal (stock_ledger.py): jede Mengenänderung als vorzeichen-
+# behaftete Zeile. source: 'items' = Zählerstand items.qty, 'box'/'bin' =
+# Inventar. Der Bearbeiter kommt bei items aus last_user_id. Beim Inventar
+# gibt es keine solche Spalte und keinen Schreiber, der ihn mitliefert –
+# dort bleibt user_id NULL.
+_LEDGER_TRIGGERS = {
+    "trg_items_ledger_ai": """
+        CREATE TRIGGER trg_items_ledger_ai AFTER INSERT ON items FOR EACH ROW
+        IF COALESCE(NEW.qty, 0) <> 0 THEN
+          INSERT INTO stock_movements (item_id, source, delta, qty_after, user_id)
+          VALUES (NEW.id, 'items', NEW.qty, NEW.qty, NEW.last_user_id);
+        END IF
+    """,
+    "trg_items_ledger_au": """
+        CREATE TRIGGER trg_items_ledger_au AFTER UPDATE ON items FOR EACH ROW
+        IF NOT (NEW.qty <=> OLD.qty) THEN
+          INSERT INTO stock_movements (item_id, source, delta, qty_after, user_id)
+          VALUES (NEW.id, 'items', COALESCE(NEW.qty, 0) - COALESCE(OLD.qty, 0), COALESCE(NEW.qty, 0),
+                  NEW.last_user_id);
+        END IF
+    """,
+    "trg_box_inv_ledger_ai": """
+        CREATE TRIGGER trg_box_inv_ledger_ai AFTER INSERT ON box_inventory FOR EACH ROW
+        INSERT INTO stock_movements (item_id, source, box_id, delta, qty_after)
+        VALUES (NEW.item_id, 'box', NEW.box_id, NEW.qty, NEW.qty)
+    """,
+    "trg_box_inv_ledger_au": """
+        CREATE TRIGGER trg_box_inv_ledger_au AFTER UPDATE ON box_inventory FOR EACH ROW
+        IF NEW.item_id <> OLD.item_id OR NEW.box_id <> OLD.box_id THEN
+          INSERT INTO stock_movements (item_id, source, box_id, delta, qty_after)
+          VALUES (OLD.item_id, 'box', OLD.box_id, -OLD.qty, 0),
+                 (NEW.item_id, 'box', NEW.box_id, NEW.qty, NEW.qty);
+        ELSEIF NEW.qty <> OLD.qty THEN
+          INSERT INTO stock_movements (item_id, source, box_id, delta, qty_after)
+          VALUES (NEW.item_id, 'box', NEW.box_id, NEW.qty - OLD.qty, NEW.qty);
+        END IF
+    """,
+    "trg_box_inv_ledger_ad": """
+        CREATE TRIGGER trg_box_inv_ledger_ad AFTER DELETE ON box_inventory FOR EACH ROW
+        INSERT INTO stock_movements (item_id, source, box_id, delta, qty_after)
+        VALUES (OLD.item_id, 'box', OLD.box_id, -OLD.qty, 0)
+    """,
+    "trg_bin_inv_ledger_ai": """
+        CREATE TRIGGER trg_bin_inv_ledger_ai AFTER INSERT ON bin_inventory FOR EACH ROW
+        INSERT INTO stock_movements (item_id, source, bin_id, delta, qty_after)
+        VALUES (NEW.item_id, 'bin', NEW.bin_id, NEW.qty, NEW.qty)
+    """,
+    "trg_bin_inv_ledger_au": """
+        CREATE TRIGGER trg_bin_inv_ledger_au AFTER UPDATE ON bin_inventory FOR EACH ROW
+        IF NEW.item_id <> OLD.item_id OR NEW.bin_id <> OLD.bin_id THEN
+          INSERT INTO stock_movements (item_id, source, bin_id, delta, qty_after)
+          VALUES (OLD.item_id, 'bin', OLD.bin_id, -OLD.qty, 0),
+                 (NEW.item_id, 'bin', NEW.bin_id, NEW.qty, NEW.qty);
+        ELSEIF NEW.qty <> OLD.qty THEN
+          INSERT INTO stock_movements (item_id, source, bin_id, delta, qty_after)
+          VALUES (NEW.item_id, 'bin', NEW.bin_id, NEW.qty - OLD.qty, NEW.qty);
+        END IF
+    """,
+    "trg_bin_inv_ledger_ad": """
+        CREATE TRIGGER trg_bin_inv_ledger_ad AFTER DELETE ON bin_inventory FOR EACH ROW
+        INSERT INTO stock_movements (item_id, source, bin_id, delta, qty_after)
+        VALUES (OLD.item_id, 'bin', OLD.bin_id, -OLD.qty, 0)
+    """,
+    # Box/Fach gelöscht: die FK-Kaskade löst keine Inventar-Trigger aus
+    "trg_boxes_ledger_bd": """
+        CREATE TRIGGER trg_boxes_ledger_bd BEFORE DELETE ON boxes FOR EACH ROW
+        INSERT INTO stock_movements (item_id, source, box_id, delta, qty_after)
+        SELECT item_id, 'box', box_id, -qty, 0 FROM box_inventory WHERE box_id = OLD.id
+    """,
+    "trg_bins_ledger_bd": """
+        CREATE TRIGGER trg_bins_ledger_bd BEFORE DELETE ON bins FOR EACH ROW
+        INSERT INTO stock_movements (item_id, source, bin_id, delta, qty_after)
+        SELECT item_id, 'bin', bin_id, -qty, 0 FROM bin_inventory WHERE bin_id = OLD.id
+    """,
+    # Journal ist nur anhängbar
+    "trg_stock_movements_bu": """
+        CREATE TRIGGER trg_stock_movements_bu BEFORE UPDATE ON stock_movements FOR EACH ROW
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'stock_movements ist nur anhaengbar'
+    """,
+    "trg_stock_movements_bd": """
+        CREATE TRIGGER trg_stock_movements_bd BEFORE DELETE ON stock_movements FOR EACH ROW
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'stock_movements ist nur anhaengbar'
+    """,
+}
+
+
+@migration(7, "stock_ledger")
+def _stock_ledger(cur):
+    # Ohne Fremdschlüssel: die Historie bleibt, auch wenn Box/Artikel weg sind
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+          id         BIGINT PRIMARY KEY AUTO_INCREMENT,
+          item_id    BIGINT NOT NULL,
+          source     ENUM('items', 'box', 'bin') NOT NULL,
+          box_id     BIGINT NULL,
+          bin_id     BIGINT NULL,
+          delta      DECIMAL(14,3) NOT NULL,
+          qty_after  DECIMAL(14,3) NOT NULL,
+          user_id    BIGINT NULL,
+          created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+          KEY idx_movements_item (item_id, id),
+          KEY idx_movements_created (created_at)
+        ) ENGINE=InnoDB
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+          id          BIGINT PRIMARY KEY AUTO_INCREMENT,
+          item_id     BIGINT NOT NULL,
+          source      ENUM('items', 'box', 'bin') NOT NULL,
+          qty         DECIMAL(14,3) NOT NULL,
+          movement_id BIGINT NOT NULL,            -- enthält alle Bewegungen bis einschließlich dieser id
+          taken_at    DATETIME(6) NOT NULL,
+          KEY idx_snapshots_item (item_id, source, taken_at),
+          KEY idx_snapshots_taken (taken_at, movement_id)
+        ) ENGINE=InnoDB
+    """)
+
+    for name, sql in _LEDGER_TRIGGERS.items():
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(sql)
+    print(f"[migrations]   {len(_LEDGER_TRIGGERS)} Trigger für stock_movements angelegt")
+
+    # Anfangsbestand als erster Snapshot – alles davor ist nicht im Journal
+    cur.execute("SELECT COUNT(*) FROM stock_snapshots")
+    if cur.fetchone()[0]:
+        return
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movements")
+    movement_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO stock_snapshots (item_id, source, qty, movement_id, taken_at)
+        SELECT id, 'items', COALESCE(qty, 0), %(m)s, NOW(6) FROM items
+        UNION ALL
+        SELECT item_id, 'box', SUM(qty), %(m)s, NOW(6) FROM box_inventory GROUP BY item_id
+        UNION ALL
+        SELECT item_id, 'bin', SUM(qty), %(m)s, NOW(6) FROM bin_inventory GROUP BY item_id
+    """, {"m": movement_id})
+    print(f"[migrations]   Anfangsbestand: {cur.rowcount} Snapshot-Zeilen")
+
+
+@migration(8, "items_row_version")
+def _items_row_version(cur):
+    # Versionszähler für Compare-and-Swap (item_repo.update_if_version). Der
+    # Trigger zählt bei jedem UPDATE hoch – auch bei Upserts, Import und app.py.
+    _add_column(cur, "items", "row_version", "INT UNSIGNED NOT NULL DEFAULT 0")
+    cur.execute("DROP TRIGGER IF EXISTS trg_items_version_bu")
+    cur.execute("""
+        CREATE TRIGGER trg_items_version_bu BEFORE UPDATE ON items FOR EACH ROW
+        SET NEW.row_version = OLD.row_version + 1
+    """)
+    print("[migrations]   Trigger trg_items_version_bu angelegt")
+
+
+@migration(9, "items_list_indexes")
+def _items_list_indexes(cur):
+    # Keyset-Paginierung in item_list.py: (Filter, Sortierschlüssel), die id
+    # hängt InnoDB an jeden Sekundärindex selbst an
+    _create_index(cur, "items", "idx_items_name", ("name",))
+    _create_index(cur, "items", "idx_items_shop_change", ("shop_id", "last_change_at"))
+    _create_index(cur, "items", "idx_items_shop_name", ("shop_id", "name"))
+    _create_index(cur, "items", "idx_items_user_change", ("last_user_id", "last_change_at"))
+
+
+# Trigger auf Inventar, Boxen und Fächern (ohne items und die Sperre des Journals)
+_INVENTORY_LEDGER_TRIGGERS = tuple(
+    name for name in _LEDGER_TRIGGERS
+    if not name.startswith(("trg_items_", "trg_stock_movements_"))
+)
+
+
+@migration(10, "stock_ledger_inventory_user")
+def _stock_ledger_inventory_user(cur):
+    # Version 7 hat bei Box/Fach @wawi_user_id eingetragen, das kein
+    # Schreiber setzt – diese Trigger ohne user_id neu anlegen
+    for name in _INVENTORY_LEDGER_TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(_LEDGER_TRIGGERS[name])
+    print(f"[migrations]   {len(_INVENTORY_LEDGER_TRIGGERS)} Inventar-Trigger ohne user_id neu angelegt")
+
+
+# ------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------
+
+def _ensure_version_table(cur) -> None:
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version    INT PRIMARY KEY,
+          name       VARCHAR(128) NOT NULL,
+          applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+
+
+def applied_versions(cur) -> dict:
+    _ensure_version_table(cur)
+    cur.execute("SELECT version, applied_at FROM schema_migrations")
+    return dict(cur.fetchall())
+
+
+def migrate(conn) -> list:
+    """
+    Wendet alle ausstehenden Migrationen in Reihenfolge an und gibt die
+    angewendeten Versionen zurück. Bei einem Fehler wird abgebrochen –
+    spätere Versionen bauen auf den früheren auf.
+    """
+    cur = conn.cursor()
+    # Mehrere Prozesse (Desktop, Worker) sollen nicht gleichzeitig migrieren
+    cur.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+    if cur.fetchone()[0] != 1:
+        cur.close()
+        raise MigrationError(f"Migrations-Lock nach {LOCK_TIMEOUT}s nicht bekommen")
+
+    done = []
+    try:
+        applied = applied_versions(cur)
+        for version, name, func in MIGRATIONS:
+            if version in applied:
+                continue
+            print(f"[migrations] {version:03d} {name}")
+            func(cur)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name),
+            )
+            conn.commit()
+            done.append(version)
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cur.fetchone()
+        cur.close()
+
+    if done:
+        print(f"[migrations] {len(done)} Migration(en) angewendet, Stand: {MIGRATIONS[-1][0]}")
+    return done
+
+
+def status(conn) -> list:
+    cur = conn.cursor()
+    applied = applied_versions(cur)
+    cur.close()
+    return [
+        {
+            "version": version,
+            "name": name,
+            "applied_at": applied[version].isoformat() if applied.get(version) else None,
+        }
+        for version, name, _ in MIGRATIONS
+    ]
+
+
+# ------------------------------------------------------------
+# EXPLAIN-Bericht
+# ------------------------------------------------------------
+
+def _text(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    return value
+
+
+def explain(cur, sql: str, params=()) -> list:
+    cur.execute("EXPLAIN " + sql, params)
+    cols = [d[0] for d in cur.description]
+    return [{c: _text(v) for c, v in zip(cols, row)} for row in cur.fetchall()]
+
+
+def explain_report(conn, queries) -> list:
+    """
+    queries: (label, sql, params, allow_full_scan). Gibt pro Abfrage den
+    Plan zurück und warnt, wenn eine Tabelle komplett gelesen wird
+    (type=ALL), obwohl das nicht erlaubt ist.
+    """
+    report = []
+    cur = conn.cursor()
+    try:
+        for label, sql, params, allow_full_scan in queries:
+            try:
+                plan = explain(cur, sql, params)
+            except Error as e:
+                report.append({"query": label, "ok": False, "error": str(e), "plan": []})
+                print(f"[explain] {label}: FEHLER {e}")
+                continue
+
+            # Der INSERT-Teil eines Upserts steht immer als ALL im Plan
+            full_scans = [
+                row.get("table") for row in plan
+                if row.get("type") == "ALL" and row.get("select_type") != "INSERT"
+            ]
+            ok = allow_full_scan or not full_scans
+            report.append({
+                "query": label,
+                "ok": ok,
+                "full_scans": full_scans,
+                "plan": [
+                    {k: row.get(k) for k in ("table", "type", "possible_keys", "key", "rows", "Extra")}
+                    for row in plan
+                ],
+            })
+
+            keys = ", ".join(f"{row.get('table')}:{row.get('type')}/{row.get('key')}" for row in plan)
+            if ok:
+                print(f"[explain] {label}: {keys}")
+            else:
+                print(f"[explain] WARNUNG {label}: Full Scan auf {', '.join(map(str, full_scans))} ({keys})")
+    finally:
+        cur.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schema-Migrationen für wawi_b7")
+    parser.add_argument("--status", action="store_true", help="nur anzeigen, was angewendet ist")
+    parser.add_argument("--explain", action="store_true", help="EXPLAIN-Bericht für die Abfragen aus db.py")
+    args = parser.parse_args(argv)
+
+    from db import get_db_connection, EXPLAIN_QUERIES
+
+    with get_db_connection() as conn:
+        if args.status:
+            for m in status(conn):
+                print(f"{m['version']:03d} {m['name']:<28} {m['applied_at'] or 'ausstehend'}")
+            return 0
+        if args.explain:
+            report = explain_report(conn, EXPLAIN_QUERIES)
+            return 0 if all(r["ok"] for r in report) else 1
+        migrate(conn)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
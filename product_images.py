@@ -0,0 +1,276 @@
+# product_images.py
+#
+# Auslieferung der Artikelbilder unter /image/<ean> mit Validatoren:
+# starker ETag aus dem Dateiinhalt, Last-Modified, Cache-Control.
+#
+# Das Bild liegt nach save_image_for_ean unter IMAGE_DIR/<ean>.jpg; der Weg
+# dorthin ist also ohne MySQL bekannt. Ein os.stat() reicht, um If-None-Match
+# zu beantworten – der Hash wird nur neu gerechnet, wenn sich mtime/Größe
+# geändert haben. Nur für ältere, anders abgelegte Bilder wird items.image_path
+# nachgeschlagen (über den Artikel-Cache).
+#
+# Versionierte URLs (/image/<ean>?v=<etag>) ändern sich mit dem Inhalt und
+# dürfen deshalb "immutable" gecacht werden; image_updated-Broadcasts
+# schicken diese URL mit.
+#
+# Kleinere Varianten (?w=thumb|medium|full bzw. Pixel, ?fmt=jpeg|webp|auto)
+# werden beim Upload vorab oder beim ersten Abruf erzeugt und in
+# IMAGE_CACHE_DIR abgelegt, benannt nach Inhalts-Hash + Größe + Format.
+# Ein neues Bild hat einen neuen Hash, alte Varianten fallen beim Aufräumen
+# (IMAGE_CACHE_MAX_BYTES, älteste zuerst) von selbst heraus.
+import hashlib
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from PIL import Image
+
+from cache import LRUTTLCache
+from config import (
+    IMAGE_DIR, DUMMY_IMAGE_PATH, IMAGE_ETAG_CACHE_SIZE, IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES,
+    IMAGE_SIZES, IMAGE_PREGENERATE,
+)
+from db import db_get_product
+
+FORMATS = {"jpeg": ("jpg", "image/jpeg"), "webp": ("webp", "image/webp")}
+_QUALITY = {"jpeg": 75, "webp": 75}
+
+_SAFE_EAN = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9._-]*")
+
+# (Pfad, mtime_ns, Größe) -> ETag; ändert sich die Datei, ändert sich der Schlüssel
+_etags = LRUTTLCache(maxsize=IMAGE_ETAG_CACHE_SIZE, ttl=24 * 3600.0)
+
+
+def _file_etag(path: str, st: os.stat_result) -> str:
+    key = (path, st.st_mtime_ns, st.st_size)
+    etag = _etags.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:20]
+        _etags.set(key, etag)
+    return etag
+
+
+def _stat(path: str | None):
+    if not path:
+        return None
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def find_image(ean: str):
+    """
+    (Pfad, stat) des Bildes zu einer EAN oder None. Erst die Datei per
+    Namenskonvention, nur sonst die Datenbank.
+    """
+    # <ean>_raw.bin (Upload, den Pillow nicht lesen konnte) bewusst nicht:
+    # dafür gab es schon immer den Platzhalter
+    if _SAFE_EAN.fullmatch(ean or ""):
+        path = os.path.join(IMAGE_DIR, f"{ean}.jpg")
+        st = _stat(path)
+        if st is not None:
+            return path, st
+
+    item = db_get_product(ean)
+    path = item["image_path"] if item and item["image_path"] else None
+    st = _stat(path)
+    return (path, st) if st is not None else None
+
+
+def image_info(ean: str) -> dict:
+    """Pfad, ETag, mtime, Größe und Mimetype; fällt auf das Platzhalterbild zurück."""
+    found = find_image(ean)
+    if found is None:
+        return _file_info(DUMMY_IMAGE_PATH, os.stat(DUMMY_IMAGE_PATH), placeholder=True)
+    return _file_info(*found, placeholder=False)
+
+
+def _file_info(path: str, st: os.stat_result, placeholder: bool) -> dict:
+    return {
+        "path": path,
+        "etag": _file_etag(path, st),
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        # wie bisher: Artikelbilder als JPEG, Platzhalter PNG
+        "mimetype": "image/png" if path.endswith(".png") else "image/jpeg",
+        "placeholder": placeholder,
+    }
+
+
+def image_version(ean: str) -> str | None:
+    found = find_image(ean)
+    return _file_etag(*found) if found else None
+
+
+def image_url(ean: str, version: str | None = None) -> str:
+    version = version or image_version(ean)
+    url = "/image/" + quote(ean, safe="")
+    return f"{url}?v={version}" if version else url
+
+
+# ------------------------------------------------------------
+# Varianten (Größe/Format)
+# ------------------------------------------------------------
+
+_variant_locks = {}
+_variant_locks_lock = threading.Lock()
+_cache_bytes = None          # Größe von IMAGE_CACHE_DIR, beim ersten Schreiben ermittelt
+_cache_lock = threading.Lock()
+_pregen = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-variants")
+
+
+def parse_width(value: str | None) -> int | None:
+    """
+    ?w= als Name (thumb/medium/full) oder Pixel; Pixel werden auf die
+    nächstgrößere feste Stufe gerundet, damit der Cache klein bleibt.
+    None = Original. ValueError bei Unsinn.
+    """
+    if not value:
+        return None
+    if value in IMAGE_SIZES:
+        return IMAGE_SIZES[value]
+    width = int(value)
+    if width <= 0:
+        raise ValueError(f"Breite ungültig: {value}")
+    steps = sorted(IMAGE_SIZES.values())
+    return next((step for step in steps if step >= width), steps[-1])
+
+
+def pick_format(value: str | None, accept) -> str | None:
+    """?fmt=jpeg|webp|auto; auto nimmt WebP, wenn der Browser es kann."""
+    if not value:
+        return None
+    if value == "auto":
+        return "webp" if accept.quality("image/webp") > 0 else "jpeg"
+    if value not in FORMATS:
+        raise ValueError(f"Format unbekannt: {value}")
+    return value
+
+
+def variant_etag(info: dict, width: int | None, fmt: str | None) -> str:
+    # aus Quell-Hash und Parametern – für 304 muss nichts erzeugt werden
+    if width is None and fmt is None:
+        return info["etag"]
+    return f"{info['etag']}-{width or 0}{fmt or 'jpeg'}"
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _variant_locks_lock:
+        lock = _variant_locks.get(key)
+        if lock is None:
+            lock = _variant_locks[key] = threading.Lock()
+        return lock
+
+
+def _dir_size() -> int:
+    total = 0
+    for entry in os.scandir(IMAGE_CACHE_DIR):
+        if entry.is_file():
+            total += entry.stat().st_size
+    return total
+
+
+def _account(added: int) -> None:
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _dir_size()
+        else:
+            _cache_bytes += added
+        if _cache_bytes <= IMAGE_CACHE_MAX_BYTES:
+            return
+        # älteste zuerst löschen (mtime wird bei jedem Treffer aufgefrischt),
+        # bis wieder 10 % Luft sind
+        entries = sorted(
+            (e for e in os.scandir(IMAGE_CACHE_DIR) if e.is_file() and not e.name.endswith(".tmp")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        target = IMAGE_CACHE_MAX_BYTES * 0.9
+        removed = 0
+        for entry in entries:
+            if _cache_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            _cache_bytes -= size
+            removed += 1
+        print(f"[product_images] Bild-Cache aufgeräumt: {removed} Dateien entfernt")
+
+
+def _render(source: str, target: str, width: int | None, fmt: str) -> None:
+    tmp = f"{target}.{threading.get_ident()}.tmp"
+    try:
+        with Image.open(source) as img:
+            if fmt == "jpeg" and img.format == "JPEG" and not (width and img.width > width):
+                # schon klein genug: nicht neu komprimieren (würde nur größer)
+                shutil.copyfile(source, tmp)
+            else:
+                img = img.convert("RGB")
+                if width and img.width > width:
+                    img.thumbnail((width, width * 10), Image.LANCZOS)
+                img.save(tmp, format=fmt.upper(), quality=_QUALITY[fmt])
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    # atomar: parallele Abrufe sehen nie eine halbe Datei
+    os.replace(tmp, target)
+
+
+def variant(info: dict, width: int | None, fmt: str | None) -> dict:
+    """
+    Pfad/ETag/Mimetype der gewünschten Variante; erzeugt sie bei Bedarf.
+    Ohne Parameter (oder für den Platzhalter) das Original.
+    """
+    if info["placeholder"] or (width is None and fmt is None):
+        return info
+    fmt = fmt or "jpeg"
+    ext, mimetype = FORMATS[fmt]
+    path = os.path.join(IMAGE_CACHE_DIR, f"{info['etag']}_{width or 0}.{ext}")
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        try:
+            with _lock_for(path):
+                if not os.path.exists(path):
+                    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+                    _render(info["path"], path, width, fmt)
+                    _account(os.path.getsize(path))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Datei liegt da, ist aber kein lesbares Bild -> Platzhalter statt 500
+            print(f"[product_images] Variante aus {info['path']} nicht möglich: {e}")
+            return _file_info(DUMMY_IMAGE_PATH, os.stat(DUMMY_IMAGE_PATH), placeholder=True)
+        finally:
+            with _variant_locks_lock:
+                _variant_locks.pop(path, None)
+    st = os.stat(path)
+    return {
+        **info,
+        "path": path,
+        "etag": variant_etag(info, width, fmt),
+        "size": st.st_size,
+        "mimetype": mimetype,
+    }
+
+
+def pregenerate(ean: str) -> None:
+    """Nach dem Upload die üblichen Varianten im Hintergrund erzeugen."""
+    def run():
+        try:
+            info = image_info(ean)
+            for size, fmt in IMAGE_PREGENERATE:
+                variant(info, IMAGE_SIZES[size], fmt)
+        except Exception as e:
+            print(f"[product_images] Varianten für EAN={ean} fehlgeschlagen: {e}")
+    _pregen.submit(run)
@@ -196,11 +196,7 @@
             $("nameInput").value = "";
           }
 
-          if (data.image_path) {
-            $("itemImage").src = "/image/" + ean + "?t=" + Date.now();
-          } else {
-            $("itemImage").src = "/image/" + ean + "?t=" + Date.now();
-          }
+          $("itemImage").src = "/image/" + encodeURIComponent(ean);
 
           if (data.source === "local") {
             setStatus($("wizardStatus"), "Artikel in lokaler Datenbank gefunden.", "ok");
@@ -292,7 +288,7 @@
         const data = await res.json();
         if (data.ok) {
           window.currentItem.image_uploaded = true;
-          $("itemImage").src = "/image/" + ean + "?t=" + Date.now();
+          $("itemImage").src = data.image_url || "/image/" + encodeURIComponent(ean);
           setStatus($("wizardStatus"), "Bild gespeichert.", "ok");
         } else {
           setStatus($("wizardStatus"), data.message || "Fehler beim Speichern des Bildes.", "error");
@@ -129,7 +129,7 @@ window.addEventListener('pywebviewready', () => {
                     console.log("Desktop: image_updated für EAN", msg.ean);
                     if (currentArticle.ean && msg.ean === currentArticle.ean) {
                         const img = document.getElementById("product-image");
-                        img.src = "/image/" + encodeURIComponent(msg.ean) + "?t=" + Date.now();
+                        img.src = msg.image_url || "/image/" + encodeURIComponent(msg.ean);
                         img.style.display = "block";
                     }
                 }
@@ -162,7 +162,7 @@ window.addEventListener('pywebviewready', () => {
 
             const img = document.getElementById("product-image");
             if (result.ean) {
-                img.src = "/image/" + encodeURIComponent(result.ean) + "?t=" + Date.now();
+                img.src = "/image/" + encodeURIComponent(result.ean);
                 img.style.display = "block";
             } else {
                 img.src = "";
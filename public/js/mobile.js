@@ -86,9 +86,12 @@ if (shopSelectEl) {
 // ------------------------------------------------------------
 // Artikel-Rendering
 // ------------------------------------------------------------
-function updateImage(ean) {
+function updateImage(ean, imageUrl) {
+    // Server liefert ETag/304, versionierte URLs (image_updated) sogar ohne Nachfrage.
+    // Handy: mittlere Größe, WebP wenn möglich – statt des vollen JPEGs
     const key = ean || "dummy";
-    imgEl.src = "/image/" + encodeURIComponent(key) + "?t=" + Date.now();
+    const url = imageUrl || "/image/" + encodeURIComponent(key);
+    imgEl.src = url + (url.includes("?") ? "&" : "?") + "w=medium&fmt=auto";
 }
 
 function renderArticle(article, imageBase64) {
@@ -299,7 +302,7 @@ function connectWebSocketMobile() {
                     if (data.image_base64) {
                         imgEl.src = "data:image/jpeg;base64," + data.image_base64;
                     } else {
-                        updateImage(currentArticle.ean);
+                        updateImage(currentArticle.ean, data.image_url);
                     }
                 }
                 break;
@@ -0,0 +1,64 @@
+# qr_codes.py
+#
+# QR-Codes für die Mobile-URL, EANs und Box-Codes (/qr, /qr/ean/<ean>,
+# /qr/box/<box_code>). Ein QR-Code hängt nur von Inhalt, Format und Größe
+# ab – die fertigen PNG/SVG-Bytes liegen deshalb in einem LRU-Cache, und
+# Etiketten-Vorschau oder Desktop-Ansicht mit vielen Codes rendern jeden
+# nur einmal.
+import hashlib
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+
+from cache import LRUTTLCache
+from config import QR_CACHE_SIZE, QR_DEFAULT_SCALE, QR_MAX_SCALE, QR_MAX_PAYLOAD
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Inhalt ändert sich für einen Schlüssel nie – TTL nur, damit Ungenutztes geht
+_cache = LRUTTLCache(maxsize=QR_CACHE_SIZE, ttl=24 * 3600.0)
+
+
+def parse_params(fmt: str | None, scale) -> tuple[str, int]:
+    """?fmt=png|svg, ?scale=Pixel pro Modul; ValueError bei Unsinn."""
+    fmt = fmt or "png"
+    if fmt not in FORMATS:
+        raise ValueError(f"Format unbekannt: {fmt}")
+    scale = QR_DEFAULT_SCALE if scale in (None, "") else int(scale)
+    if not 1 <= scale <= QR_MAX_SCALE:
+        raise ValueError(f"scale muss zwischen 1 und {QR_MAX_SCALE} liegen")
+    return fmt, scale
+
+
+def _render(payload: str, fmt: str, scale: int) -> bytes:
+    qr = qrcode.QRCode(box_size=scale, border=4)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    buf = BytesIO()
+    if fmt == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buf)
+    else:
+        qr.make_image().save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def get_qr(payload: str, fmt: str = "png", scale: int = QR_DEFAULT_SCALE) -> dict:
+    """Bytes, Mimetype und ETag eines QR-Codes (gecacht)."""
+    if not payload:
+        raise ValueError("Inhalt fehlt")
+    if len(payload) > QR_MAX_PAYLOAD:
+        raise ValueError(f"Inhalt zu lang (max. {QR_MAX_PAYLOAD} Zeichen)")
+
+    def load():
+        data = _render(payload, fmt, scale)
+        return {
+            "data": data,
+            "mimetype": FORMATS[fmt],
+            "etag": hashlib.sha256(data).hexdigest()[:20],
+        }
+    return _cache.get_or_load((payload, fmt, scale), load)
+
+
+def get_qr_stats() -> dict:
+    return _cache.stats()
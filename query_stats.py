@@ -0,0 +1,291 @@
+# query_stats.py
+#
+# Messung aller SQL-Statements, die über den Connection-Pool laufen.
+# PooledConnection.cursor() liefert einen InstrumentedCursor: der misst
+# pro Statement die Zeit (execute + fetch), zählt die gelieferten Zeilen
+# und merkt sich die aufrufende Stelle im eigenen Code.
+#
+# Pro normalisierter Abfrage (Literale -> ?) gibt es Zähler und
+# Perzentile über die letzten QUERY_STATS_WINDOW Ausführungen. Alles über
+# SLOW_QUERY_SECONDS landet zusätzlich im Slow-Query-Log (JSONL).
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from config import (
+    QUERY_STATS_WINDOW, SLOW_QUERY_SECONDS, SLOW_QUERY_LOG, SLOW_QUERY_LOG_MAX_BYTES,
+)
+
+_RECENT_SLOW = 100          # so viele langsame Statements im Speicher für /api/admin/queries
+_MAX_SITES = 5              # Aufrufstellen pro Abfrage in der Ausgabe
+_MAX_SQL_CHARS = 2000
+
+# Dateien, die beim Suchen der Aufrufstelle übersprungen werden
+_SKIP_FILES = (os.path.abspath(__file__), os.path.abspath(os.path.join(os.path.dirname(__file__), "db_pool.py")))
+
+
+# ------------------------------------------------------------
+# Normalisierung
+# ------------------------------------------------------------
+
+_RE_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_PARAM = re.compile(r"%s|%\(\w+\)s")
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_VALUES_ROWS = re.compile(r"(\(\s*[^()]*\?[^()]*\))(?:\s*,\s*\(\s*[^()]*\?[^()]*\))+")
+_RE_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql) -> str:
+    """Gleiche Abfrage mit anderen Werten -> gleicher Schlüssel."""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode("utf-8", "replace")
+    sql = _RE_SPACE.sub(" ", sql).strip()
+    sql = _RE_STRING.sub("?", sql)
+    sql = _RE_PARAM.sub("?", sql)
+    sql = _RE_NUMBER.sub("?", sql)
+    # IN (?, ?, ?) und mehrzeilige VALUES (executemany) zusammenfassen
+    sql = _RE_IN_LIST.sub("(?+)", sql)
+    sql = _RE_VALUES_ROWS.sub(r"\1, ...", sql)
+    return sql[:_MAX_SQL_CHARS]
+
+
+def _call_site() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename not in _SKIP_FILES and f"{os.sep}mysql{os.sep}" not in filename:
+            return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+# ------------------------------------------------------------
+# Statistik
+# ------------------------------------------------------------
+
+class QueryStats:
+    def __init__(self, window: int = 1000, slow_seconds: float = 0.2,
+                 slow_log: str | None = None, slow_log_max_bytes: int = 5 * 1024 * 1024):
+        self.window = window
+        self.slow_seconds = slow_seconds
+        self.slow_log = slow_log
+        self.slow_log_max_bytes = slow_log_max_bytes
+
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._queries = {}
+        self._recent_slow = deque(maxlen=_RECENT_SLOW)
+        self._started = time.time()
+
+    def record(self, sql: str, seconds: float, rows: int, site: str, error: str | None = None):
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                entry = self._queries[key] = {
+                    "count": 0, "errors": 0, "total": 0.0, "max": 0.0, "rows": 0,
+                    "recent": deque(maxlen=self.window), "sites": Counter(),
+                }
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["rows"] += rows
+            entry["recent"].append(seconds)
+            entry["sites"][site] += 1
+            if error:
+                entry["errors"] += 1
+
+        if seconds >= self.slow_seconds:
+            self._log_slow({
+                "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "ms": round(seconds * 1000, 2),
+                "rows": rows,
+                "site": site,
+                "sql": key,
+                "error": error,
+            })
+
+    def _log_slow(self, entry: dict):
+        with self._lock:
+            self._recent_slow.append(entry)
+        print(f"[slow_query] {entry['ms']:.0f} ms, {entry['rows']} Zeilen, {entry['site']}: {entry['sql'][:200]}")
+        if not self.slow_log:
+            return
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        try:
+            with self._log_lock:
+                os.makedirs(os.path.dirname(self.slow_log), exist_ok=True)
+                if (os.path.exists(self.slow_log)
+                        and os.path.getsize(self.slow_log) >= self.slow_log_max_bytes):
+                    os.replace(self.slow_log, self.slow_log + ".1")
+                with open(self.slow_log, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError as e:
+            print(f"[slow_query] Log nicht schreibbar: {e}")
+
+    def snapshot(self, sort: str = "total", limit: int | None = None) -> dict:
+        with self._lock:
+            items = [(key, dict(e, recent=sorted(e["recent"]), sites=e["sites"].most_common(_MAX_SITES)))
+                     for key, e in self._queries.items()]
+            recent_slow = list(self._recent_slow)
+
+        queries = []
+        for key, e in items:
+            recent = e["recent"]
+            n = len(recent)
+
+            def pct(p):
+                return round(recent[min(n - 1, int(n * p))] * 1000, 3) if n else 0.0
+
+            queries.append({
+                "sql": key,
+                "count": e["count"],
+                "errors": e["errors"],
+                "rows": e["rows"],
+                "rows_avg": round(e["rows"] / e["count"], 1) if e["count"] else 0.0,
+                "total_ms": round(e["total"] * 1000, 3),
+                "avg_ms": round(e["total"] / e["count"] * 1000, 3) if e["count"] else 0.0,
+                "max_ms": round(e["max"] * 1000, 3),
+                "p50_ms": pct(0.50),
+                "p95_ms": pct(0.95),
+                "p99_ms": pct(0.99),
+                "sites": [{"site": site, "count": count} for site, count in e["sites"]],
+            })
+
+        sort_key = {"total": "total_ms", "avg": "avg_ms", "max": "max_ms",
+                    "p95": "p95_ms", "count": "count"}.get(sort, "total_ms")
+        queries.sort(key=lambda q: q[sort_key], reverse=True)
+        if limit:
+            queries = queries[:limit]
+        return {
+            "since": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._started)),
+            "window": self.window,
+            "slow_ms": self.slow_seconds * 1000,
+            "queries": queries,
+            "recent_slow": recent_slow[::-1],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._recent_slow.clear()
+            self._started = time.time()
+
+
+# ------------------------------------------------------------
+# Cursor
+# ------------------------------------------------------------
+
+class InstrumentedCursor:
+    """
+    Wrapper um einen mysql.connector-Cursor. Ein Statement gilt als
+    abgeschlossen beim nächsten execute(), bei close() oder wenn die
+    Verbindung an den Pool zurückgeht – bis dahin zählen Fetch-Zeit und
+    Zeilen noch dazu (wichtig bei ungepufferten Cursorn).
+    """
+
+    def __init__(self, cursor, stats: QueryStats):
+        self._cursor = cursor
+        self._stats = stats
+        self._pending = None    # [sql, seconds, rows, site, error]
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _timed(self, pending, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception as e:
+            if pending is not None:
+                pending[4] = str(e)
+            raise
+        finally:
+            if pending is not None:
+                pending[1] += time.perf_counter() - started
+
+    def _begin(self, sql):
+        self.finish()
+        self._pending = [sql, 0.0, 0, _call_site(), None]
+        return self._pending
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        pending = self._begin(operation)
+        result = self._timed(pending, lambda: self._cursor.execute(operation, params, *args, **kwargs))
+        # Bei DML (und gepufferten Cursorn) steht die Zeilenzahl schon fest
+        if self._cursor.description is None and self._cursor.rowcount and self._cursor.rowcount > 0:
+            pending[2] = self._cursor.rowcount
+        return result
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        pending = self._begin(operation)
+        result = self._timed(pending, lambda: self._cursor.executemany(operation, seq_params, *args, **kwargs))
+        if self._cursor.rowcount and self._cursor.rowcount > 0:
+            pending[2] = self._cursor.rowcount
+        return result
+
+    def fetchone(self):
+        row = self._timed(self._pending, self._cursor.fetchone)
+        if row is not None and self._pending is not None:
+            self._pending[2] += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._timed(self._pending, lambda: self._cursor.fetchmany(*args, **kwargs))
+        if self._pending is not None:
+            self._pending[2] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._pending, self._cursor.fetchall)
+        if self._pending is not None:
+            self._pending[2] += len(rows)
+        return rows
+
+    def finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, seconds, rows, site, error = pending
+            self._stats.record(sql, seconds, rows, site, error)
+
+    def close(self):
+        self.finish()
+        return self._cursor.close()
+
+
+_stats = QueryStats(
+    window=QUERY_STATS_WINDOW,
+    slow_seconds=SLOW_QUERY_SECONDS,
+    slow_log=SLOW_QUERY_LOG,
+    slow_log_max_bytes=SLOW_QUERY_LOG_MAX_BYTES,
+)
+
+
+def instrument(cursor) -> InstrumentedCursor:
+    return InstrumentedCursor(cursor, _stats)
+
+
+def get_query_stats(sort: str = "total", limit: int | None = None) -> dict:
+    return _stats.snapshot(sort=sort, limit=limit)
+
+
+def reset_query_stats() -> None:
+    _stats.reset()
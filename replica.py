@@ -0,0 +1,501 @@
+# replica.py
+#
+# Lokales SQLite-Replikat von items / users / shops für den Offline-Betrieb.
+#
+# - Solange MySQL erreichbar ist, wird jede gelesene/geschriebene Zeile auch
+#   lokal abgelegt; ein Hintergrund-Thread holt zusätzlich alle Änderungen
+#   seit dem letzten Abgleich (items.last_change_at) sowie users/shops.
+# - Ist MySQL nicht erreichbar (oder wiederholt zu langsam), beantwortet das
+#   Replikat die Lookups. Schreibvorgänge landen in der outbox und werden
+#   lokal sofort angewendet.
+# - Sobald MySQL wieder da ist, wird die outbox in Reihenfolge nachgespielt.
+#   Wurde ein Artikel in MySQL inzwischen geändert (last_change_at neuer als
+#   beim Vormerken), ist das ein Konflikt: er wird in sync_conflicts
+#   protokolliert und nach REPLICA_CONFLICT_POLICY aufgelöst.
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import item_repo
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    ean              TEXT PRIMARY KEY,
+    id               INTEGER,
+    name             TEXT NOT NULL DEFAULT '',
+    image_path       TEXT,
+    qty              REAL,
+    shop_id          INTEGER,
+    last_user_id     INTEGER,
+    last_change_at   TEXT,      -- lokaler Stand (auch nach Offline-Änderungen)
+    remote_change_at TEXT       -- last_change_at, wie zuletzt in MySQL gesehen
+);
+CREATE INDEX IF NOT EXISTS idx_items_remote_change ON items(remote_change_at);
+
+CREATE TABLE IF NOT EXISTS users (
+    id       INTEGER PRIMARY KEY,
+    name     TEXT,
+    rfid_uid TEXT
+);
+
+CREATE TABLE IF NOT EXISTS shops (
+    id      INTEGER PRIMARY KEY,
+    code    TEXT,
+    name    TEXT,
+    web_url TEXT
+);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    seq            INTEGER PRIMARY KEY AUTOINCREMENT,
+    op             TEXT NOT NULL,
+    ean            TEXT NOT NULL,
+    args           TEXT NOT NULL,   -- JSON-Liste für item_repo.OPS[op]
+    base_change_at TEXT,            -- remote_change_at beim Vormerken
+    created_at     TEXT NOT NULL,
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    last_error     TEXT
+);
+
+-- Fortschritt des Abgleichs (pull_change_at/pull_id, pull_null_id)
+CREATE TABLE IF NOT EXISTS sync_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS sync_conflicts (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    ean              TEXT NOT NULL,
+    op               TEXT NOT NULL,
+    args             TEXT NOT NULL,
+    base_change_at   TEXT,
+    remote_change_at TEXT,
+    resolution       TEXT NOT NULL,
+    created_at       TEXT NOT NULL
+);
+"""
+
+_ITEM_FIELDS = ("ean", "id", "name", "image_path", "qty", "shop_id", "last_user_id", "last_change_at")
+
+
+def _iso(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+class LocalReplica:
+    def __init__(self, path: str, retry_seconds: float = 15.0, slow_seconds: float = 1.0,
+                 slow_threshold: int = 3):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self.slow_seconds = slow_seconds
+        self.slow_threshold = slow_threshold
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+        # Zustand von MySQL aus Sicht der App
+        self._offline_until = 0.0
+        self._slow_in_a_row = 0
+        self.last_error = None
+
+    # ------------------------------------------------------------
+    # MySQL-Zustand
+    # ------------------------------------------------------------
+
+    def mysql_available(self) -> bool:
+        return time.monotonic() >= self._offline_until
+
+    def mark_offline(self, error) -> None:
+        if self.mysql_available():
+            print(f"[replica] MySQL nicht verfügbar, lokaler Betrieb für {self.retry_seconds:.0f}s: {error}")
+        self.last_error = str(error)
+        self._offline_until = time.monotonic() + self.retry_seconds
+
+    def mark_online(self) -> None:
+        if not self.mysql_available():
+            print("[replica] MySQL wieder erreichbar")
+        self._offline_until = 0.0
+        self._slow_in_a_row = 0
+
+    def note_latency(self, seconds: float) -> None:
+        # mehrere langsame Abfragen hintereinander -> wie offline behandeln
+        if seconds < self.slow_seconds:
+            self._slow_in_a_row = 0
+            return
+        self._slow_in_a_row += 1
+        if self._slow_in_a_row >= self.slow_threshold:
+            self._slow_in_a_row = 0
+            self.mark_offline(f"{self.slow_threshold} Abfragen langsamer als {self.slow_seconds}s")
+
+    # ------------------------------------------------------------
+    # Lesen
+    # ------------------------------------------------------------
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get_item(self, ean: str) -> dict | None:
+        rows = self._query(
+            f"SELECT {', '.join(_ITEM_FIELDS)} FROM items WHERE ean = ?", (ean,)
+        )
+        return self._item(rows[0]) if rows else None
+
+    def get_items(self, eans: list) -> dict:
+        """{ean: Zeile} für die bekannten EANs (Sammel-Lookup)."""
+        items = {}
+        # SQLite erlaubt je nach Version nur 999 Parameter
+        for i in range(0, len(eans), 500):
+            chunk = eans[i:i + 500]
+            rows = self._query(
+                f"SELECT {', '.join(_ITEM_FIELDS)} FROM items WHERE ean IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for r in rows:
+                items[r[0]] = self._item(r)
+        return items
+
+    @staticmethod
+    def _item(r) -> dict:
+        row = dict(zip(_ITEM_FIELDS, r))
+        return {
+            "ean": row["ean"],
+            "name": row["name"],
+            "image_path": row["image_path"] or "",
+            "qty": float(row["qty"]) if row["qty"] is not None else 0.0,
+            "shop_id": row["shop_id"],
+            "last_user_id": row["last_user_id"],
+            "last_change_at": row["last_change_at"].replace(" ", "T") if row["last_change_at"] else None,
+            "row_version": None,   # nur MySQL kennt die Version
+        }
+
+    def get_users(self):
+        return self._query("SELECT id, name, rfid_uid FROM users WHERE rfid_uid IS NOT NULL")
+
+    def get_shops(self) -> list:
+        rows = self._query("SELECT id, code, name, web_url FROM shops ORDER BY name")
+        return [{"id": r[0], "code": r[1], "name": r[2], "web_url": r[3]} for r in rows]
+
+    # ------------------------------------------------------------
+    # Stand aus MySQL übernehmen
+    # ------------------------------------------------------------
+
+    def store_items(self, rows) -> None:
+        """rows: Tupel (ean, id, name, image_path, qty, shop_id, last_user_id, last_change_at)."""
+        params = []
+        for r in rows:
+            change_at = _iso(r[7])
+            params.append((r[0], r[1], r[2] or "", r[3], float(r[4]) if r[4] is not None else None,
+                           r[5], r[6], change_at, change_at))
+        if not params:
+            return
+        with self._lock:
+            # Artikel mit offenen outbox-Einträgen nicht überschreiben –
+            # der lokale Stand ist dort neuer.
+            self._conn.execute("BEGIN")
+            self._conn.executemany("""
+                INSERT INTO items (ean, id, name, image_path, qty, shop_id, last_user_id,
+                                   last_change_at, remote_change_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ean) DO UPDATE SET
+                    id = excluded.id,
+                    name = excluded.name,
+                    image_path = excluded.image_path,
+                    qty = excluded.qty,
+                    shop_id = excluded.shop_id,
+                    last_user_id = excluded.last_user_id,
+                    last_change_at = excluded.last_change_at,
+                    remote_change_at = excluded.remote_change_at
+                WHERE NOT EXISTS (SELECT 1 FROM outbox o WHERE o.ean = items.ean)
+            """, params)
+            self._conn.execute("COMMIT")
+
+    def store_users(self, rows) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM users")
+            self._conn.executemany("INSERT INTO users (id, name, rfid_uid) VALUES (?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+
+    def store_shops(self, shops: list) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM shops")
+            self._conn.executemany(
+                "INSERT INTO shops (id, code, name, web_url) VALUES (?, ?, ?, ?)",
+                [(s["id"], s["code"], s["name"], s["web_url"]) for s in shops],
+            )
+            self._conn.execute("COMMIT")
+
+    def last_pulled_change_at(self) -> str | None:
+        rows = self._query("SELECT MAX(remote_change_at) FROM items")
+        return rows[0][0] if rows else None
+
+    def get_sync_state(self, key: str):
+        rows = self._query("SELECT value FROM sync_state WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def set_sync_state(self, **values) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(key, None if value is None else str(value)) for key, value in values.items()],
+            )
+
+    def pull_cursor(self) -> str | None:
+        """Neuestes last_change_at, das schon geholt wurde."""
+        change_at = self.get_sync_state("pull_change_at")
+        if change_at is None:
+            # Replikat von vor sync_state: ab der neuesten bekannten Sekunde
+            return self.last_pulled_change_at()
+        return change_at
+
+    # ------------------------------------------------------------
+    # Offline-Schreibvorgänge
+    # ------------------------------------------------------------
+
+    def queue_write(self, op: str, ean: str, args) -> None:
+        """Vormerken und lokal sofort anwenden (gleiche Merge-Regeln wie MySQL)."""
+        values, rules, touch = item_repo.item_spec(op, *args)
+        now = datetime.now().isoformat(sep=" ", timespec="seconds")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            cur = self._conn.execute(
+                "SELECT name, image_path, qty, shop_id, last_user_id, remote_change_at FROM items WHERE ean = ?",
+                (ean,),
+            )
+            existing = cur.fetchone()
+            # Basis für die Konflikterkennung: Stand von MySQL, auf dem die
+            # Änderung aufsetzt (bei mehreren offenen Änderungen derselbe)
+            pending = self._conn.execute(
+                "SELECT base_change_at FROM outbox WHERE ean = ? ORDER BY seq LIMIT 1", (ean,)
+            ).fetchone()
+            if pending:
+                base = pending[0]
+            else:
+                base = existing[5] if existing else None
+            current = dict(zip(item_repo.ITEM_COLUMNS, existing[:5])) if existing else None
+            row = item_repo.merge_row(current, values, rules)
+
+            self._conn.execute("""
+                INSERT INTO items (ean, name, image_path, qty, shop_id, last_user_id, last_change_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ean) DO UPDATE SET
+                    name = excluded.name,
+                    image_path = excluded.image_path,
+                    qty = excluded.qty,
+                    shop_id = excluded.shop_id,
+                    last_user_id = excluded.last_user_id,
+                    last_change_at = CASE WHEN ? THEN excluded.last_change_at ELSE items.last_change_at END
+            """, (ean, row["name"] or "", row["image_path"], row["qty"], row["shop_id"],
+                  row["last_user_id"], now if touch else None, int(touch)))
+            self._conn.execute(
+                "INSERT INTO outbox (op, ean, args, base_change_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (op, ean, json.dumps(list(args)), base, now),
+            )
+            self._conn.execute("COMMIT")
+
+    def outbox_batch(self, limit: int = 100):
+        return self._query(
+            "SELECT seq, op, ean, args, base_change_at FROM outbox ORDER BY seq LIMIT ?", (limit,)
+        )
+
+    def outbox_done(self, seq: int, ean: str, new_base: str | None) -> None:
+        # Weitere offene Änderungen derselben EAN setzen jetzt auf dem gerade
+        # geschriebenen Stand auf – sonst wären sie alle "Konflikte".
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+            self._conn.execute("UPDATE outbox SET base_change_at = ? WHERE ean = ?", (new_base, ean))
+            self._conn.execute("COMMIT")
+
+    def outbox_failed(self, seq: int, error) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE seq = ?",
+                (str(error), seq),
+            )
+
+    def record_conflict(self, ean, op, args, base, remote, resolution) -> None:
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO sync_conflicts (ean, op, args, base_change_at, remote_change_at, resolution, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (ean, op, args, base, remote, resolution,
+                  datetime.now().isoformat(sep=" ", timespec="seconds")))
+
+    def stats(self) -> dict:
+        outbox = self._query("SELECT COUNT(*), MIN(created_at) FROM outbox")[0]
+        return {
+            "mysql_available": self.mysql_available(),
+            "last_error": self.last_error,
+            "items": self._query("SELECT COUNT(*) FROM items")[0][0],
+            "users": self._query("SELECT COUNT(*) FROM users")[0][0],
+            "shops": self._query("SELECT COUNT(*) FROM shops")[0][0],
+            "outbox": outbox[0],
+            "outbox_oldest": outbox[1],
+            "conflicts": self._query("SELECT COUNT(*) FROM sync_conflicts")[0][0],
+            "last_pulled_change_at": self.last_pulled_change_at(),
+        }
+
+
+# ------------------------------------------------------------
+# Abgleich mit MySQL (Hintergrund-Thread)
+# ------------------------------------------------------------
+
+_ITEM_SELECT = """
+    SELECT ean, id, name, image_path, qty, shop_id, last_user_id, last_change_at
+    FROM items
+"""
+
+
+class ReplicaSync:
+    def __init__(self, replica: LocalReplica, get_connection, interval: float = 10.0,
+                 conflict_policy: str = "local_wins", pull_batch: int = 2000, pull_overlap: float = 30.0,
+                 on_item_synced=None):
+        self.replica = replica
+        self.get_connection = get_connection
+        self.interval = interval
+        self.conflict_policy = conflict_policy
+        self.pull_batch = pull_batch
+        self.pull_overlap = pull_overlap
+        self.on_item_synced = on_item_synced   # z.B. Cache-Invalidierung
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="replica-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync_once()
+            except Exception as e:
+                self.replica.mark_offline(e)
+            if self._stop.wait(self.interval):
+                return
+
+    def sync_once(self) -> None:
+        # Erst eigene Änderungen nach MySQL, dann fremde Änderungen holen
+        with self.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchall()
+            self.replica.mark_online()
+            self._push(conn, cur)
+            self._pull(cur)
+            cur.close()
+
+    def _push(self, conn, cur) -> None:
+        while True:
+            batch = self.replica.outbox_batch()
+            if not batch:
+                return
+            for seq, op, ean, args_json, base in batch:
+                args = json.loads(args_json)
+                try:
+                    cur.execute("SELECT last_change_at FROM items WHERE ean = %s FOR UPDATE", (ean,))
+                    row = cur.fetchone()
+                    remote = _iso(row[0]) if row else None
+
+                    # Deltas (adjust_qty) bauen nicht auf einem Stand auf -> nie ein Konflikt
+                    conflict = (op not in item_repo.COMMUTATIVE_OPS
+                                and remote is not None and (base is None or remote > base))
+                    if conflict:
+                        resolution = "remote_wins" if self.conflict_policy == "remote_wins" else "local_wins"
+                        self.replica.record_conflict(ean, op, args_json, base, remote, resolution)
+                        print(f"[replica] Konflikt bei EAN={ean} ({op}): MySQL {remote} > Basis {base} -> {resolution}")
+                        if resolution == "local_wins":
+                            item_repo.save(cur, op, ean, *args)
+                    else:
+                        item_repo.save(cur, op, ean, *args)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    self.replica.outbox_failed(seq, e)
+                    raise
+                new_base = self._refresh_item(cur, ean)
+                self.replica.outbox_done(seq, ean, new_base)
+
+    def _store_pulled(self, rows) -> None:
+        self.replica.store_items(rows)
+        if self.on_item_synced:
+            for row in rows:
+                self.on_item_synced(row[0])
+
+    def _refresh_item(self, cur, ean: str) -> str | None:
+        cur.execute(_ITEM_SELECT + " WHERE ean = %s", (ean,))
+        rows = cur.fetchall()
+        self.replica.store_items(rows)
+        if self.on_item_synced:
+            self.on_item_synced(ean)
+        return _iso(rows[0][7]) if rows else None
+
+    def _pull(self, cur) -> None:
+        # last_change_at hat nur Sekunden-Auflösung und NOW() ist der Start
+        # des Statements, nicht der Commit: eine Zeile kann nach dem letzten
+        # Pull mit einem älteren Zeitstempel sichtbar werden (lange
+        # Transaktion, zweites Update in derselben Sekunde). Deshalb jedes
+        # Mal pull_overlap Sekunden vor dem Cursor neu lesen – store_items
+        # ist idempotent. Die id dient nur zum Blättern innerhalb eines Pulls.
+        cursor = self.replica.pull_cursor()
+        since, since_id = None, 0
+        if cursor is not None:
+            since = _iso(datetime.fromisoformat(cursor) - timedelta(seconds=self.pull_overlap))
+        while True:
+            if since is None:
+                cur.execute(_ITEM_SELECT + " WHERE last_change_at IS NOT NULL "
+                            "ORDER BY last_change_at, id LIMIT %s", (self.pull_batch,))
+            else:
+                cur.execute(_ITEM_SELECT + " WHERE last_change_at >= %s AND (last_change_at > %s OR id > %s) "
+                            "ORDER BY last_change_at, id LIMIT %s", (since, since, since_id, self.pull_batch))
+            rows = cur.fetchall()
+            self._store_pulled(rows)
+            if rows:
+                since, since_id = _iso(rows[-1][7]), rows[-1][1]
+                if cursor is None or since > cursor:
+                    cursor = since
+                    self.replica.set_sync_state(pull_change_at=cursor)
+            if len(rows) < self.pull_batch:
+                break
+
+        # Zeilen ohne last_change_at (Altbestand, Schreiber außerhalb von
+        # item_repo) fallen durch den Zeitstempel-Abgleich – neue davon über
+        # die id holen
+        null_id = int(self.replica.get_sync_state("pull_null_id") or 0)
+        while True:
+            cur.execute(_ITEM_SELECT + " WHERE last_change_at IS NULL AND id > %s ORDER BY id LIMIT %s",
+                        (null_id, self.pull_batch))
+            rows = cur.fetchall()
+            self._store_pulled(rows)
+            if rows:
+                null_id = rows[-1][1]
+                self.replica.set_sync_state(pull_null_id=null_id)
+            if len(rows) < self.pull_batch:
+                break
+
+        cur.execute("SHOW TABLES LIKE 'users'")
+        if cur.fetchone():
+            cur.execute("SELECT id, name, rfid_uid FROM users")
+            self.replica.store_users(cur.fetchall())
+        cur.execute("SHOW TABLES LIKE 'shops'")
+        if cur.fetchone():
+            cur.execute("SELECT id, code, name, NULL FROM shops ORDER BY name")
+            self.replica.store_shops([
+                {"id": r[0], "code": r[1], "name": r[2], "web_url": r[3]} for r in cur.fetchall()
+            ])
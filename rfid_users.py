@@ -0,0 +1,47 @@
+# rfid_users.py
+#
+# RFID-Karten den Usern zuordnen. Bewusst nur als Kommandozeile und nicht
+# als HTTP-Route: wer eine Karte umhängen kann, kann sich als jeder User
+# anmelden. Laufende Server übernehmen die Änderung spätestens nach
+# RFID_USERS_REFRESH_SECONDS (siehe db.get_user_by_rfid).
+#
+#   python rfid_users.py                     # alle Karten anzeigen
+#   python rfid_users.py 3 04a1b2c3          # User 3 bekommt die Karte
+#   python rfid_users.py 3 --remove          # User 3 die Karte entziehen
+import argparse
+import sys
+
+from db import normalize_rfid_uid, set_user_rfid, get_user_by_rfid, _fetch_rfid_users
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RFID-Karten der User verwalten")
+    parser.add_argument("user_id", nargs="?", type=int)
+    parser.add_argument("rfid_uid", nargs="?")
+    parser.add_argument("--remove", action="store_true", help="Karte des Users entziehen")
+    args = parser.parse_args(argv)
+
+    if args.user_id is None:
+        for user_id, name, uid in sorted(_fetch_rfid_users() or []):
+            print(f"{user_id:>5}  {normalize_rfid_uid(uid):<20}  {name}")
+        return 0
+
+    if args.remove == bool(args.rfid_uid):
+        parser.error("UID oder --remove angeben")
+    uid = None if args.remove else normalize_rfid_uid(args.rfid_uid)
+    if not args.remove and not uid:
+        parser.error(f"UID ungültig: {args.rfid_uid!r}")
+
+    if uid:
+        owner = get_user_by_rfid(uid)
+        if owner and owner["id"] != args.user_id:
+            print(f"[rfid_users] Karte {uid} gehört User {owner['id']} ({owner['name']}) – wird umgehängt")
+            set_user_rfid(owner["id"], None)
+
+    set_user_rfid(args.user_id, uid)
+    print(f"[rfid_users] User {args.user_id}: {uid or 'keine Karte'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
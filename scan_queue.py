@@ -0,0 +1,233 @@
+# scan_queue.py
+#
+# Optionaler Write-Behind-Modus für /api/save_item: Scans landen zuerst in
+# einer Warteschlange im Speicher (pro EAN zusammengefasst) und werden alle
+# WRITE_BEHIND_WINDOW Sekunden in EINER Transaktion geschrieben.
+#
+# Damit beim Absturz nichts verloren geht, wird jeder Scan vorher an ein
+# lokales Journal (JSONL, fsync) angehängt. Beim Start wird ein vorhandenes
+# Journal wieder eingelesen und geschrieben.
+import atexit
+import json
+import os
+import threading
+import time
+
+import item_repo
+from config import (
+    WRITE_BEHIND_ENABLED, WRITE_BEHIND_WINDOW, WRITE_BEHIND_JOURNAL, WRITE_BEHIND_FSYNC,
+)
+from db import get_db_connection, invalidate_item, update_search_index
+
+FIELDS = ("name", "qty", "shop_id", "last_user_id")
+
+
+class WriteBehindQueue:
+    def __init__(self, journal_path: str, window: float = 1.0, fsync: bool = True):
+        self.journal_path = journal_path
+        self.flushing_path = journal_path + ".flushing"
+        self.window = window
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}          # ean -> zusammengefasste Felder
+        self._journal = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "flush_errors": 0,
+            "replayed": 0,
+        }
+
+    # ------------------------------------------------------------
+    # Start / Stop
+    # ------------------------------------------------------------
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        self._replay()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="scan-queue", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        print(f"[scan_queue] Write-Behind aktiv, Fenster={self.window}s, Journal={self.journal_path}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.window + 5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.window):
+            try:
+                self.flush()
+            except Exception as e:
+                # Journal bleibt liegen -> nächster Versuch im nächsten Fenster
+                print(f"[scan_queue] Flush fehlgeschlagen: {e}")
+
+    # ------------------------------------------------------------
+    # Schreiben
+    # ------------------------------------------------------------
+
+    def enqueue(self, ean: str, name: str, qty: float, shop_id: int | None,
+                user_id: int | None) -> None:
+        entry = {"ean": ean, "name": name, "qty": qty, "shop_id": shop_id,
+                 "last_user_id": user_id, "ts": time.time()}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            # erst ins Journal, dann in den Speicher
+            self._journal.write(line)
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._merge(entry)
+
+    def _merge(self, entry: dict) -> None:
+        ean = entry["ean"]
+        current = self._pending.get(ean)
+        self.stats["enqueued"] += 1
+        if current is None:
+            self._pending[ean] = {f: entry.get(f) for f in FIELDS}
+            return
+        self.stats["coalesced"] += 1
+        # gleiche Regeln wie item_repo.save_scan: leerer Name behält den alten
+        if entry.get("name"):
+            current["name"] = entry["name"]
+        for f in ("qty", "shop_id", "last_user_id"):
+            current[f] = entry.get(f)
+
+    def pending_for(self, ean: str) -> dict | None:
+        with self._lock:
+            entry = self._pending.get(ean)
+            return dict(entry) if entry else None
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            # Wenn ein früherer Flush gescheitert ist, liegt dessen Journal
+            # noch da – erst das schreiben, damit die Reihenfolge stimmt.
+            if os.path.exists(self.flushing_path):
+                self._write_journal_file(self.flushing_path)
+
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                # Journal rotieren: neue Scans gehen in eine frische Datei
+                self._journal.close()
+                os.replace(self.journal_path, self.flushing_path)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+            try:
+                self._write(batch)
+            except Exception:
+                self.stats["flush_errors"] += 1
+                raise
+            os.remove(self.flushing_path)
+            return len(batch)
+
+    def _write(self, batch: dict) -> None:
+        rows = [
+            (ean, e["name"] or "", e["qty"], e["shop_id"], e["last_user_id"])
+            for ean, e in batch.items()
+        ]
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.executemany(item_repo.build_bulk_upsert(FIELDS), rows)
+            conn.commit()
+            cur.close()
+        for ean, e in batch.items():
+            invalidate_item(ean)
+            update_search_index(ean, e["name"])
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(rows)
+
+    def _write_journal_file(self, path: str) -> None:
+        batch = {}
+        for entry in _read_journal(path):
+            ean = entry["ean"]
+            cur = batch.setdefault(ean, {f: None for f in FIELDS})
+            if entry.get("name"):
+                cur["name"] = entry["name"]
+            for f in ("qty", "shop_id", "last_user_id"):
+                cur[f] = entry.get(f)
+        if batch:
+            self._write(batch)
+        os.remove(path)
+
+    def _replay(self) -> None:
+        # Liegengebliebene Scans aus dem letzten Lauf: .flushing zuerst (älter)
+        for path in (self.flushing_path, self.journal_path):
+            for entry in _read_journal(path):
+                self._merge(entry)
+                self.stats["replayed"] += 1
+        if self._pending:
+            print(f"[scan_queue] {self.stats['replayed']} Scans aus Journal wiederhergestellt")
+            if os.path.exists(self.flushing_path):
+                os.remove(self.flushing_path)
+            # in eine Datei zusammenführen, dann normal flushen
+            with open(self.journal_path, "w", encoding="utf-8") as f:
+                for ean, e in self._pending.items():
+                    f.write(json.dumps({"ean": ean, **e}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "pending": len(self._pending), "window": self.window}
+
+
+def _read_journal(path: str):
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # halb geschriebene letzte Zeile nach Absturz
+                print(f"[scan_queue] Kaputte Journal-Zeile ignoriert: {line[:80]}")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_scan_queue() -> WriteBehindQueue | None:
+    """Die Warteschlange, falls WRITE_BEHIND_ENABLED – sonst None."""
+    global _queue
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                q = WriteBehindQueue(WRITE_BEHIND_JOURNAL, WRITE_BEHIND_WINDOW, WRITE_BEHIND_FSYNC)
+                q.start()
+                _queue = q
+    return _queue
+
+
+def flush_pending(ean: str) -> None:
+    """
+    Vor jedem direkten Schreibvorgang auf items (Delta, Version, Name,
+    Produkt, Bild): einen noch vorgemerkten absoluten Scan derselben EAN
+    zuerst schreiben, sonst überschreibt er die Änderung beim nächsten
+    Flush wieder.
+
+    Immer flush() statt vorher pending_for(ean) zu prüfen: der Scan kann
+    schon aus _pending heraus sein, während der Hintergrund-Flush ihn noch
+    schreibt, oder nach einem gescheiterten Flush im .flushing-Journal
+    liegen. flush() wartet auf _flush_lock und schreibt .flushing zuerst.
+    """
+    queue = get_scan_queue()
+    if queue is not None:
+        queue.flush()
@@ -0,0 +1,447 @@
+# search_index.py
+#
+# Suchindex im Prozess für /api/search (Typeahead über Artikelnamen, SKU
+# und Box-Etiketten). Aufbau:
+#
+#   Wort -> Artikel          invertierter Index über die Namens-Wörter
+#   Wortliste (sortiert)     Präfixsuche per bisect ("schrau" -> "schraube", ...)
+#   Trigramm -> Wörter       Tippfehler und Wortteile ("schruabe", "dreher")
+#   Codes (sortiert)         SKU, Box-Codes, EAN ohne Trenner – nur Präfix, kein Fuzzy
+#
+# Trigramme laufen über die Wortliste, nicht über die Artikel – die ist
+# auch bei 500k Artikeln klein. Umlaute werden gefaltet (ä -> ae und a),
+# "Müller" findet man also mit "mueller" und mit "muller".
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime
+
+MIN_PREFIX = 2              # kürzere Suchbegriffe nur exakt
+MIN_FUZZY = 4               # ab dieser Länge auch Tippfehler/Wortteile
+FUZZY_THRESHOLD = 0.3       # Jaccard-Ähnlichkeit der Trigramme ("schruabe" ~ "schraube": 0.33)
+MAX_TERM_WORDS = 200        # Wörter pro Suchbegriff (beste zuerst)
+MAX_TERM_DOCS = 2000        # Kandidaten aus dem seltensten Suchbegriff (beste Wörter zuerst)
+FUZZY_BELOW = 50            # Fuzzy erst, wenn exakt/Präfix weniger Treffer liefert
+
+_RE_TOKEN = re.compile(r"[0-9a-z]+")
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_UMLAUTS_PLAIN = str.maketrans({"ä": "a", "ö": "o", "ü": "u", "ß": "ss"})
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def fold(text: str | None) -> str:
+    """Kleinbuchstaben, Umlaute als ae/oe/ue, ß als ss, übrige Akzente weg."""
+    return _strip_accents((text or "").lower().translate(_UMLAUTS))
+
+
+def tokens(text: str | None) -> set:
+    low = (text or "").lower()
+    result = set(_RE_TOKEN.findall(_strip_accents(low.translate(_UMLAUTS))))
+    if low != low.translate(_UMLAUTS_PLAIN):
+        result.update(_RE_TOKEN.findall(_strip_accents(low.translate(_UMLAUTS_PLAIN))))
+    return result
+
+
+def trigrams(word: str) -> set:
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def compact(text: str | None) -> str:
+    """Codes (EAN, SKU, Box) ohne Trenner: "SKU-4711" -> "sku4711"."""
+    return "".join(_RE_TOKEN.findall(fold(text)))
+
+
+def _prefix_range(sorted_words: list, prefix: str, limit: int):
+    lo = bisect.bisect_left(sorted_words, prefix)
+    hi = bisect.bisect_left(sorted_words, prefix + "\uffff", lo, min(len(sorted_words), lo + limit))
+    return sorted_words[lo:hi]
+
+
+class _Postings:
+    """Schlüssel -> Menge von Doc-IDs, plus sortierte Schlüsselliste für Präfixe."""
+
+    def __init__(self):
+        self.docs = {}
+        self.sorted = []
+        self.bulk = False       # beim Neuaufbau erst am Ende sortieren
+
+    def add(self, key, doc_id) -> bool:
+        ids = self.docs.get(key)
+        if ids is None:
+            self.docs[key] = {doc_id}
+            if not self.bulk:
+                bisect.insort(self.sorted, key)
+            return True
+        ids.add(doc_id)
+        return False
+
+    def discard(self, key, doc_id) -> bool:
+        ids = self.docs.get(key)
+        if ids is None:
+            return False
+        ids.discard(doc_id)
+        if ids:
+            return False
+        del self.docs[key]
+        i = bisect.bisect_left(self.sorted, key)
+        if i < len(self.sorted) and self.sorted[i] == key:
+            del self.sorted[i]
+        return True
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.ready = False
+        self.loaded_at = None
+        self.stats = {"searches": 0, "updates": 0, "search_time_total": 0.0, "search_time_max": 0.0}
+
+    def _reset(self):
+        self._docs = []             # doc_id -> (ean, name, sku, boxes, Schlüssel) oder None (gelöscht)
+        self._by_ean = {}
+        self._free = []
+        self._words = _Postings()
+        self._codes = _Postings()
+        self._trigrams = {}         # Trigramm -> Menge von Wörtern
+
+    # ------------------------------------------------------------
+    # Pflege
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _make_doc(ean, name, sku, boxes):
+        words = tokens(name)
+        codes = {compact(c) for c in [ean, sku, *boxes] if c}
+        codes.discard("")
+        return (ean, name, sku, boxes, frozenset(words), frozenset(codes))
+
+    def _add_keys(self, doc_id, words, codes):
+        for word in words:
+            if self._words.add(word, doc_id):
+                for tri in trigrams(word):
+                    self._trigrams.setdefault(tri, set()).add(word)
+        for code in codes:
+            self._codes.add(code, doc_id)
+
+    def _remove_keys(self, doc_id, words, codes):
+        for word in words:
+            if self._words.discard(word, doc_id):
+                for tri in trigrams(word):
+                    bucket = self._trigrams.get(tri)
+                    if bucket is not None:
+                        bucket.discard(word)
+                        if not bucket:
+                            del self._trigrams[tri]
+        for code in codes:
+            self._codes.discard(code, doc_id)
+
+    def upsert(self, ean: str, name: str | None = None, sku: str | None = None,
+               boxes: list | None = None) -> None:
+        """Artikel anlegen/ändern. None heißt: bisherigen Wert behalten."""
+        with self._lock:
+            doc_id = self._by_ean.get(ean)
+            if doc_id is None:
+                doc = self._make_doc(ean, name or "", sku, list(boxes or []))
+                doc_id = self._free.pop() if self._free else len(self._docs)
+                if doc_id == len(self._docs):
+                    self._docs.append(doc)
+                else:
+                    self._docs[doc_id] = doc
+                self._by_ean[ean] = doc_id
+                self._add_keys(doc_id, doc[4], doc[5])
+            else:
+                old = self._docs[doc_id]
+                fields = (ean,
+                          old[1] if name is None else name,
+                          old[2] if sku is None else sku,
+                          old[3] if boxes is None else list(boxes))
+                if fields == old[:4]:
+                    return
+                new = self._make_doc(*fields)
+                self._remove_keys(doc_id, old[4] - new[4], old[5] - new[5])
+                self._add_keys(doc_id, new[4] - old[4], new[5] - old[5])
+                self._docs[doc_id] = new
+            self.stats["updates"] += 1
+
+    def remove(self, ean: str) -> None:
+        with self._lock:
+            doc_id = self._by_ean.pop(ean, None)
+            if doc_id is None:
+                return
+            doc = self._docs[doc_id]
+            self._remove_keys(doc_id, doc[4], doc[5])
+            self._docs[doc_id] = None
+            self._free.append(doc_id)
+
+    def load(self, rows) -> int:
+        """
+        Kompletter Neuaufbau aus (ean, name, sku, boxes)-Tupeln. Gebaut wird
+        in einem frischen Index, getauscht erst am Ende – Suchen laufen
+        währenddessen auf dem alten weiter.
+        """
+        fresh = SearchIndex()
+        fresh._words.bulk = fresh._codes.bulk = True
+        count = 0
+        for ean, name, sku, boxes in rows:
+            fresh.upsert(ean, name or "", sku, boxes)
+            count += 1
+        for postings in (fresh._words, fresh._codes):
+            postings.sorted = sorted(postings.docs)
+            postings.bulk = False
+        with self._lock:
+            self._docs, self._by_ean, self._free = fresh._docs, fresh._by_ean, fresh._free
+            self._words, self._codes, self._trigrams = fresh._words, fresh._codes, fresh._trigrams
+            self.ready = True
+            self.loaded_at = time.time()
+        return count
+
+    # ------------------------------------------------------------
+    # Suche
+    # ------------------------------------------------------------
+
+    def _fuzzy_words(self, term: str, found: dict) -> None:
+        query_tris = trigrams(term)
+        shared = Counter()
+        for tri in query_tris:
+            bucket = self._trigrams.get(tri)
+            if bucket:
+                shared.update(bucket)
+        # Jaccard >= FUZZY_THRESHOLD braucht mindestens so viele gemeinsame Trigramme
+        min_overlap = max(2, int(FUZZY_THRESHOLD * len(query_tris)))
+        for word, overlap in shared.items():
+            if overlap < min_overlap or word in found:
+                continue
+            if overlap >= len(query_tris) - 2 and term in word:
+                found[word] = 0.7      # Wortteil, z.B. "dreher" in "schraubendreher"
+                continue
+            # len(word) Trigramme (mit Rand-$) – ohne die Menge zu bauen
+            similarity = overlap / (len(query_tris) + len(word) - overlap)
+            if similarity >= FUZZY_THRESHOLD:
+                found[word] = 0.6 * similarity
+
+    def _term_matches(self, term: str):
+        """
+        Schlüssel (Wort oder Code), die zu einem Suchbegriff passen, mit Score.
+        Gibt (words, codes, geschätzte Trefferzahl) zurück.
+        """
+        words, codes = {}, {}
+        if term in self._words.docs:
+            words[term] = 1.0
+        if len(term) >= MIN_PREFIX:
+            for word in _prefix_range(self._words.sorted, term, MAX_TERM_WORDS):
+                # kürzere Ergänzungen zuerst ("schraube" vor "schraubendreher")
+                words.setdefault(word, 0.9 - min(0.2, (len(word) - len(term)) * 0.01))
+            for code in _prefix_range(self._codes.sorted, term, MAX_TERM_WORDS):
+                codes[code] = 1.0 if code == term else 0.85
+        elif term in self._codes.docs:
+            codes[term] = 1.0
+
+        estimate = (sum(len(self._words.docs[w]) for w in words)
+                    + sum(len(self._codes.docs[c]) for c in codes))
+        # Tippfehler/Wortteile nur, wenn es direkt kaum Treffer gibt
+        if len(term) >= MIN_FUZZY and estimate < FUZZY_BELOW:
+            self._fuzzy_words(term, words)
+            estimate = sum(len(self._words.docs[w]) for w in words) + estimate
+        return words, codes, estimate
+
+    def _expand(self, words: dict, codes: dict) -> dict:
+        # Beste Schlüssel zuerst, bis MAX_TERM_DOCS Artikel gesammelt sind
+        keys = sorted(
+            [(score, self._words.docs[w]) for w, score in words.items()]
+            + [(score, self._codes.docs[c]) for c, score in codes.items()],
+            key=lambda kv: kv[0], reverse=True,
+        )
+        scores = {}
+        for score, doc_ids in keys:
+            if len(scores) >= MAX_TERM_DOCS:
+                break
+            for doc_id in doc_ids:
+                if doc_id not in scores:
+                    scores[doc_id] = score
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> list:
+        started = time.perf_counter()
+        terms = list(dict.fromkeys(_RE_TOKEN.findall(fold(query))))
+        # "SKU-4711" / "B-000042": auch als zusammenhängender Code suchen
+        whole = compact(query)
+        results = []
+        with self._lock:
+            if terms:
+                matches = [self._term_matches(t) for t in terms]
+                # Der Begriff mit den wenigsten Treffern bestimmt die Kandidaten,
+                # die übrigen werden nur noch pro Kandidat geprüft.
+                order = sorted(range(len(terms)), key=lambda i: matches[i][2])
+                lead_words, lead_codes, _ = matches[order[0]]
+                candidates = self._expand(lead_words, lead_codes)
+
+                for i in order[1:]:
+                    words, codes, _ = matches[i]
+                    kept = {}
+                    for doc_id, score in candidates.items():
+                        doc = self._docs[doc_id]
+                        best = max([words.get(k, 0.0) for k in doc[4]]
+                                   + [codes.get(k, 0.0) for k in doc[5]])
+                        if best:
+                            kept[doc_id] = score + best
+                    candidates = kept
+                    if not candidates:
+                        break
+
+                if len(terms) > 1 and whole:
+                    for code in _prefix_range(self._codes.sorted, whole, MAX_TERM_WORDS):
+                        score = (1.0 if code == whole else 0.85) * len(terms)
+                        for doc_id in self._codes.docs[code]:
+                            if candidates.get(doc_id, 0.0) < score:
+                                candidates[doc_id] = score
+
+                best = heapq.nlargest(
+                    limit, candidates.items(),
+                    key=lambda kv: (kv[1], -len(self._docs[kv[0]][1])),
+                )
+                for doc_id, score in best:
+                    ean, name, sku, boxes = self._docs[doc_id][:4]
+                    results.append({
+                        "ean": ean,
+                        "name": name,
+                        "sku": sku,
+                        "boxes": boxes,
+                        "score": round(score / len(terms), 3),
+                    })
+
+            elapsed = time.perf_counter() - started
+            self.stats["searches"] += 1
+            self.stats["search_time_total"] += elapsed
+            self.stats["search_time_max"] = max(self.stats["search_time_max"], elapsed)
+        return results
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            s = dict(self.stats)
+            s.update({
+                "ready": self.ready,
+                "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at))
+                if self.loaded_at else None,
+                "items": len(self._by_ean),
+                "words": len(self._words.docs),
+                "codes": len(self._codes.docs),
+                "trigrams": len(self._trigrams),
+            })
+        s["search_ms_avg"] = s["search_time_total"] / s["searches"] * 1000 if s["searches"] else 0.0
+        s["search_ms_max"] = s.pop("search_time_max") * 1000
+        s.pop("search_time_total")
+        return s
+
+
+# ------------------------------------------------------------
+# Laden aus MySQL (Hintergrund-Thread)
+# ------------------------------------------------------------
+
+_ITEMS_SQL = """
+    SELECT i.ean, i.name, {sku}, {boxes}, i.last_change_at
+    FROM items i
+    {join}
+    WHERE i.ean IS NOT NULL {where}
+    GROUP BY i.id
+"""
+
+
+class SearchIndexRefresher:
+    """
+    Baut den Index beim Start komplett auf, holt danach alle `interval`
+    Sekunden die seit dem letzten Lauf geänderten Artikel (last_change_at)
+    und baut alle `full_interval` Sekunden neu auf – Box-Umzüge ändern
+    last_change_at nicht.
+    """
+
+    def __init__(self, index: SearchIndex, get_connection, interval: float = 30.0,
+                 full_interval: float = 3600.0, fetch_size: int = 5000):
+        self.index = index
+        self.get_connection = get_connection
+        self.interval = interval
+        self.full_interval = full_interval
+        self.fetch_size = fetch_size
+        self._since = None
+        self._last_full = 0.0
+        self._full_requested = threading.Event()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._full_requested.set()
+
+    def request_full_reload(self):
+        self._full_requested.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if (self._full_requested.is_set() or self._since is None
+                        or time.monotonic() - self._last_full >= self.full_interval):
+                    self._full_requested.clear()
+                    self.reload()
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(f"[search] Laden fehlgeschlagen: {e}")
+            self._full_requested.wait(self.interval)
+
+    def _rows(self, since=None):
+        with self.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SHOW TABLES LIKE 'item_locations'")
+            has_locations = cur.fetchone() is not None
+            cur.execute("SHOW COLUMNS FROM items LIKE 'sku'")
+            has_sku = cur.fetchone() is not None
+            cur.close()
+            sql = _ITEMS_SQL.format(
+                sku="i.sku" if has_sku else "NULL",
+                boxes="GROUP_CONCAT(DISTINCT l.box_code SEPARATOR ',')" if has_locations else "NULL",
+                join="LEFT JOIN item_locations l ON l.item_id = i.id" if has_locations else "",
+                where="AND i.last_change_at >= %s" if since else "",
+            )
+            # ungepuffert in Blöcken: 500k Zeilen nicht auf einmal im Speicher
+            cur = conn.cursor(buffered=False)
+            cur.execute(sql, (since,) if since else ())
+            newest = since
+            while True:
+                rows = cur.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                for ean, name, sku, boxes, changed in rows:
+                    if changed is not None and (newest is None or changed > newest):
+                        newest = changed
+                    yield ean, name, sku, boxes.split(",") if boxes else []
+            cur.close()
+            self._since = newest or self._since
+
+    def reload(self) -> int:
+        started = time.perf_counter()
+        self._since = None
+        count = self.index.load(self._rows())
+        self._last_full = time.monotonic()
+        if self._since is None:
+            self._since = datetime.now()
+        print(f"[search] Index aufgebaut: {count} Artikel in {time.perf_counter() - started:.1f}s")
+        return count
+
+    def refresh(self) -> int:
+        count = 0
+        for ean, name, sku, boxes in self._rows(self._since):
+            self.index.upsert(ean, name or "", sku, boxes)
+            count += 1
+        return count
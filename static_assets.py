@@ -0,0 +1,272 @@
+# static_assets.py
+#
+# Build-Schritt und Auslieferung für alles unter public/ (Bootstrap,
+# jQuery-UI, libs, eigene JS/CSS). Der Build legt in STATIC_BUILD_DIR pro
+# Datei eine Kopie mit Inhalts-Hash im Namen ab (js/main.3f2a9c01bd.js) und
+# daneben vorkomprimierte .gz/.br-Varianten. manifest.json ordnet die
+# Originalnamen den Fingerprint-Namen zu.
+#
+# Beim Ausliefern:
+#   /public/js/main.3f2a9c01bd.js  -> ändert sich nie, "immutable" für ein Jahr
+#   /public/js/main.js             -> no-cache + ETag (304 beim Neuladen)
+# In beiden Fällen wird nach Accept-Encoding die .br- bzw. .gz-Datei
+# geschickt, ohne pro Request zu komprimieren. Die HTML-Seiten aus views/
+# und mobile_views/ bekommen beim Ausliefern die Fingerprint-URLs eingesetzt.
+#
+# Ist eine Datei seit dem Build geändert worden (oder noch nie gebaut), geht
+# der Request an die Originaldatei – Bearbeiten ohne Build funktioniert also
+# weiter, nur eben ohne Kompression und Dauer-Cache.
+#
+#   python static_assets.py            # inkrementell (nur geänderte Dateien)
+#   python static_assets.py --clean    # alles neu
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+from config import PUBLIC_DIR, STATIC_BUILD_DIR, STATIC_MAX_AGE, STATIC_COMPRESS_MIN_BYTES, STATIC_BUILD_ON_START
+
+MANIFEST_NAME = "manifest.json"
+
+# Bilder/Fonts sind schon komprimiert – nur Text lohnt sich
+_COMPRESSIBLE = {".js", ".css", ".svg", ".html", ".json", ".map", ".txt", ".xml", ".ttf", ".eot"}
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_manifest = None            # {"files": {...}, "built_at": ...}
+_manifest_mtime = None
+_by_hashed = {}             # Fingerprint-Name -> Originalname
+_manifest_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+_html_cache = {}            # Pfad -> (mtime_ns, html ohne ersetzte URLs)
+
+# ../public/... oder /public/... in src/href der Views
+_ASSET_REF = re.compile(r"""(?P<attr>(?:src|href)\s*=\s*["'])(?:\.\./|/)public/(?P<path>[^"'?#]+)""")
+
+
+def _hashed_name(rel: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel)
+    return f"{root}.{digest}{ext}"
+
+
+def _compress(data: bytes, ext: str) -> dict:
+    """{Endung: Bytes} der Varianten, die wirklich kleiner sind."""
+    if ext not in _COMPRESSIBLE or len(data) < STATIC_COMPRESS_MIN_BYTES:
+        return {}
+    out = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+        out[".br"] = brotli.compress(data, quality=11)
+    except ImportError:
+        pass
+    # unter 90 % der Originalgröße lohnt der Umweg nicht
+    return {suffix: blob for suffix, blob in out.items() if len(blob) < len(data) * 0.9}
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_manifest() -> dict:
+    try:
+        with open(os.path.join(STATIC_BUILD_DIR, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+
+
+def build(clean: bool = False) -> dict:
+    """
+    Fingerprint + .gz/.br für alle Dateien unter public/. Unveränderte
+    Dateien (gleiche mtime/Größe, Ausgaben vorhanden) werden übersprungen.
+    """
+    with _build_lock:
+        started = time.perf_counter()
+        old = {} if clean else _read_manifest().get("files", {})
+        files, built = {}, 0
+        try:
+            import brotli  # noqa: F401
+            have_brotli = True
+        except ImportError:
+            have_brotli = False
+            print("[static_assets] brotli nicht installiert, nur gzip")
+
+        for dirpath, dirnames, filenames in os.walk(PUBLIC_DIR):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                source = os.path.join(dirpath, filename)
+                rel = os.path.relpath(source, PUBLIC_DIR).replace(os.sep, "/")
+                st = os.stat(source)
+                entry = old.get(rel)
+                # ohne brotli gebaut, jetzt aber vorhanden -> neu bauen
+                missing_br = entry and have_brotli and entry["encodings"] == ["gzip"]
+                if (entry and not missing_br
+                        and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size
+                        and os.path.exists(os.path.join(STATIC_BUILD_DIR, entry["hashed"]))):
+                    files[rel] = entry
+                    continue
+
+                with open(source, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:10]
+                hashed = _hashed_name(rel, digest)
+                target = os.path.join(STATIC_BUILD_DIR, hashed)
+                _write(target, data)
+                variants = _compress(data, os.path.splitext(rel)[1].lower())
+                for suffix, blob in variants.items():
+                    _write(target + suffix, blob)
+                files[rel] = {
+                    "hashed": hashed,
+                    "etag": digest,
+                    "mtime_ns": st.st_mtime_ns,
+                    "size": st.st_size,
+                    "encodings": [name for name, suffix in _ENCODINGS if suffix in variants],
+                }
+                built += 1
+
+        manifest = {"built_at": time.time(), "files": files}
+        _write(os.path.join(STATIC_BUILD_DIR, MANIFEST_NAME),
+               json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+
+        # Ausgaben alter Stände entfernen
+        keep = {MANIFEST_NAME}
+        for entry in files.values():
+            keep.add(entry["hashed"])
+            keep.update(entry["hashed"] + suffix for _, suffix in _ENCODINGS)
+        removed = 0
+        for dirpath, _, filenames in os.walk(STATIC_BUILD_DIR):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if os.path.relpath(path, STATIC_BUILD_DIR).replace(os.sep, "/") not in keep:
+                    os.remove(path)
+                    removed += 1
+
+    seconds = round(time.perf_counter() - started, 3)
+    print(f"[static_assets] Build: {len(files)} Dateien, {built} neu, {removed} alte entfernt ({seconds}s)")
+    return {"files": len(files), "built": built, "removed": removed, "seconds": seconds}
+
+
+def manifest() -> dict:
+    """Aktuelles Manifest; wird neu gelesen, wenn ein Build es ersetzt hat."""
+    global _manifest, _manifest_mtime, _by_hashed
+    try:
+        mtime = os.stat(os.path.join(STATIC_BUILD_DIR, MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _manifest_lock:
+        if _manifest is None or mtime != _manifest_mtime:
+            _manifest = _read_manifest() if mtime else {"files": {}}
+            _manifest_mtime = mtime
+            _by_hashed = {entry["hashed"]: rel for rel, entry in _manifest["files"].items()}
+        return _manifest
+
+
+def _is_current(rel: str, entry: dict) -> bool:
+    try:
+        st = os.stat(os.path.join(PUBLIC_DIR, rel))
+    except OSError:
+        return False
+    return st.st_mtime_ns == entry["mtime_ns"] and st.st_size == entry["size"]
+
+
+def asset_url(rel: str) -> str:
+    """/public-URL mit Fingerprint, solange der Build aktuell ist."""
+    entry = manifest()["files"].get(rel)
+    if entry and _is_current(rel, entry):
+        return "/public/" + entry["hashed"]
+    return "/public/" + rel
+
+
+def resolve(filename: str, accept_encodings) -> dict | None:
+    """
+    Was für /public/<filename> zu schicken ist: Pfad, ETag, Mimetype,
+    Content-Encoding, ob immutable. None = nicht gebaut, Original nehmen.
+    """
+    files = manifest()["files"]
+    rel = _by_hashed.get(filename)
+    immutable = rel is not None
+    if rel is None:
+        rel = filename
+        entry = files.get(rel)
+        if entry is None or not _is_current(rel, entry):
+            return None
+    else:
+        entry = files[rel]
+
+    path = os.path.join(STATIC_BUILD_DIR, entry["hashed"])
+    encoding = None
+    for name, suffix in _ENCODINGS:
+        if name in entry["encodings"] and accept_encodings.quality(name) > 0:
+            encoding = name
+            path += suffix
+            break
+    return {
+        "path": path,
+        # jede Kodierung ist eine eigene Darstellung -> eigener starker ETag
+        "etag": f"{entry['etag']}-{encoding}" if encoding else entry["etag"],
+        "mimetype": mimetypes.guess_type(rel)[0] or "application/octet-stream",
+        "encoding": encoding,
+        "immutable": immutable,
+        "has_variants": bool(entry["encodings"]),
+    }
+
+
+def cache_control(immutable: bool) -> str:
+    return f"public, max-age={STATIC_MAX_AGE}, immutable" if immutable else "no-cache"
+
+
+def render_view(directory: str, filename: str) -> str:
+    """
+    HTML-Seite mit Fingerprint-URLs für alle /public-Verweise. Nur die
+    Datei wird gecacht; die URLs werden bei jedem Aufruf neu eingesetzt,
+    weil asset_url() je nach Stand der einzelnen Datei (seit dem Build
+    geändert?) eine andere URL liefert.
+    """
+    path = os.path.join(directory, filename)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _html_cache.get(path)
+    if cached and cached[0] == mtime:
+        html = cached[1]
+    else:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        _html_cache[path] = (mtime, html)
+    return _ASSET_REF.sub(lambda m: m.group("attr") + asset_url(m.group("path")), html)
+
+
+def start_static_build() -> None:
+    """Inkrementeller Build beim Start, im Hintergrund (bis dahin: Originale)."""
+    if not STATIC_BUILD_ON_START:
+        return
+
+    def run():
+        try:
+            build()
+        except Exception as e:
+            print(f"[static_assets] Build fehlgeschlagen: {e}")
+    threading.Thread(target=run, name="static-build", daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="public/ mit Fingerprint und gzip/brotli bauen")
+    parser.add_argument("--clean", action="store_true", help="alles neu bauen")
+    args = parser.parse_args(argv)
+    if args.clean and os.path.isdir(STATIC_BUILD_DIR):
+        shutil.rmtree(STATIC_BUILD_DIR)
+    print(json.dumps(build(clean=args.clean), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# stock.py
+#
+# Bestand pro Artikel über alle Boxen (box_inventory) und Fächer
+# (bin_inventory). Die Summen stehen fertig in item_stock und werden von
+# Triggern (migrations.py, Version 5) bei jeder Inventar-Änderung um die
+# Differenz fortgeschrieben – Lesen ist damit ein einzelner Primary-Key-Zugriff.
+#
+# Der Prüflauf rechnet alle Summen neu aus den Inventar-Tabellen und meldet
+# Abweichungen (z.B. nach Änderungen mit deaktivierten Triggern):
+#
+#   python stock.py [--fix]
+#   python stock.py --ean 4003082045927
+import argparse
+import json
+import sys
+import threading
+import time
+from decimal import Decimal
+
+from config import STOCK_VERIFY_INTERVAL, STOCK_VERIFY_FIX
+from db import get_db_connection
+
+MAX_REPORTED_DRIFT = 100
+
+_FIELDS = ("box_qty", "bin_qty", "box_count", "bin_count")
+_ZERO = (Decimal(0), Decimal(0), 0, 0)
+
+_EXPECTED_SQL = """
+    SELECT item_id, SUM(box_qty), SUM(bin_qty), SUM(box_count), SUM(bin_count)
+    FROM (
+      SELECT item_id, qty AS box_qty, 0 AS bin_qty, 1 AS box_count, 0 AS bin_count FROM box_inventory
+      UNION ALL
+      SELECT item_id, 0, qty, 0, 1 FROM bin_inventory
+    ) inv
+    GROUP BY item_id
+"""
+
+
+def _num(value):
+    return float(value) if value is not None else 0.0
+
+
+def get_stock(ean: str) -> dict | None:
+    """Bestand eines Artikels; None, wenn die EAN unbekannt ist."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT i.id, i.ean, i.name, i.qty,
+                   s.box_qty, s.bin_qty, s.total_qty, s.box_count, s.bin_count, s.updated_at
+            FROM items i
+            LEFT JOIN item_stock s ON s.item_id = i.id
+            WHERE i.ean = %s
+        """, (ean,))
+        row = cur.fetchone()
+        cur.close()
+    if not row:
+        return None
+    return {
+        "item_id": row[0],
+        "ean": row[1],
+        "name": row[2],
+        "items_qty": _num(row[3]),    # Zählerstand aus items, unabhängig vom Lager
+        "box_qty": _num(row[4]),
+        "bin_qty": _num(row[5]),
+        "total_qty": _num(row[6]),
+        "box_count": row[7] or 0,
+        "bin_count": row[8] or 0,
+        "updated_at": row[9].isoformat() if row[9] else None,
+    }
+
+
+# ------------------------------------------------------------
+# Prüflauf
+# ------------------------------------------------------------
+
+def _expected(cur) -> dict:
+    cur.execute(_EXPECTED_SQL)
+    return {
+        row[0]: (Decimal(row[1]), Decimal(row[2]), int(row[3]), int(row[4]))
+        for row in cur.fetchall()
+    }
+
+
+def _actual(cur) -> dict:
+    cur.execute("SELECT item_id, box_qty, bin_qty, box_count, bin_count FROM item_stock")
+    return {row[0]: (Decimal(row[1]), Decimal(row[2]), int(row[3]), int(row[4])) for row in cur.fetchall()}
+
+
+def _fix(conn, item_ids) -> int:
+    # Pro Artikel unter Sperre neu rechnen: laufende Inventar-Änderungen
+    # warten solange, damit die Korrektur nicht selbst wieder falsch ist.
+    fixed = 0
+    cur = conn.cursor()
+    for item_id in item_ids:
+        cur.execute("SELECT qty FROM box_inventory WHERE item_id = %s FOR UPDATE", (item_id,))
+        box = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT qty FROM bin_inventory WHERE item_id = %s FOR UPDATE", (item_id,))
+        bins = [r[0] for r in cur.fetchall()]
+        values = (sum(box, Decimal(0)), sum(bins, Decimal(0)), len(box), len(bins))
+        cur.execute("""
+            INSERT INTO item_stock (item_id, box_qty, bin_qty, box_count, bin_count)
+            SELECT id, %s, %s, %s, %s FROM items WHERE id = %s
+            ON DUPLICATE KEY UPDATE
+              box_qty = VALUES(box_qty), bin_qty = VALUES(bin_qty),
+              box_count = VALUES(box_count), bin_count = VALUES(bin_count)
+        """, values + (item_id,))
+        conn.commit()
+        fixed += 1
+    cur.close()
+    return fixed
+
+
+def verify_stock(fix: bool = False) -> dict:
+    """
+    Rechnet alle Summen neu und vergleicht mit item_stock. Beide Seiten
+    werden im selben Snapshot gelesen, laufende Änderungen erzeugen also
+    keinen Schein-Drift.
+    """
+    started = time.perf_counter()
+    with get_db_connection() as conn:
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        cur = conn.cursor()
+        expected = _expected(cur)
+        actual = _actual(cur)
+        cur.close()
+        conn.rollback()
+
+        drift = []
+        for item_id in sorted(expected.keys() | actual.keys()):
+            want = expected.get(item_id, _ZERO)
+            have = actual.get(item_id, _ZERO)
+            if want != have:
+                drift.append({
+                    "item_id": item_id,
+                    "expected": {f: _num(v) for f, v in zip(_FIELDS, want)},
+                    "actual": {f: _num(v) for f, v in zip(_FIELDS, have)} if item_id in actual else None,
+                })
+
+        fixed = _fix(conn, [d["item_id"] for d in drift]) if fix and drift else 0
+
+    report = {
+        "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "items": len(expected.keys() | actual.keys()),
+        "drift_count": len(drift),
+        "drift": drift[:MAX_REPORTED_DRIFT],
+        "fixed": fixed,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    if drift:
+        print(f"[stock] WARNUNG: {len(drift)} Artikel mit abweichender Summe"
+              f"{f', {fixed} korrigiert' if fixed else ''}")
+    else:
+        print(f"[stock] Summen geprüft: {report['items']} Artikel, keine Abweichung")
+    return report
+
+
+class StockVerifier:
+    def __init__(self, interval: float, fix: bool = False):
+        self.interval = interval
+        self.fix = fix
+        self.last_report = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stock-verify", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self, fix: bool | None = None) -> dict:
+        try:
+            self.last_report = verify_stock(fix=self.fix if fix is None else fix)
+        except Exception as e:
+            print(f"[stock] Prüflauf fehlgeschlagen: {e}")
+            self.last_report = {"checked_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "error": str(e)}
+        return self.last_report
+
+
+_verifier = StockVerifier(STOCK_VERIFY_INTERVAL, fix=STOCK_VERIFY_FIX)
+
+
+def start_stock_verifier() -> None:
+    if STOCK_VERIFY_INTERVAL > 0 and _verifier._thread is None:
+        _verifier.start()
+
+
+def run_stock_verify(fix: bool | None = None) -> dict:
+    return _verifier.run_once(fix=fix)
+
+
+def get_stock_verify_report() -> dict | None:
+    return _verifier.last_report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bestandssummen (item_stock) neu rechnen und vergleichen")
+    parser.add_argument("--fix", action="store_true", help="Abweichungen korrigieren")
+    parser.add_argument("--ean", help="Bestand eines Artikels anzeigen")
+    args = parser.parse_args(argv)
+
+    if args.ean:
+        print(json.dumps(get_stock(args.ean), indent=2, ensure_ascii=False))
+        return 0
+    report = verify_stock(fix=args.fix)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 1 if report["drift_count"] and not report["fixed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+# stock_ledger.py
+#
+# Bestandsjournal: jede Mengenänderung steht als Bewegung mit Vorzeichen in
+# stock_movements (Artikel, Box/Fach, Delta, Zeitpunkt; Benutzer nur beim
+# Zählerstand items, das Inventar kennt keinen). Die Einträge schreiben Trigger
+# (migrations.py, Version 7 und 10) – egal ob die Änderung aus der Web-App, dem
+# Import, der Write-Behind-Queue oder app.py kommt. UPDATE/DELETE auf dem
+# Journal lehnt die Datenbank ab.
+#
+# stock_snapshots hält in regelmäßigen Abständen den Stand pro Artikel und
+# Quelle (items / box / bin). Bestand zu einem Zeitpunkt = letzter Snapshot
+# davor + die Bewegungen danach, statt das ganze Journal abzuspielen.
+#
+#   python stock_ledger.py 4003082045927 [--at 2024-05-01T12:00]
+#   python stock_ledger.py --snapshot
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from config import STOCK_SNAPSHOT_INTERVAL, STOCK_SNAPSHOT_LAG_SECONDS
+from db import get_db_connection
+
+SOURCES = ("items", "box", "bin")
+MAX_MOVEMENTS = 500
+
+_ITEM_ID_SQL = "SELECT id FROM items WHERE ean = %s"
+
+_MOVEMENTS_SQL = """
+    SELECT m.id, m.source, b.box_code, n.code, m.delta, m.qty_after,
+           m.user_id, u.name, m.created_at
+    FROM stock_movements m
+    LEFT JOIN boxes b ON b.id = m.box_id
+    LEFT JOIN bins n ON n.id = m.bin_id
+    LEFT JOIN users u ON u.id = m.user_id
+    WHERE m.item_id = %s AND m.id < %s
+    ORDER BY m.id DESC
+    LIMIT %s
+"""
+
+# Letzter Snapshot je Quelle bis zum Zeitpunkt (Index item_id, source, taken_at)
+_SNAPSHOT_AT_SQL = " UNION ALL ".join(
+    f"""(SELECT source, qty, movement_id FROM stock_snapshots
+         WHERE item_id = %(item)s AND source = '{source}' AND taken_at <= %(at)s
+         ORDER BY taken_at DESC, id DESC LIMIT 1)"""
+    for source in SOURCES
+)
+
+# Neuer Snapshot = vorheriger Snapshot + Summe der Bewegungen seitdem, nur
+# für Artikel, die sich bewegt haben
+_SNAPSHOT_SQL = """
+    INSERT INTO stock_snapshots (item_id, source, qty, movement_id, taken_at)
+    SELECT d.item_id, d.source,
+           d.delta + COALESCE((
+             SELECT s.qty FROM stock_snapshots s
+             WHERE s.item_id = d.item_id AND s.source = d.source
+             ORDER BY s.taken_at DESC, s.id DESC LIMIT 1), 0),
+           %(cut)s, %(taken_at)s
+    FROM (
+      SELECT item_id, source, SUM(delta) AS delta FROM stock_movements
+      WHERE id > %(last)s AND id <= %(cut)s
+      GROUP BY item_id, source
+    ) d
+"""
+
+
+def _num(value):
+    return float(value) if value is not None else 0.0
+
+
+def _item_id(cur, ean: str):
+    cur.execute(_ITEM_ID_SQL, (ean,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def get_movements(ean: str, limit: int = 100, before_id: int | None = None) -> dict | None:
+    """Bewegungen eines Artikels, neueste zuerst; weiterblättern mit before_id."""
+    limit = max(1, min(limit, MAX_MOVEMENTS))
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        item_id = _item_id(cur, ean)
+        if item_id is None:
+            cur.close()
+            return None
+        cur.execute(_MOVEMENTS_SQL, (item_id, before_id or 2 ** 63 - 1, limit))
+        rows = cur.fetchall()
+        cur.close()
+
+    movements = []
+    for r in rows:
+        movement = {
+            "id": r[0],
+            "source": r[1],
+            "box_code": r[2],
+            "bin_code": r[3],
+            "delta": _num(r[4]),
+            "qty_after": _num(r[5]),   # items: neuer Zählerstand, box/bin: Menge an diesem Ort
+            "created_at": r[8].isoformat() if r[8] else None,
+        }
+        if r[1] == "items":
+            movement["user_id"] = r[6]
+            movement["user_name"] = r[7]
+        movements.append(movement)
+    return {
+        "item_id": item_id,
+        "ean": ean,
+        "movements": movements,
+        "next_before_id": movements[-1]["id"] if len(movements) == limit else None,
+    }
+
+
+def stock_at(ean: str, at: datetime) -> dict | None:
+    """
+    Bestand eines Artikels zum Zeitpunkt at. None, wenn die EAN unbekannt
+    ist; "known": False, wenn at vor Beginn des Journals liegt.
+    """
+    if at.tzinfo is not None:
+        # DATETIME-Spalten sind lokale Zeit ohne Zone
+        at = at.astimezone().replace(tzinfo=None)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        item_id = _item_id(cur, ean)
+        if item_id is None:
+            cur.close()
+            return None
+
+        cur.execute("SELECT MIN(taken_at) FROM stock_snapshots")
+        first = cur.fetchone()[0]
+        if first is None or at < first:
+            cur.close()
+            return {"item_id": item_id, "ean": ean, "at": at.isoformat(), "known": False,
+                    "journal_start": first.isoformat() if first else None}
+
+        # Letzter Snapshot-Lauf bis at: eine Quelle ohne eigenen Snapshot hatte
+        # bis dahin keine Bewegung, steht also bis zu diesem Schnitt auf 0
+        cur.execute("""
+            SELECT movement_id FROM stock_snapshots
+            WHERE taken_at <= %s ORDER BY taken_at DESC LIMIT 1
+        """, (at,))
+        cut = cur.fetchone()[0]
+
+        cur.execute(_SNAPSHOT_AT_SQL, {"item": item_id, "at": at})
+        base = {source: (Decimal(0), cut) for source in SOURCES}
+        for source, qty, movement_id in cur.fetchall():
+            base[source] = (qty, movement_id)
+
+        # Die Snapshots einer Quelle können unterschiedlich alt sein; ab dem
+        # ältesten lesen und pro Quelle nur die neueren Bewegungen zählen
+        since = min(movement_id for _, movement_id in base.values())
+        cur.execute("""
+            SELECT id, source, delta FROM stock_movements
+            WHERE item_id = %s AND id > %s AND created_at <= %s
+        """, (item_id, since, at))
+        qty = {source: value for source, (value, _) in base.items()}
+        replayed = 0
+        for movement_id, source, delta in cur.fetchall():
+            if movement_id > base[source][1]:
+                qty[source] += delta
+                replayed += 1
+        cur.close()
+
+    return {
+        "item_id": item_id,
+        "ean": ean,
+        "at": at.isoformat(),
+        "known": True,
+        "items_qty": _num(qty["items"]),
+        "box_qty": _num(qty["box"]),
+        "bin_qty": _num(qty["bin"]),
+        "total_qty": _num(qty["box"] + qty["bin"]),
+        "replayed": replayed,
+    }
+
+
+def take_snapshot() -> dict:
+    """
+    Schreibt einen Snapshot für alle Artikel mit Bewegungen seit dem letzten.
+    Bewegungen der letzten STOCK_SNAPSHOT_LAG_SECONDS bleiben draußen: ihre
+    ids sind vergeben, aber die Transaktion ist evtl. noch nicht committet –
+    eine spätere Lücke unterhalb des Schnitts würde sonst nie mitgezählt.
+    """
+    started = time.perf_counter()
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT GET_LOCK('wawi_stock_snapshot', 0)")
+        if not cur.fetchone()[0]:
+            cur.close()
+            return {"skipped": "läuft bereits"}
+        try:
+            cur.execute("SELECT COALESCE(MAX(movement_id), 0) FROM stock_snapshots")
+            last = cur.fetchone()[0]
+            cur.execute("""
+                SELECT id, created_at FROM stock_movements
+                WHERE created_at <= NOW(6) - INTERVAL %s SECOND
+                ORDER BY created_at DESC, id DESC LIMIT 1
+            """, (STOCK_SNAPSHOT_LAG_SECONDS,))
+            row = cur.fetchone()
+            if not row or row[0] <= last:
+                conn.rollback()
+                return {"rows": 0, "movement_id": last,
+                        "seconds": round(time.perf_counter() - started, 3)}
+            cut, taken_at = row
+            cur.execute(_SNAPSHOT_SQL, {"last": last, "cut": cut, "taken_at": taken_at})
+            count = cur.rowcount
+            conn.commit()
+        finally:
+            cur.execute("SELECT RELEASE_LOCK('wawi_stock_snapshot')")
+            cur.fetchone()
+            cur.close()
+
+    print(f"[stock_ledger] Snapshot bis Bewegung {cut}: {count} Zeilen")
+    return {"rows": count, "movement_id": cut, "taken_at": taken_at.isoformat(),
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+class SnapshotJob:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_result = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stock-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self) -> dict:
+        try:
+            self.last_result = take_snapshot()
+        except Exception as e:
+            print(f"[stock_ledger] Snapshot fehlgeschlagen: {e}")
+            self.last_result = {"error": str(e)}
+        return self.last_result
+
+
+_snapshots = SnapshotJob(STOCK_SNAPSHOT_INTERVAL)
+
+
+def start_stock_snapshots() -> None:
+    if STOCK_SNAPSHOT_INTERVAL > 0 and _snapshots._thread is None:
+        _snapshots.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bestandsjournal eines Artikels anzeigen")
+    parser.add_argument("ean", nargs="?")
+    parser.add_argument("--at", help="Bestand zu diesem Zeitpunkt (ISO, z.B. 2024-05-01T12:00)")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--snapshot", action="store_true", help="jetzt einen Snapshot schreiben")
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        print(json.dumps(take_snapshot(), indent=2, ensure_ascii=False))
+        return 0
+    if not args.ean:
+        parser.error("EAN oder --snapshot angeben")
+    if args.at:
+        result = stock_at(args.ean, datetime.fromisoformat(args.at))
+    else:
+        result = get_movements(args.ean, limit=args.limit)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0 if result else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
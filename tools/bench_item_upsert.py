@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Micro-Benchmark: Round-Trips und Zeit pro Artikel-Speichern,
+# alt (SELECT + UPDATE/INSERT) gegen neu (item_repo, ein Upsert).
+#
+# Läuft gegen die DB aus config.py und legt Test-EANs mit Präfix
+# BENCH_PREFIX an, die am Ende wieder gelöscht werden.
+#
+#   python tools/bench_item_upsert.py [anzahl]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_db_connection  # noqa: E402
+import item_repo  # noqa: E402
+
+BENCH_PREFIX = "BENCH-"
+
+
+class CountingCursor:
+    def __init__(self, cur):
+        self._cur = cur
+        self.round_trips = 0
+
+    def execute(self, sql, params=None):
+        self.round_trips += 1
+        return self._cur.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+def legacy_save_scan(cur, ean, name, qty, shop_id, user_id):
+    # So hat webapp.api_save_item vorher gespeichert
+    cur.execute("SELECT id, name FROM items WHERE ean = %s", (ean,))
+    row = cur.fetchone()
+    if row:
+        if not name:
+            name = row[1] or ""
+        cur.execute("""
+            UPDATE items
+            SET name = %s, qty = %s, shop_id = %s, last_user_id = %s, last_change_at = NOW()
+            WHERE ean = %s
+        """, (name, qty, shop_id, user_id, ean))
+        return row[0]
+    cur.execute("""
+        INSERT INTO items (ean, name, qty, shop_id, last_user_id, last_change_at)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+    """, (ean, name, qty, shop_id, user_id))
+    return cur.lastrowid
+
+
+def run(label, save, n):
+    with get_db_connection() as conn:
+        cur = CountingCursor(conn.cursor())
+        started = time.perf_counter()
+        # jede EAN zweimal: einmal anlegen, einmal aktualisieren
+        for rnd in range(2):
+            for i in range(n):
+                save(cur, f"{BENCH_PREFIX}{i:06d}", f"Bench {i}", float(rnd + 1), None, None)
+                conn.commit()
+        elapsed = time.perf_counter() - started
+        cur.close()
+
+    saves = 2 * n
+    print(f"{label:<8} saves={saves:<6} round_trips/save={cur.round_trips / saves:.2f} "
+          f"ms/save={elapsed / saves * 1000:.3f}")
+
+
+def cleanup():
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM items WHERE ean LIKE %s", (BENCH_PREFIX + "%",))
+        conn.commit()
+        cur.close()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    cleanup()
+    try:
+        run("vorher", legacy_save_scan, n)
+        cleanup()
+        run("nachher", item_repo.save_scan, n)
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,35 @@
 # webapp.py
-import os
 import base64
-from io import BytesIO
+from datetime import datetime
+from io import TextIOWrapper
 
-from flask import Flask, send_file, send_from_directory, request, jsonify
-import qrcode
+from flask import Flask, Response, send_file, send_from_directory, request, jsonify, stream_with_context
 
-from config import PUBLIC_DIR, VIEWS_DIR, MOBILE_VIEWS_DIR, IMAGE_DIR, MOBILE_URL, DUMMY_IMAGE_PATH
-from db import get_db_connection, save_image_for_ean
-from websocket_server import broadcast_from_anywhere
+from config import (
+    PUBLIC_DIR, VIEWS_DIR, MOBILE_VIEWS_DIR, IMAGE_DIR, MOBILE_URL, IMAGE_MAX_AGE, QR_MAX_AGE,
+    SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, ITEMS_PAGE_DEFAULT, ITEMS_PAGE_MAX, LOOKUP_BATCH_MAX,
+)
+from db import (
+    get_pool_stats, save_image_for_ean, get_item_cache_stats, save_scan, get_replica,
+    get_schema_report, search_items, get_search_stats, adjust_qty, save_scan_if_version,
+)
+from query_stats import get_query_stats, reset_query_stats
+from scan_queue import get_scan_queue, flush_pending
+from stock import get_stock, run_stock_verify, get_stock_verify_report
+from stock_ledger import get_movements, stock_at
+from locations import get_item_locations
+from item_list import list_items, CursorError
+from product_images import (
+    image_info, image_version, image_url, parse_width, pick_format, variant_etag, variant, pregenerate,
+)
+from qr_codes import get_qr, get_qr_stats, parse_params as parse_qr_params
+from static_assets import resolve as resolve_asset, cache_control as asset_cache_control, render_view
+from websocket_server import broadcast_from_anywhere, get_ws_stats
 
 API_INSTANCE = None  # wird in main.py gesetzt
 
-flask_app = Flask(
-    __name__,
-    static_folder=PUBLIC_DIR,
-    static_url_path="/public"
-)
+# /public liefert public_asset() aus (static_assets.py), nicht Flasks Static-Route
+flask_app = Flask(__name__, static_folder=None)
 
 def set_api_instance(api):
     global API_INSTANCE
@@ -28,49 +41,117 @@ def root():
     return "<h1>Server läuft</h1><p>Desktop: /desktop, Mobile: /mobile</p>"
 
 
+def _view(directory, filename):
+    # HTML selbst nie cachen, damit neue Fingerprint-URLs sofort greifen
+    resp = Response(render_view(directory, filename), mimetype="text/html")
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@flask_app.route("/public/<path:filename>")
+def public_asset(filename):
+    asset = resolve_asset(filename, request.accept_encodings)
+    if asset is None:
+        # nicht (oder nicht aktuell) gebaut: Original, ohne Dauer-Cache
+        resp = send_from_directory(PUBLIC_DIR, filename, conditional=True)
+        resp.headers["Cache-Control"] = asset_cache_control(False)
+        return resp
+
+    if request.if_none_match.contains(asset["etag"]):
+        resp = Response(status=304)
+        resp.set_etag(asset["etag"])
+    else:
+        resp = send_file(asset["path"], mimetype=asset["mimetype"], etag=asset["etag"], conditional=True)
+    if asset["encoding"]:
+        resp.headers["Content-Encoding"] = asset["encoding"]
+    if asset["has_variants"]:
+        resp.vary.add("Accept-Encoding")
+    resp.headers["Cache-Control"] = asset_cache_control(asset["immutable"])
+    return resp
+
+
 @flask_app.route("/desktop")
 def desktop_page():
-    return send_from_directory(VIEWS_DIR, "index.html")
+    return _view(VIEWS_DIR, "index.html")
 
 
 @flask_app.route("/desktop_input")
 def desktop_input_page():
-    return send_from_directory(VIEWS_DIR, "desktop_eingabe.html")
+    return _view(VIEWS_DIR, "desktop_eingabe.html")
 
 
 @flask_app.route("/mobile")
 def mobile_page():
-    return send_from_directory(MOBILE_VIEWS_DIR, "mobile.html")
+    return _view(MOBILE_VIEWS_DIR, "mobile.html")
 
 
 @flask_app.route("/mobile/erfassung")
 def mobile_erfassung_page():
-    return send_from_directory(MOBILE_VIEWS_DIR, "erfassung.html")
+    return _view(MOBILE_VIEWS_DIR, "erfassung.html")
 
 
 @flask_app.route("/image/<ean>")
 def product_image(ean):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT image_path FROM items WHERE ean = %s", (ean,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-
-    candidate = row[0] if row and row[0] else None
-    if candidate and os.path.exists(candidate):
-        return send_file(candidate, mimetype="image/jpeg")
-
-    return send_file(DUMMY_IMAGE_PATH, mimetype="image/png")
+    # ?w=thumb|medium|full|<px>&fmt=jpeg|webp|auto: verkleinerte Variante
+    try:
+        width = parse_width(request.args.get("w"))
+        fmt = pick_format(request.args.get("fmt"), request.accept_mimetypes)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+
+    info = image_info(ean)
+    etag = variant_etag(info, width, fmt) if not info["placeholder"] else info["etag"]
+
+    # ?v=<etag> ändert sich mit dem Bild -> darf dauerhaft gecacht werden;
+    # ohne Version (oder veraltet) jedes Mal kurz nachfragen (304)
+    if request.args.get("v") == info["etag"] and not info["placeholder"]:
+        cache_control = f"public, max-age={IMAGE_MAX_AGE}, immutable"
+    else:
+        cache_control = "no-cache"
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+    else:
+        info = variant(info, width, fmt)
+        resp = send_file(info["path"], mimetype=info["mimetype"], etag=etag,
+                         last_modified=info["mtime"], conditional=True)
+    resp.last_modified = info["mtime"]
+    resp.headers["Cache-Control"] = cache_control
+    if request.args.get("fmt") == "auto":
+        resp.vary.add("Accept")
+    return resp
+
+
+def _qr_response(payload):
+    # ?fmt=png|svg&scale=<Pixel pro Modul>
+    try:
+        fmt, scale = parse_qr_params(request.args.get("fmt"), request.args.get("scale"))
+        qr = get_qr(payload, fmt, scale)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    if request.if_none_match.contains(qr["etag"]):
+        resp = Response(status=304)
+    else:
+        resp = Response(qr["data"], mimetype=qr["mimetype"])
+    resp.set_etag(qr["etag"])
+    resp.headers["Cache-Control"] = f"public, max-age={QR_MAX_AGE}"
+    return resp
 
 
 @flask_app.route("/qr")
 def mobile_qr():
-    img = qrcode.make(MOBILE_URL)
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png")
+    return _qr_response(MOBILE_URL)
+
+
+@flask_app.route("/qr/ean/<ean>")
+def ean_qr(ean):
+    return _qr_response(ean.strip())
+
+
+@flask_app.route("/qr/box/<box_code>")
+def box_qr(box_code):
+    return _qr_response(box_code.strip())
 
 
 @flask_app.route("/upload_image/<ean>", methods=["POST"])
@@ -87,10 +168,14 @@ def upload_image_http(ean):
         img_bytes = file.read()
         image_b64 = base64.b64encode(img_bytes).decode("ascii")
 
+        flush_pending(ean)
         filepath = save_image_for_ean(ean, image_b64)
         print(f"[upload_image_http] EAN={ean}, gespeichert unter {filepath}")
 
-        return jsonify({"ok": True, "message": "Bild gespeichert", "ean": ean})
+        version = image_version(ean)
+        pregenerate(ean)
+        return jsonify({"ok": True, "message": "Bild gespeichert", "ean": ean,
+                        "version": version, "image_url": image_url(ean, version)})
     except Exception as exc:
         print(f"[upload_image_http] Fehler bei EAN={ean}: {exc}")
         return jsonify({"ok": False, "message": "Fehler beim Speichern"}), 500
@@ -110,14 +195,20 @@ def api_current_user():
 
 @flask_app.route("/api/shops")
 def api_shops():
-    from db import get_shops
+    from db import get_shops_versioned
     try:
-        shops = get_shops()
-        return jsonify({"shops": shops})
+        version, etag, shops = get_shops_versioned()
     except Exception as e:
         print(f"[api_shops] Fehler: {e}")
         return jsonify({"shops": []}), 500
 
+    # Browser fragen mit If-None-Match nach und bekommen 304, solange sich
+    # die Liste nicht geändert hat.
+    resp = jsonify({"shops": shops, "version": version})
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
 
 @flask_app.route("/api/save_item", methods=["POST"])
 def api_save_item():
@@ -146,37 +237,34 @@ def api_save_item():
     if API_INSTANCE and API_INSTANCE.current_user_id is not None:
         user_id = API_INSTANCE.current_user_id
 
+    # Mit row_version (aus /api/lookup_ean): nur speichern, wenn niemand
+    # dazwischen geändert hat – sonst 409 mit dem aktuellen Stand
+    row_version = data.get("row_version")
+    if row_version is not None:
+        try:
+            flush_pending(ean)
+            result = save_scan_if_version(ean, name, qty_val, shop_id_val, user_id, int(row_version))
+        except (TypeError, ValueError):
+            return jsonify({"ok": False, "message": "row_version ungültig"}), 400
+        except Exception as e:
+            print(f"[api_save_item] DB-Fehler: {e}")
+            return jsonify({"ok": False, "message": "DB-Fehler"}), 500
+        if not result["ok"]:
+            message = "Zwischenzeitlich geändert" if result["conflict"] else "EAN unbekannt"
+            return jsonify({"message": message, **result}), 409 if result["conflict"] else 404
+        return jsonify({"message": "Artikel gespeichert", **result})
+
+    scan_queue = get_scan_queue()
+    if scan_queue is not None:
+        try:
+            scan_queue.enqueue(ean, name, qty_val, shop_id_val, user_id)
+        except Exception as e:
+            print(f"[api_save_item] Journal-Fehler: {e}")
+            return jsonify({"ok": False, "message": "Fehler beim Vormerken"}), 500
+        return jsonify({"ok": True, "message": "Artikel vorgemerkt", "item_id": None, "queued": True})
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("SELECT id, name FROM items WHERE ean = %s", (ean,))
-        row = cur.fetchone()
-
-        if row:
-            item_id = row[0]
-            if not name:
-                name = row[1] or ""
-
-            cur.execute("""
-                UPDATE items
-                SET name = %s,
-                    qty = %s,
-                    shop_id = %s,
-                    last_user_id = %s,
-                    last_change_at = NOW()
-                WHERE ean = %s
-            """, (name, qty_val, shop_id_val, user_id, ean))
-        else:
-            cur.execute("""
-                INSERT INTO items (ean, name, qty, shop_id, last_user_id, last_change_at)
-                VALUES (%s, %s, %s, %s, %s, NOW())
-            """, (ean, name, qty_val, shop_id_val, user_id))
-            item_id = cur.lastrowid
-
-        conn.commit()
-        cur.close()
-        conn.close()
+        item_id = save_scan(ean, name, qty_val, shop_id_val, user_id)
     except Exception as e:
         print(f"[api_save_item] DB-Fehler: {e}")
         return jsonify({"ok": False, "message": "DB-Fehler"}), 500
@@ -184,6 +272,81 @@ def api_save_item():
     return jsonify({"ok": True, "message": "Artikel gespeichert", "item_id": item_id})
 
 
+@flask_app.route("/api/adjust_qty", methods=["POST"])
+def api_adjust_qty():
+    # {"ean": "...", "delta": -1} -> qty += delta auf dem Server
+    data = request.get_json(silent=True) or {}
+    ean = (data.get("ean") or "").strip()
+    if not ean:
+        return jsonify({"ok": False, "message": "EAN fehlt"}), 400
+    try:
+        delta = float(data.get("delta"))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "message": "delta fehlt oder ungültig"}), 400
+
+    user_id = None
+    if API_INSTANCE and API_INSTANCE.current_user_id is not None:
+        user_id = API_INSTANCE.current_user_id
+
+    try:
+        flush_pending(ean)
+        result = adjust_qty(ean, delta, user_id)
+    except Exception as e:
+        print(f"[api_adjust_qty] DB-Fehler: {e}")
+        return jsonify({"ok": False, "message": "DB-Fehler"}), 500
+    return jsonify({"ok": True, **result})
+
+
+@flask_app.route("/api/import/items", methods=["POST"])
+def api_import_items():
+    from catalog_import import import_items, detect_format
+    from config import IMPORT_BATCH_SIZE, IMPORT_COMMIT_EVERY
+
+    # Entweder Multipart mit Feld 'file' oder die Datei direkt als Body
+    upload = request.files.get("file")
+    if upload:
+        raw, filename = upload.stream, upload.filename
+    else:
+        raw, filename = request.stream, None
+
+    fmt = request.args.get("format") or detect_format(filename)
+    if fmt not in ("csv", "jsonl"):
+        return jsonify({"ok": False, "message": f"Unbekanntes Format: {fmt}"}), 400
+
+    try:
+        batch_size = int(request.args.get("batch_size") or IMPORT_BATCH_SIZE)
+        commit_every = int(request.args.get("commit_every") or IMPORT_COMMIT_EVERY)
+    except ValueError:
+        return jsonify({"ok": False, "message": "batch_size/commit_every ungültig"}), 400
+
+    try:
+        text = TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        stats = import_items(text, fmt, batch_size=max(1, batch_size), commit_every=max(1, commit_every))
+    except Exception as e:
+        print(f"[api_import_items] Fehler: {e}")
+        return jsonify({"ok": False, "message": f"Import abgebrochen: {e}"}), 500
+
+    return jsonify({"ok": True, **stats.as_dict()})
+
+
+@flask_app.route("/api/export")
+def api_export():
+    from catalog_export import export_chunks
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"ok": False, "message": f"Unbekanntes Format: {fmt}"}), 400
+    with_locations = request.args.get("locations") == "1"
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    resp = Response(
+        stream_with_context(export_chunks(fmt, with_locations=with_locations)),
+        mimetype=mimetype,
+    )
+    resp.headers["Content-Disposition"] = f"attachment; filename=items.{fmt}"
+    return resp
+
+
 @flask_app.route("/api/lookup_ean")
 def api_lookup_ean_http():
     global API_INSTANCE
@@ -204,6 +367,162 @@ def api_lookup_ean_http():
     return jsonify(result)
 
 
+@flask_app.route("/api/lookup_ean/batch", methods=["POST"])
+def api_lookup_ean_batch():
+    # {"eans": ["4003082045927", ...]} -> items in derselben Reihenfolge + unknown
+    if API_INSTANCE is None:
+        return jsonify({"ok": False, "message": "API nicht initialisiert"}), 500
+    data = request.get_json(silent=True) or {}
+    eans = data.get("eans")
+    if not isinstance(eans, list):
+        return jsonify({"ok": False, "message": "eans (Liste) fehlt"}), 400
+    if len(eans) > LOOKUP_BATCH_MAX:
+        return jsonify({"ok": False, "message": f"Zu viele EANs (max. {LOOKUP_BATCH_MAX})"}), 400
+    result = API_INSTANCE.lookup_eans(eans)
+    return jsonify(result), 200 if result["ok"] else 500
+
+
+@flask_app.route("/api/admin/db_pool")
+def api_admin_db_pool():
+    return jsonify(get_pool_stats())
+
+
+@flask_app.route("/api/admin/ws_stats")
+def api_admin_ws_stats():
+    return jsonify(get_ws_stats())
+
+
+@flask_app.route("/api/admin/qr_cache")
+def api_admin_qr_cache():
+    return jsonify(get_qr_stats())
+
+
+@flask_app.route("/api/admin/item_cache")
+def api_admin_item_cache():
+    return jsonify(get_item_cache_stats())
+
+
+@flask_app.route("/api/admin/scan_queue")
+def api_admin_scan_queue():
+    scan_queue = get_scan_queue()
+    if scan_queue is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **scan_queue.get_stats()})
+
+
+@flask_app.route("/api/admin/replica")
+def api_admin_replica():
+    replica = get_replica()
+    if replica is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **replica.stats()})
+
+
+@flask_app.route("/api/stock/<ean>")
+def api_stock(ean):
+    stock = get_stock(ean)
+    if stock is None:
+        return jsonify({"ok": False, "message": "EAN unbekannt"}), 404
+    return jsonify({"ok": True, **stock})
+
+
+@flask_app.route("/api/stock/<ean>/movements")
+def api_stock_movements(ean):
+    # ?limit=100&before_id=N (Blättern über next_before_id)
+    result = get_movements(
+        ean,
+        limit=request.args.get("limit", 100, type=int),
+        before_id=request.args.get("before_id", type=int),
+    )
+    if result is None:
+        return jsonify({"ok": False, "message": "EAN unbekannt"}), 404
+    return jsonify({"ok": True, **result})
+
+
+@flask_app.route("/api/stock/<ean>/at")
+def api_stock_at(ean):
+    # ?date=2024-05-01 oder 2024-05-01T12:00 (Tagesangabe = Ende des Tages)
+    value = request.args.get("date") or ""
+    try:
+        at = datetime.fromisoformat(value)
+    except ValueError:
+        return jsonify({"ok": False, "message": "date fehlt oder ungültig"}), 400
+    if "T" not in value and " " not in value:
+        at = at.replace(hour=23, minute=59, second=59, microsecond=999999)
+    result = stock_at(ean, at)
+    if result is None:
+        return jsonify({"ok": False, "message": "EAN unbekannt"}), 404
+    return jsonify({"ok": True, **result})
+
+
+@flask_app.route("/api/items")
+def api_items():
+    # ?sort=changed|name&limit=50&shop_id=&last_user_id=&cursor=<next_cursor>
+    limit = min(request.args.get("limit", ITEMS_PAGE_DEFAULT, type=int), ITEMS_PAGE_MAX)
+    try:
+        page = list_items(
+            sort=request.args.get("sort", "changed"),
+            limit=max(1, limit),
+            cursor=request.args.get("cursor") or None,
+            shop_id=request.args.get("shop_id", type=int),
+            last_user_id=request.args.get("last_user_id", type=int),
+        )
+    except CursorError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    return jsonify({"ok": True, **page})
+
+
+@flask_app.route("/api/search")
+def api_search():
+    # Typeahead: ?q=schraub 4x&limit=20
+    query = (request.args.get("q") or "").strip()
+    limit = min(request.args.get("limit", SEARCH_DEFAULT_LIMIT, type=int), SEARCH_MAX_LIMIT)
+    stats = get_search_stats()
+    results = search_items(query, limit=max(1, limit)) if query else []
+    return jsonify({"ok": True, "query": query, "ready": stats["ready"], "results": results})
+
+
+@flask_app.route("/api/admin/search")
+def api_admin_search():
+    return jsonify(get_search_stats())
+
+
+@flask_app.route("/api/locations/<ean>")
+def api_locations(ean):
+    result = get_item_locations(ean)
+    if result is None:
+        return jsonify({"ok": False, "message": "EAN unbekannt"}), 404
+    return jsonify({"ok": True, **result})
+
+
+@flask_app.route("/api/admin/stock_verify", methods=["GET", "POST"])
+def api_admin_stock_verify():
+    # GET: letzter Prüfbericht, POST (?fix=1): jetzt prüfen
+    if request.method == "POST":
+        return jsonify(run_stock_verify(fix=request.args.get("fix") == "1"))
+    return jsonify(get_stock_verify_report() or {"checked_at": None})
+
+
+@flask_app.route("/api/admin/queries")
+def api_admin_queries():
+    # ?sort=total|avg|max|p95|count&limit=N
+    sort = request.args.get("sort", "total")
+    limit = request.args.get("limit", type=int)
+    return jsonify(get_query_stats(sort=sort, limit=limit))
+
+
+@flask_app.route("/api/admin/queries/reset", methods=["POST"])
+def api_admin_queries_reset():
+    reset_query_stats()
+    return jsonify({"ok": True})
+
+
+@flask_app.route("/api/admin/schema")
+def api_admin_schema():
+    # Migrationsstand + EXPLAIN der heißen Abfragen (ok=false -> Full Scan)
+    return jsonify(get_schema_report())
+
+
 @flask_app.route("/api/logout", methods=["POST"])
 def api_logout():
     global API_INSTANCE
@@ -1,40 +1,112 @@
 # websocket_server.py
 import asyncio
 import json
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import websockets
 
+from config import WS_PORT, WS_EXECUTOR_WORKERS, WS_EXECUTOR_MAX_PENDING
 from db import update_product_name, save_image_for_ean
+from product_images import image_version, image_url, pregenerate
+from scan_queue import flush_pending
 
 connected_clients = set()
 last_article = None
 WS_LOOP = None
 
+# Blockierende Arbeit (MySQL, Pillow) läuft hier, nie direkt im Event-Loop.
+_executor = ThreadPoolExecutor(max_workers=WS_EXECUTOR_WORKERS, thread_name_prefix="ws-worker")
+_executor_slots = None  # asyncio.Semaphore, wird im WS-Loop angelegt
+
+# Latenz pro msg_type (Sekunden), letzte N Messungen
+_LATENCY_WINDOW = 500
+_latency = {}
+_latency_lock = threading.Lock()   # get_ws_stats läuft in Flask-Threads
+
+
+async def run_blocking(func, *args):
+    global _executor_slots
+    if _executor_slots is None:
+        _executor_slots = asyncio.Semaphore(WS_EXECUTOR_MAX_PENDING)
+    async with _executor_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+
+
+def _record_latency(msg_type, seconds: float):
+    with _latency_lock:
+        entry = _latency.get(msg_type)
+        if entry is None:
+            entry = _latency[msg_type] = {"count": 0, "total": 0.0, "max": 0.0,
+                                          "recent": deque(maxlen=_LATENCY_WINDOW)}
+        entry["count"] += 1
+        entry["total"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+        entry["recent"].append(seconds)
+
+
+def get_ws_stats() -> dict:
+    # unter dem Lock kopieren, sortiert wird danach
+    with _latency_lock:
+        snapshot = [(msg_type, dict(entry, recent=list(entry["recent"])))
+                    for msg_type, entry in _latency.items()]
+    per_type = {}
+    for msg_type, entry in snapshot:
+        recent = sorted(entry["recent"])
+        n = len(recent)
+        per_type[str(msg_type)] = {
+            "count": entry["count"],
+            "avg_ms": entry["total"] / entry["count"] * 1000 if entry["count"] else 0.0,
+            "max_ms": entry["max"] * 1000,
+            "p50_ms": recent[n // 2] * 1000 if n else 0.0,
+            "p95_ms": recent[min(n - 1, int(n * 0.95))] * 1000 if n else 0.0,
+        }
+    return {
+        "clients": len(connected_clients),
+        "executor_workers": WS_EXECUTOR_WORKERS,
+        "messages": per_type,
+    }
+
 
 async def broadcast(message_dict: dict):
     if not connected_clients:
         return
     data = json.dumps(message_dict)
-    dead = []
-    for ws in connected_clients:
-        try:
-            await ws.send(data)
-        except Exception:
-            dead.append(ws)
-    for ws in dead:
-        connected_clients.discard(ws)
+    # Kopie + parallel senden: während eines await können sich Clients
+    # an-/abmelden, und ein langsamer Client soll die anderen nicht aufhalten.
+    clients = list(connected_clients)
+    results = await asyncio.gather(*(ws.send(data) for ws in clients), return_exceptions=True)
+    for ws, result in zip(clients, results):
+        if isinstance(result, Exception):
+            connected_clients.discard(ws)
+
+
+def attach_loop(loop) -> None:
+    # ASGI-Betrieb (asgi_server.py): der Loop von uvicorn übernimmt die Clients
+    global WS_LOOP
+    WS_LOOP = loop
 
 
 def broadcast_from_anywhere(message_dict: dict):
     global WS_LOOP
     if WS_LOOP and WS_LOOP.is_running():
-        asyncio.run_coroutine_threadsafe(broadcast(message_dict), WS_LOOP)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is WS_LOOP:
+            # schon im Loop (ASGI): direkt einplanen, kein Thread-Wechsel
+            WS_LOOP.create_task(broadcast(message_dict))
+        else:
+            asyncio.run_coroutine_threadsafe(broadcast(message_dict), WS_LOOP)
     else:
         print("[broadcast_from_anywhere] WS_LOOP läuft nicht:", message_dict)
 
 
 async def ws_handler(websocket):
-    global last_article
     connected_clients.add(websocket)
     print("[ws_handler] Client verbunden")
     try:
@@ -47,79 +119,104 @@ async def ws_handler(websocket):
 
             msg_type = data.get("type")
             print(f"[ws_handler] msg_type = {msg_type}")
-
-            if msg_type == "set_article":
-                ean = (data.get("ean") or "").strip()
-                name = (data.get("name") or "").strip()
-                last_article = {"ean": ean, "name": name}
-                await broadcast({"type": "current_article", **last_article})
-
-            elif msg_type == "request_current_article":
-                if last_article:
-                    await websocket.send(json.dumps({
-                        "type": "current_article",
-                        **last_article
-                    }))
-
-            elif msg_type == "upload_image":
-                ean = (data.get("ean") or "").strip()
-                image_b64 = data.get("image_base64", "")
-                if not ean or not image_b64:
-                    await websocket.send(json.dumps({
-                        "type": "error",
-                        "message": "ean und image_base64 erforderlich"
-                    }))
-                    continue
-                filepath = save_image_for_ean(ean, image_b64)
-                await broadcast({
-                    "type": "image_updated",
-                    "ean": ean,
-                    "image_path": filepath,
-                    "timestamp": int(time.time())
-                })
-
-            elif msg_type == "image_uploaded":
-                ean = (data.get("ean") or "").strip()
-                if not ean:
-                    continue
-                await broadcast({
-                    "type": "image_updated",
-                    "ean": ean,
-                    "timestamp": int(time.time())
-                })
-
-            elif msg_type == "save_name":
-                ean = (data.get("ean") or "").strip()
-                name = (data.get("name") or "").strip()
-                if not ean:
-                    await websocket.send(json.dumps({
-                        "type": "error",
-                        "message": "ean erforderlich"
-                    }))
-                    continue
-                update_product_name(ean, name)
-                last_article = {"ean": ean, "name": name}
-                await broadcast({
-                    "type": "current_article",
-                    "ean": ean,
-                    "name": name,
-                })
-
-            else:
-                print(f"[ws_handler] Unbekannter msg_type: {msg_type}")
+            started = time.perf_counter()
+            try:
+                await _handle_message(websocket, msg_type, data)
+            except Exception as e:
+                print(f"[ws_handler] Fehler bei msg_type={msg_type}: {e}")
+                await websocket.send(json.dumps({
+                    "type": "error",
+                    "message": "Fehler bei der Verarbeitung",
+                }))
+            finally:
+                _record_latency(msg_type, time.perf_counter() - started)
 
     finally:
         connected_clients.discard(websocket)
         print("[ws_handler] Client getrennt")
 
 
+async def _handle_message(websocket, msg_type, data):
+    global last_article
+
+    if msg_type == "set_article":
+        ean = (data.get("ean") or "").strip()
+        name = (data.get("name") or "").strip()
+        last_article = {"ean": ean, "name": name}
+        await broadcast({"type": "current_article", **last_article})
+
+    elif msg_type == "request_current_article":
+        if last_article:
+            await websocket.send(json.dumps({
+                "type": "current_article",
+                **last_article
+            }))
+
+    elif msg_type == "upload_image":
+        ean = (data.get("ean") or "").strip()
+        image_b64 = data.get("image_base64", "")
+        if not ean or not image_b64:
+            await websocket.send(json.dumps({
+                "type": "error",
+                "message": "ean und image_base64 erforderlich"
+            }))
+            return
+        await run_blocking(flush_pending, ean)
+        filepath = await run_blocking(save_image_for_ean, ean, image_b64)
+        version = await run_blocking(image_version, ean)
+        pregenerate(ean)
+        await broadcast({
+            "type": "image_updated",
+            "ean": ean,
+            "image_path": filepath,
+            "version": version,
+            "image_url": image_url(ean, version),
+            "timestamp": int(time.time())
+        })
+
+    elif msg_type == "image_uploaded":
+        ean = (data.get("ean") or "").strip()
+        if not ean:
+            return
+        version = await run_blocking(image_version, ean)
+        await broadcast({
+            "type": "image_updated",
+            "ean": ean,
+            "version": version,
+            "image_url": image_url(ean, version),
+            "timestamp": int(time.time())
+        })
+
+    elif msg_type == "save_name":
+        ean = (data.get("ean") or "").strip()
+        name = (data.get("name") or "").strip()
+        if not ean:
+            await websocket.send(json.dumps({
+                "type": "error",
+                "message": "ean erforderlich"
+            }))
+            return
+        # vorgemerkter Scan zuerst, sonst überschreibt er den Namen wieder
+        await run_blocking(flush_pending, ean)
+        await run_blocking(update_product_name, ean, name)
+        last_article = {"ean": ean, "name": name}
+        await broadcast({
+            "type": "current_article",
+            "ean": ean,
+            "name": name,
+        })
+
+    else:
+        print(f"[ws_handler] Unbekannter msg_type: {msg_type}")
+
+
 def start_ws_server():
     async def main_ws():
-        print("WS-Server auf ws://0.0.0.0:8765")
+        print(f"WS-Server auf ws://0.0.0.0:{WS_PORT}")
         async with websockets.serve(
             ws_handler,
             "0.0.0.0",
-            8765,
+            WS_PORT,
             max_size=None,
         ):
             await asyncio.Future()